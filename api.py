@@ -1,16 +1,22 @@
+import json
 import logging
 import os
+import time
 from logging.handlers import RotatingFileHandler
 
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 
 LOG_FORMATTER = logging.Formatter('[%(asctime)s] - [%(levelname)s] - %(module)s:%(funcName)s[%(lineno)d] - %(message)s')
 root_logger = logging.getLogger()
 console_handler = logging.StreamHandler()
 console_handler.setFormatter(LOG_FORMATTER)
 root_logger.addHandler(console_handler)
-from wmata_locator import WmataLocator
+import metrics
+from broadcaster import PredictionBroadcaster
+from registry import LocatorRegistry
+from response_cache import ResponseCache
+from wmata_locator import PREDICTION_CACHE
 
 load_dotenv()
 app = Flask(__name__)
@@ -18,6 +24,13 @@ app = Flask(__name__)
 API_KEY = os.getenv('WMATA_API_KEY')
 ADDRESS = '300 M ST NE, Washington, DC, 20002'
 
+# seconds between two keep-alive comments on idle event streams
+HEARTBEAT_SECONDS = 15
+
+registry = LocatorRegistry(API_KEY)
+# the serialized `/` payload of each station, until its predictions are refreshed
+responses = ResponseCache()
+
 def format_esp32(train_predictions):
     result = []
     line = train_predictions['line']
@@ -28,26 +41,133 @@ def format_esp32(train_predictions):
             times_formatted = ','.join([str(time) for time in timing_list[:2]])
             result.append(f'{station_formatted} {times_formatted}')
     result = sorted(result)
-    return {
+    formatted = {
         'line': result,
         'timestamp': timestamp
     }
+    if train_predictions.get('stale_seconds'):
+        # the last good predictions, served while WMATA is slow or down
+        formatted['stale_seconds'] = train_predictions['stale_seconds']
+    return formatted
+
+broadcaster = PredictionBroadcaster(lambda: registry.get(ADDRESS), format_esp32, PREDICTION_CACHE.ttl)
 
 @app.route('/', methods=['GET'])
 def get():
     try:
-        locator = WmataLocator(API_KEY, ADDRESS)
-        train_predictions = locator.find_closest_train_prediction()
-        esp32_formatted = format_esp32(train_predictions)
+        locator = registry.get(ADDRESS)
+        registry.start()
+        station_codes = tuple(locator.closest_station_codes)
+        cached = responses.get(station_codes, locator.prediction_cache.generation(station_codes))
+        if cached is None:
+            # the generation of the predictions actually used, None if they are stale
+            train_predictions, generation = locator.lookup_complex_train_prediction(station_codes)
+            esp32_formatted = format_esp32(train_predictions)
+            expires = min(generation) + locator.prediction_cache.ttl if generation else time.monotonic()
+            cached = responses.put(station_codes, generation, app.json.dumps(esp32_formatted).encode(), expires)
     except Exception as e:
         logging.error(e, exc_info=e)
         return 'ERROR', 500
-    return jsonify(esp32_formatted), 200
-    
+    return cached_response(cached)
+
+def cached_response(cached):
+    '''
+    Serve a cached body: a 304 if the client already has it, gzipped if the client accepts it
+
+    :param CachedBody cached: The body
+    :return Response: The response, with its strong ETag and a max-age of what's left of the body's TTL
+    '''
+    gzipped = request.accept_encodings['gzip'] > 0 and len(cached.gzipped) < len(cached.body)
+    # each encoding is its own representation, with its own strong ETag
+    etag = f'{cached.etag}-gzip' if gzipped else cached.etag
+    if request.if_none_match.contains_weak(cached.etag) or request.if_none_match.contains_weak(f'{cached.etag}-gzip'):
+        metrics.increment('cache_requests_total', cache='responses', result='not_modified')
+        response = Response(status=304)
+    else:
+        response = Response(cached.gzipped if gzipped else cached.body, mimetype='application/json')
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'max-age={cached.max_age()}'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.route('/predictions', methods=['GET'])
+def get_predictions():
+    try:
+        locator = registry.get(ADDRESS)
+        registry.start()
+        known_codes = list(locator.station_codes)
+    except Exception as e:
+        logging.error(e, exc_info=e)
+        return 'ERROR', 500
+    requested = request.args.get('stations', '')
+    if requested == 'All':
+        station_codes = known_codes
+    else:
+        station_codes = [code.strip().upper() for code in requested.split(',') if code.strip()]
+    unknown_codes = sorted(set(station_codes) - set(known_codes))
+    if not station_codes or unknown_codes:
+        return jsonify({'error': f'Unknown or missing station codes: {",".join(unknown_codes)}'}), 400
+    try:
+        train_predictions = locator.find_train_predictions(station_codes)
+    except Exception as e:
+        logging.error(e, exc_info=e)
+        return 'ERROR', 500
+    return jsonify(train_predictions), 200
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/stream', methods=['GET'])
+def stream():
+    '''
+    Server-Sent Events stream of `format_esp32` payloads, sent only when they change
+
+    Streams the closest station of the configured address, with every platform of its complex
+    like `/`, or `?station=A01`.
+    '''
+    try:
+        locator = registry.get(ADDRESS)
+        registry.start()
+    except Exception as e:
+        logging.error(e, exc_info=e)
+        return 'ERROR', 500
+    station_code = request.args.get('station')
+    if station_code is None:
+        station_code = ','.join(locator.closest_station_codes)
+    else:
+        station_code = station_code.upper()
+        if station_code not in locator.station_codes:
+            return jsonify({'error': f'Unknown station code: {station_code}'}), 400
+    try:
+        last_version = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_version = 0
+
+    def events(last_version):
+        broadcaster.subscribe(station_code)
+        try:
+            while True:
+                update = broadcaster.wait(station_code, last_version, HEARTBEAT_SECONDS)
+                if update is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                last_version, payload = update
+                yield f'id: {last_version}\ndata: {json.dumps(payload)}\n\n'
+        finally:
+            broadcaster.unsubscribe(station_code)
+
+    return Response(events(last_version), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
 if __name__ == '__main__':
     # Configure logging
     root_logger.setLevel('INFO')
     file_handler = RotatingFileHandler('wmata.log', mode='a', maxBytes=1000000, backupCount=1, encoding=None, delay=0)
     file_handler.setFormatter(LOG_FORMATTER)
     root_logger.addHandler(file_handler)
+    # load static data once at startup, not on the first request
+    registry.get(ADDRESS)
+    registry.start()
     app.run(host='0.0.0.0', debug=True)
\ No newline at end of file
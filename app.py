@@ -1,15 +1,13 @@
 import json
 import logging
 import os
-import time
 from logging.handlers import RotatingFileHandler
 
 import click
 from dotenv import load_dotenv
 
-from utils import (convert_for_esp32_led_matrix_64_32,
-                   get_coordinates_of_address, send_to_esp32)
-from wmata_locator import WmataLocator
+# everything else (asyncio, requests, geopy, the station data) is imported by the commands
+# that need it, so one-shot runs and --help don't pay for what they don't use
 
 # initialize logging
 LOG_FORMATTER = logging.Formatter('[%(asctime)s] - [%(levelname)s] - %(module)s:%(funcName)s[%(lineno)d] - %(message)s')
@@ -22,6 +20,13 @@ root_logger.addHandler(console_handler)
 # load environmnet vars
 load_dotenv()
 
+def configure_logging(log_level, log_file):
+  root_logger.setLevel(level=getattr(logging, log_level.upper()))
+  if log_file:
+    file_handler = RotatingFileHandler(log_file, mode='a', maxBytes=1000000, backupCount=1, encoding=None, delay=0)
+    file_handler.setFormatter(LOG_FORMATTER)
+    root_logger.addHandler(file_handler)
+
 @click.group()
 def wmata():
   """WMATA station locator."""
@@ -30,6 +35,7 @@ def wmata():
 @wmata.command(help='Get coordinates of given address')
 @click.argument("address", type=str)
 def geolocate(address):
+  from utils import get_coordinates_of_address
   print(get_coordinates_of_address(address))
 
 @wmata.command(help='Find the train predictions of the closest metro station')
@@ -52,7 +58,17 @@ def geolocate(address):
     "--esp32-hostname", 
     envvar='ESP32_HOSTNAME',
     type=str, 
-    help='hostname of esp32'
+    multiple=True,
+    help='hostname of esp32, can be given multiple times to push to many displays'
+)
+@click.option(
+    "--esp32-format",
+    type=click.Choice(["json", "binary"]),
+    default="json",
+    help="Wire format of the frames sent to the esp32 (default: json)"
+)
+@click.option(
+    "--esp32-delta", is_flag=True, help="Only send the rows that changed since the display's last frame"
 )
 @click.option(
     "-n", "--run-n-times",
@@ -65,34 +81,123 @@ def geolocate(address):
     type=int, 
     help='Number of seconds to wait between each run'
 )
-def predict(address, log_level, esp32, esp32_hostname, log_file, run_n_times, sleep):
+@click.option(
+    "--adaptive", is_flag=True,
+    help="Wait between runs by the station's service hours and next arrival, instead of --sleep"
+)
+@click.option(
+    "--profile", is_flag=True, help="Print where the time went, per stage, once done"
+)
+def predict(address, log_level, esp32, esp32_hostname, esp32_format, esp32_delta, log_file, run_n_times, sleep, adaptive, profile):
   """Find closest train prediction for the given address."""
+  import asyncio
+  import metrics
   # get environment variables
   API_KEY = os.getenv('WMATA_API_KEY')
   
   
-  # Configure logging
-  root_logger.setLevel(level=getattr(logging, log_level.upper()))
-  if log_file:
-    file_handler = RotatingFileHandler(log_file, mode='a', maxBytes=1000000, backupCount=1, encoding=None, delay=0)
-    file_handler.setFormatter(LOG_FORMATTER)
-    root_logger.addHandler(file_handler)
-    
-  locator = WmataLocator(API_KEY, address)
-  
-  
-  root_logger.critical(f'Running code {run_n_times} times with {sleep} seconds of delay')
-  for i in range(run_n_times):
-    root_logger.critical(f'Running {i+1}/{run_n_times}')
-    train_predictions = locator.find_closest_train_prediction()
-    if esp32:
-      esp32_friendly_data = convert_for_esp32_led_matrix_64_32(train_predictions)
-      send_to_esp32(esp32_hostname, esp32_friendly_data)
-      print(json.dumps(esp32_friendly_data, indent=4))
-    else:
-      print(json.dumps(train_predictions, indent=4))
-    if sleep:
-      root_logger.critical(f'Sleeping {sleep} seconds')
-      time.sleep(sleep)
+  configure_logging(log_level, log_file)
+  if adaptive:
+    root_logger.critical(f'Running code {run_n_times} times with an adaptive delay')
+  else:
+    root_logger.critical(f'Running code {run_n_times} times with {sleep} seconds of delay')
+  asyncio.run(run_predictions(API_KEY, address, esp32, esp32_hostname, esp32_format, esp32_delta, run_n_times, sleep, adaptive))
+  if profile:
+    click.echo(metrics.format_summary(), err=True)
+
+
+async def run_predictions(api_key, address, esp32, esp32_hostnames, esp32_format, esp32_delta, run_n_times, sleep, adaptive=False):
+  """Fetch predictions in a loop, pushing each frame to the displays without waiting on them."""
+  import asyncio
+  from datetime import datetime
+  from async_locator import AsyncDisplayPusher, AsyncWmataLocator
+  from display_sync import DisplaySync
+  from scheduler import AdaptiveScheduler
+  from utils import convert_for_esp32_led_matrix_64_32
+  locator = await AsyncWmataLocator.create(api_key, address)
+  pusher = AsyncDisplayPusher(sync=DisplaySync(delta=esp32_delta), wire_format=esp32_format)
+  scheduler = AdaptiveScheduler(locator.locator.timings_index) if adaptive else None
+  try:
+    for i in range(run_n_times):
+      root_logger.critical(f'Running {i+1}/{run_n_times}')
+      train_predictions = await locator.find_closest_train_prediction()
+      if esp32:
+        esp32_friendly_data = convert_for_esp32_led_matrix_64_32(train_predictions)
+        pusher.push_all(esp32_hostnames, esp32_friendly_data)
+        print(json.dumps(esp32_friendly_data, indent=4))
+      else:
+        print(json.dumps(train_predictions, indent=4))
+      if scheduler is not None:
+        last_run = i + 1 == run_n_times
+        sleep = 0 if last_run else scheduler.next_poll(locator.locator.closest_station_codes, datetime.now(), train_predictions['line'])
+      if sleep:
+        root_logger.critical(f'Sleeping {sleep:.0f} seconds')
+        await asyncio.sleep(sleep)
+    await pusher.drain()
+  finally:
+    locator.close()
+
+@wmata.command(help='Push train predictions to many displays, fetching each distinct station once per cycle')
+@click.argument("config", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--log-file",
+    type=click.Path(exists=False),
+    help="Write to log file defiled by this path, instead of stdout"
+)
+@click.option(
+    "-l", "--log-level", 
+    type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]), 
+    default="INFO",
+    help="Set logging level (default: INFO)"
+)
+@click.option(
+    "-n", "--run-n-times",
+    type=int, 
+    help='Number of cycles to run (default: run forever)'
+)
+def serve(config, log_file, log_level, run_n_times):
+  """Serve every display of the config file."""
+  import asyncio
+  import daemon
+  API_KEY = os.getenv('WMATA_API_KEY')
+  configure_logging(log_level, log_file)
+  try:
+    daemon_config = daemon.load_config(config)
+  except ValueError as e:
+    raise click.BadParameter(str(e), param_hint='CONFIG')
+  asyncio.run(daemon.serve(API_KEY, daemon_config, run_n_times))
+
+@wmata.command(name='compile-stations', help='Compile the station list and timings into a binary file, to set as WMATA_STATION_DATA')
+@click.argument("output", type=click.Path(dir_okay=False))
+@click.option(
+    "--stations-file",
+    type=click.Path(exists=True, dir_okay=False),
+    help="jStations JSON file, e.g. station-information.json, instead of asking WMATA"
+)
+@click.option(
+    "--timings-file",
+    type=click.Path(exists=True, dir_okay=False),
+    help="jStationTimes JSON file, instead of asking WMATA"
+)
+def compile_stations(output, stations_file, timings_file):
+  """Compile the station dataset."""
+  from station_data import compile_station_data
+  stations = station_timings = None
+  if stations_file:
+    with open(stations_file, 'r') as f:
+      stations = json.load(f)['Stations']
+  if timings_file:
+    with open(timings_file, 'r') as f:
+      station_timings = json.load(f)
+  if stations is None or station_timings is None:
+    from wmata_locator import WmataLocator
+    # ask WMATA, not the file being replaced
+    os.environ.pop('WMATA_STATION_DATA', None)
+    locator = WmataLocator(os.getenv('WMATA_API_KEY'))
+    stations = stations if stations is not None else locator.station_list['Stations']
+    station_timings = station_timings if station_timings is not None else locator.station_timings
+  compile_station_data(stations, station_timings, output)
+  click.echo(f'Compiled {len(stations)} stations into {output} ({os.path.getsize(output)} bytes)')
+
 if __name__ == "__main__":
   wmata()
@@ -0,0 +1,140 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import esp32_wire
+from display_sync import DisplaySync
+from utils import send_to_esp32
+from wmata_locator import WmataLocator
+
+logger = logging.getLogger()
+
+DEFAULT_FETCH_TIMEOUT = 10
+DEFAULT_PUSH_TIMEOUT = 5
+
+
+class AsyncWmataLocator:
+    """
+    asyncio front-end for `WmataLocator`.
+
+    The blocking HTTP calls run on a small thread pool over the pooled keep-alive sessions
+    of `http_client`, so the event loop is free to push frames to displays while predictions
+    are fetched. Every call is bounded by ``timeout`` seconds.
+    """
+
+    def __init__(self, locator: WmataLocator, executor: ThreadPoolExecutor, timeout: float = DEFAULT_FETCH_TIMEOUT):
+        self.locator = locator
+        self.timeout = timeout
+        self._executor = executor
+
+    @classmethod
+    async def create(cls, api_key: str, current_address: str = None, max_workers: int = 4, timeout: float = DEFAULT_FETCH_TIMEOUT):
+        """
+        Build the underlying `WmataLocator` off the event loop.
+
+        Args:
+            api_key (str): WMATA API key.
+            current_address (str): Address to find the closest station of, if any.
+            max_workers (int): Number of concurrent blocking calls.
+            timeout (float): Seconds before a call is abandoned.
+        Returns:
+            AsyncWmataLocator: The locator.
+        """
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wmata')
+        build = functools.partial(WmataLocator, api_key, current_address)
+        locator = await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(executor, build), timeout)
+        return cls(locator, executor, timeout)
+
+    async def call(self, func, *args):
+        """Run any blocking function on the locator's thread pool, bounded by the timeout."""
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(self._executor, func, *args), self.timeout)
+
+    async def find_closest_train_prediction(self):
+        return await self.call(self.locator.find_closest_train_prediction)
+
+    async def find_train_predictions(self, station_codes):
+        return await self.call(self.locator.find_train_predictions, station_codes)
+
+    async def find_complex_train_predictions(self, station_complexes):
+        return await self.call(self.locator.find_complex_train_predictions, station_complexes)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class AsyncDisplayPusher:
+    """
+    Pushes frames to ESP32 displays concurrently, without ever blocking the caller.
+
+    Each display has at most one push in flight. While a slow or offline display is still
+    busy with an earlier frame, newer frames for it are dropped instead of queued, so it
+    can't hold back the refresh loop or the other displays.
+
+    Frames a display already shows are not sent again, see `DisplaySync`. With the
+    ``binary`` wire format, full frames are sent encoded by `esp32_wire`; deltas, and frames
+    the binary format can't represent, are still sent as JSON.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_PUSH_TIMEOUT, sync: DisplaySync = None, wire_format: str = 'json'):
+        self.timeout = timeout
+        self.sync = sync or DisplaySync()
+        self.wire_format = wire_format
+        self._in_flight = {}
+
+    def push(self, esp32_hostname: str, frame: dict):
+        """
+        Start sending a frame to a display in the background.
+
+        Args:
+            esp32_hostname (str): The display's hostname.
+            frame (dict): The frame from `convert_for_esp32_led_matrix_64_32`.
+        Returns:
+            asyncio.Task: The push task, or None if the display is still busy or already
+            shows this frame.
+        """
+        task = self._in_flight.get(esp32_hostname)
+        if task is not None and not task.done():
+            logger.warning(f'Skipping frame for {esp32_hostname}, previous push still in flight')
+            return None
+        prepared = self.sync.prepare(esp32_hostname, frame)
+        if prepared is None:
+            logger.debug(f'Skipping frame for {esp32_hostname}, unchanged')
+            return None
+        message, seq = prepared
+        task = asyncio.create_task(self._send(esp32_hostname, message, seq, frame))
+        self._in_flight[esp32_hostname] = task
+        return task
+
+    def push_all(self, esp32_hostnames, frame):
+        return [self.push(esp32_hostname, frame) for esp32_hostname in esp32_hostnames]
+
+    def _encode(self, message):
+        if self.wire_format != 'binary' or 'line' not in message:
+            return message
+        try:
+            return esp32_wire.encode_frame(message)
+        except ValueError as e:
+            logger.warning(f'Sending frame as JSON, {e}')
+            return message
+
+    async def _send(self, esp32_hostname, message, seq, frame):
+        loop = asyncio.get_running_loop()
+        try:
+            sent = await loop.run_in_executor(None, send_to_esp32, esp32_hostname, self._encode(message), self.timeout)
+        except Exception as e:
+            logger.error(f'Unable to push frame to {esp32_hostname}', exc_info=e)
+            sent = False
+        if sent:
+            self.sync.acknowledge(esp32_hostname, message, seq, frame)
+        else:
+            # we can't tell what the display has now, start over with a full frame
+            self.sync.forget(esp32_hostname)
+        return sent
+
+    async def drain(self):
+        """Wait for every push still in flight."""
+        tasks = [task for task in self._in_flight.values() if not task.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=self.timeout)
@@ -0,0 +1,117 @@
+"""
+p50/p99 latency of the Flask ``/`` route, before and after the locator registry.
+
+"before" builds a `WmataLocator` per request and reads the cache files from disk, like
+the handler used to; "after" reuses the long-lived locator from the registry. Upstream
+calls are answered from local fixtures, so only our own overhead is measured.
+
+    python -m benchmarks.api_latency --requests 500
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from benchmarks import fixtures
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self._body = body
+        self.status_code = 200
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeLocation:
+    latitude = 38.9055
+    longitude = -77.0030
+
+
+class FakeGeocoder:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def geocode(self, address):
+        return FakeLocation()
+
+
+def fake_upstream():
+    stations = fixtures.station_list()
+    timings = fixtures.station_timings(stations['Stations'])
+
+    def get(url, *args, **kwargs):
+        if 'jStations' in url:
+            return FakeResponse(stations)
+        if 'jStationTimes' in url:
+            return FakeResponse(timings)
+        station_code = url.split('GetPrediction/')[1].split('?')[0]
+        return FakeResponse(fixtures.predictions(station_code.split(','), stations['Stations']))
+    return get
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def measure(client, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        response = client.get('/')
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.data
+    return {
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'mean_ms': statistics.mean(samples) * 1000,
+    }
+
+
+def run(n):
+    upstream = fake_upstream()
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            mock.patch('http_client.get', upstream), \
+            mock.patch('utils.Nominatim', FakeGeocoder):
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            import api
+            import utils
+            import wmata_locator
+            from quota import QuotaGovernor
+            client = api.app.test_client()
+
+            def locator_per_request(address):
+                # what the handler used to do: re-read the cache files and rebuild everything
+                for cached in (wmata_locator.WmataLocator.get_station_list,
+                               wmata_locator.WmataLocator.get_station_timings,
+                               utils.get_coordinates_of_address):
+                    cached.cache_clear()
+                return wmata_locator.WmataLocator(api.API_KEY, address)
+
+            # the rate limiter is off, so that results stay comparable with runs from before it
+            with mock.patch.object(wmata_locator, 'QUOTA', QuotaGovernor(os.path.join(tmp_dir, 'wmata.quota'), rate=0)):
+                with mock.patch.object(api.registry, 'get', locator_per_request):
+                    before = measure(client, n)
+                client.get('/')
+                after = measure(client, n)
+            api.registry.stop()
+        finally:
+            os.chdir(cwd)
+    return {'requests': n, 'before': before, 'after': after}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests), indent=4))
@@ -0,0 +1,59 @@
+"""
+Size and encode time of ESP32 frames, JSON against the `esp32_wire` binary format.
+
+Frames are built for every station from the fixture predictions.
+
+    python -m benchmarks.esp32_wire --repeat 200
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+
+from benchmarks import fixtures
+from esp32_wire import decode_frame, encode_frame
+from utils import convert_for_esp32_led_matrix_64_32
+from wmata_locator import build_line_map
+
+
+def station_frames():
+    trains_by_code = {}
+    for train in fixtures.predictions(['All'])['Trains']:
+        trains_by_code.setdefault(train['LocationCode'], []).append(train)
+    timestamp = datetime(2024, 8, 10, 13, 25, 7).isoformat()
+    return [
+        convert_for_esp32_led_matrix_64_32({'line': build_line_map(trains), 'timestamp': timestamp})
+        for trains in trains_by_code.values()
+    ]
+
+
+def time_per_frame(encode, frames, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            encode(frame)
+    return (time.perf_counter() - start) / (repeat * len(frames))
+
+
+def run(repeat):
+    frames = station_frames()
+    json_sizes = [len(json.dumps(frame).encode()) for frame in frames]
+    binary_sizes = [len(encode_frame(frame)) for frame in frames]
+    assert all(decode_frame(encode_frame(frame)) == frame for frame in frames)
+    return {
+        'frames': len(frames),
+        'json_bytes_mean': statistics.mean(json_sizes),
+        'binary_bytes_mean': statistics.mean(binary_sizes),
+        'size_ratio': sum(binary_sizes) / sum(json_sizes),
+        'json_encode_us': time_per_frame(lambda frame: json.dumps(frame).encode(), frames, repeat) * 1e6,
+        'binary_encode_us': time_per_frame(encode_frame, frames, repeat) * 1e6,
+        'binary_decode_us': time_per_frame(decode_frame, [encode_frame(frame) for frame in frames], repeat) * 1e6,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.repeat), indent=4))
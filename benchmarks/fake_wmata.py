@@ -0,0 +1,136 @@
+"""
+Local stand-in for the WMATA API, serving `fixtures` built from ``station-information.json``.
+
+It answers ``jStations``, ``jStationTimes`` and ``GetPrediction/{codes|All}`` on the same
+paths as api.wmata.com, with configurable latency and error injection, and optionally
+WMATA's per-key rate limit, answering 429 past it. Point the locator at it with
+``WMATA_API_BASE_URL``:
+
+    python -m benchmarks.fake_wmata --port 8099 --latency 0.05 --error-rate 0.01
+    WMATA_API_BASE_URL=http://127.0.0.1:8099 python app.py predict "Metro Center"
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks import fixtures
+
+
+class FakeWmataHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # send headers and body in one segment, or keep-alive clients stall on delayed ACKs
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, payload: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split('?')[0]
+        with server.lock:
+            server.requests.append(path)
+            limited = server.rate_limit and not server.take_token()
+        if limited:
+            with server.lock:
+                server.rate_limited += 1
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if server.latency:
+            time.sleep(server.latency + random.uniform(0, server.latency_jitter))
+        if server.error_rate and random.random() < server.error_rate:
+            return self._reply(500, b'{"Message": "Injected error"}')
+        if path.endswith('/jStations'):
+            return self._reply(200, server.station_list)
+        if path.endswith('/jStationTimes'):
+            return self._reply(200, server.station_timings)
+        if '/GetPrediction/' in path:
+            station_codes = path.rsplit('/', 1)[1].split(',')
+            return self._reply(200, json.dumps(fixtures.predictions(station_codes, server.stations)).encode())
+        self._reply(404, b'{"Message": "Not found"}')
+
+
+class FakeWmataServer(ThreadingHTTPServer):
+    """
+    The fake API, served from a background thread.
+
+    ```python
+    with FakeWmataServer(latency=0.05) as server:
+        requests.get(f'{server.base_url}/Rail.svc/json/jStations')
+    ```
+    """
+    daemon_threads = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0, latency_jitter: float = 0,
+                 error_rate: float = 0, rate_limit: float = 0, handler_class=FakeWmataHandler):
+        super().__init__((host, port), handler_class)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        # requests per second, and as many in a burst, like WMATA; 0 for no limit
+        self.rate_limit = rate_limit
+        self.rate_limited = 0
+        self._tokens = rate_limit
+        self._refilled = time.monotonic()
+        self.lock = threading.Lock()
+        self.requests = []
+        station_list = fixtures.station_list()
+        self.stations = station_list['Stations']
+        self.station_list = json.dumps(station_list).encode()
+        self.station_timings = json.dumps(fixtures.station_timings(self.stations)).encode()
+        self._thread = None
+
+    def take_token(self):
+        # called under the lock
+        now = time.monotonic()
+        self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    @property
+    def base_url(self):
+        return f'http://{self.server_address[0]}:{self.server_port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-wmata', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0, help='Seconds added to every response')
+    parser.add_argument('--latency-jitter', type=float, default=0, help='Up to this many more seconds, at random')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests answered with a 500')
+    parser.add_argument('--rate-limit', type=float, default=0, help='Requests per second answered before 429s')
+    args = parser.parse_args()
+    server = FakeWmataServer(args.host, args.port, args.latency, args.latency_jitter, args.error_rate, args.rate_limit)
+    print(f'Fake WMATA API on {server.base_url}')
+    server.serve_forever()
@@ -0,0 +1,93 @@
+"""
+Time to turn predictions into line maps, before and after `build_line_maps` grouped every
+station in a single pass over the trains:
+
+- ``all``: a ``GetPrediction/All`` response, split by station then grouped one station at a
+  time, against `build_line_maps`.
+- ``board``: the trains of a two platform station complex, against `build_line_map`.
+
+    python -m benchmarks.parse_predictions --repeat 200
+"""
+import argparse
+import json
+import time
+
+from benchmarks import fixtures
+from wmata_locator import build_line_map, build_line_maps
+
+
+def loop_line_map(trains):
+    # build_line_map before the single pass grouping
+    line_map = {}
+    for train in trains:
+        line = train["Line"]
+        min = train["Min"]
+        destination = train["Destination"]
+        time = 'N'
+        if min.lower() == 'arr':
+            time = 0
+        else:
+            try:
+                time = int(min)
+            except ValueError:
+                pass
+        if line not in line_map:
+            line_map[line] = {destination: [time]}
+        elif destination not in line_map[line]:
+            line_map[line][destination] = [time]
+        else:
+            line_map[line][destination].append(time)
+    for line, destinations in line_map.items():
+        for dest, times in destinations.items():
+            line_map[line][dest] = sorted(line_map[line][dest], key=lambda x: (x is None or x == 'N', x))
+    return line_map
+
+
+def loop_line_maps(trains):
+    trains_by_code = {}
+    for train in trains:
+        trains_by_code.setdefault(train['LocationCode'], []).append(train)
+    return {code: loop_line_map(station_trains) for code, station_trains in trains_by_code.items()}
+
+
+def time_per_call(func, trains, repeat, rounds=15):
+    # best of a few rounds, the others are mostly other processes getting in the way
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func(trains)
+        elapsed = (time.perf_counter() - start) / repeat
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def compare(before, after, trains, repeat):
+    assert after(trains) == before(trains)
+    before_seconds = time_per_call(before, trains, repeat)
+    after_seconds = time_per_call(after, trains, repeat)
+    return {
+        'trains': len(trains),
+        'before_us': before_seconds * 1e6,
+        'after_us': after_seconds * 1e6,
+        'speedup': before_seconds / after_seconds,
+    }
+
+
+def run(repeat):
+    trains = fixtures.predictions(['All'])['Trains']
+    # a few trains without a time, like boarding ones
+    for train in trains[::17]:
+        train['Min'] = 'BRD'
+    # without the metrics, which are the same before and after
+    return {
+        'all': compare(loop_line_maps, build_line_maps.__wrapped__, trains, repeat),
+        'board': compare(loop_line_map, build_line_map.__wrapped__, fixtures.predictions(['A01', 'C01'])['Trains'], repeat * 20),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.repeat), indent=4))
@@ -0,0 +1,82 @@
+"""
+Daily WMATA call volume of a display, polling at a fixed interval against the
+`scheduler.AdaptiveScheduler`, over a simulated day of the fixture timetable.
+
+Trains arrive every ``--headway`` minutes while the station is open. "max_gap_s" is the
+longest time a board goes without fresh predictions while trains are running, and
+"gap_before_arrival_s" the longest in the two minutes before a train arrives, when
+freshness matters most.
+
+    python -m benchmarks.polling --stations 20 --interval 20
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+
+from benchmarks import fixtures
+from scheduler import AdaptiveScheduler
+from timings_index import TimingsIndex
+
+# a Monday
+DAY = datetime(2026, 10, 12)
+
+
+def simulate(next_wait, is_open, headway, phase):
+    """Poll one station from midnight to midnight, ``next_wait(now, line_map)`` seconds apart."""
+    calls = 0
+    max_gap = gap_before_arrival = 0
+    now = DAY
+    last_poll = None
+    while now < DAY + timedelta(days=1):
+        if is_open(now):
+            if last_poll is not None:
+                gap = (now - last_poll).total_seconds()
+                max_gap = max(max_gap, gap)
+                seconds_to_train = (headway * 60 - (now - DAY).total_seconds() - phase) % (headway * 60)
+                if seconds_to_train < 120:
+                    gap_before_arrival = max(gap_before_arrival, gap)
+            next_minutes = int(((headway * 60 - (now - DAY).total_seconds() - phase) % (headway * 60)) // 60)
+            line_map = {'RD': {'Glenmont': [next_minutes, next_minutes + headway]}}
+            last_poll = now
+            calls += 1
+        else:
+            line_map = None
+            last_poll = None
+        now += timedelta(seconds=next_wait(now, line_map))
+    return calls, max_gap, gap_before_arrival
+
+
+def run(stations=20, interval=20, headway=8, seed=0):
+    station_list = fixtures.station_list()['Stations'][:stations]
+    index = TimingsIndex(fixtures.station_timings(station_list))
+    rng = random.Random(seed)
+    scheduler = AdaptiveScheduler(index, rng=rng)
+    results = {'fixed': [], 'adaptive': []}
+    for station in station_list:
+        code = station['Code']
+        phase = rng.uniform(0, headway * 60)
+
+        def is_open(now, code=code):
+            return scheduler.closed_until(code, now) is None
+
+        results['fixed'].append(simulate(lambda now, line_map: interval, lambda now: True, headway, phase))
+        results['adaptive'].append(simulate(lambda now, line_map, code=code: scheduler.next_poll(code, now, line_map),
+                                            is_open, headway, phase))
+    return {
+        name: {
+            'calls_per_day': sum(calls for calls, _, _ in runs),
+            'max_gap_s': round(max(gap for _, gap, _ in runs)),
+            'gap_before_arrival_s': round(max(gap for _, _, gap in runs)),
+        }
+        for name, runs in results.items()
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, default=20)
+    parser.add_argument('--interval', type=int, default=20, help='Seconds between polls of the fixed schedule')
+    parser.add_argument('--headway', type=int, default=8, help='Minutes between trains')
+    args = parser.parse_args()
+    print(json.dumps(run(args.stations, args.interval, args.headway), indent=4))
@@ -0,0 +1,88 @@
+"""
+Load test of the `quota.QuotaGovernor`: several processes fetching predictions as fast as
+they can, against the fake WMATA API enforcing a per-key rate limit, with and without a
+shared governor.
+
+"rate_limited" is how many requests the fake API answered with a 429. Without the governor
+every process discovers the limit on its own; with it, they share one budget and stay under it.
+
+    python -m benchmarks.quota --processes 4 --duration 5 --rate-limit 10
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.fake_wmata import FakeWmataServer
+
+STATION_CODES = ['A01', 'B35', 'C01', 'D03', 'E06', 'F01', 'K04', 'N06']
+
+
+def worker(quota_path, rate_limit, duration, results):
+    import wmata_locator
+    from prediction_cache import PredictionCache
+    from quota import DEFAULT_BURST, DEFAULT_RATE, QuotaGovernor
+
+    # the default margins under WMATA's 10 calls per second, scaled to the fake API's limit
+    scale = rate_limit / 10
+    governor = QuotaGovernor(quota_path, rate=DEFAULT_RATE * scale, burst=DEFAULT_BURST * scale)
+    locator = wmata_locator.WmataLocator('benchmark', prediction_cache=PredictionCache(ttl=0), quota=governor)
+    ok = errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            locator.lookup_predictions([random.choice(STATION_CODES)])
+            ok += 1
+        except Exception:
+            errors += 1
+    results.put((ok, errors))
+
+
+def run_one(processes, duration, rate_limit, governed):
+    import wmata_locator
+
+    with FakeWmataServer(rate_limit=rate_limit) as upstream, tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        base = upstream.base_url
+        wmata_locator.STATION_LIST_URL = f'{base}/Rail.svc/json/jStations?api_key={{api_key}}'
+        wmata_locator.STATION_TIMING_URL = f'{base}/Rail.svc/json/jStationTimes?api_key={{api_key}}'
+        wmata_locator.REAL_TIME_RAIL_PREDICTIONS_URL = f'{base}/StationPrediction.svc/json/GetPrediction/{{station_code}}?api_key={{api_key}}'
+        try:
+            context = multiprocessing.get_context('fork')
+            results = context.Queue()
+            quota_path = os.path.join(tmp_dir, 'wmata.quota')
+            workers = [context.Process(target=worker, args=(quota_path, rate_limit if governed else 0, duration, results))
+                       for _ in range(processes)]
+            for process in workers:
+                process.start()
+            counts = [results.get(timeout=duration + 60) for _ in workers]
+            for process in workers:
+                process.join()
+        finally:
+            os.chdir(cwd)
+        return {
+            'upstream_requests': len(upstream.requests),
+            'rate_limited': upstream.rate_limited,
+            'lookups': sum(ok for ok, _ in counts),
+            'lookup_errors': sum(errors for _, errors in counts),
+        }
+
+
+def run(processes=4, duration=5, rate_limit=10):
+    return {
+        'ungoverned': run_one(processes, duration, rate_limit, governed=False),
+        'governed': run_one(processes, duration, rate_limit, governed=True),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5, help='Seconds each process keeps fetching')
+    parser.add_argument('--rate-limit', type=float, default=10, help='Requests per second the fake API allows')
+    args = parser.parse_args()
+    print(json.dumps(run(args.processes, args.duration, args.rate_limit), indent=4))
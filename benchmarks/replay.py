@@ -0,0 +1,199 @@
+"""
+Replay a recording of upstream responses through `WmataLocator`, the ESP32 formatter and
+the Flask app, with no network.
+
+Record real traffic with ``WMATA_RECORD_PATH`` (see `recording`), then replay it at its
+recorded pace, or faster with ``--speed`` (0 for as fast as possible):
+
+    WMATA_RECORD_PATH=day.wmrl python api.py
+    python -m benchmarks.replay day.wmrl --speed 60 --profile
+
+Every recorded ``GetPrediction`` becomes a ``/predictions`` request for the same stations,
+and an ESP32 frame for each of them. Upstream calls are answered from the recording, as it
+was at that point, by a requests transport adapter mounted on the `http_client` session of
+the WMATA host. The prediction cache TTL is divided by the speed, so that the cache sees the
+same hit ratio as it did live. The rate limiter is off, since nothing reaches WMATA, and the
+app's address is resolved by the local gazetteer, like in `benchmarks.run`.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+import http_client
+from benchmarks.api_latency import FakeGeocoder, percentile
+from benchmarks.run import ADDRESS
+from recording import read_records
+
+
+def _is_prediction(url):
+    return '/GetPrediction/' in urlsplit(url).path
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answers WMATA API requests from recorded responses.
+
+    The station list and timings are the last ones recorded. Predictions are the trains of
+    each station's latest recorded `GetPrediction`, assembled for whatever set of stations is
+    asked for, so requests don't have to group stations the way the recorded ones did. A
+    station whose latest recorded request failed fails the same way, until its next record.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.static = {}
+        self.trains = {}
+        self.failing = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def load(self, record):
+        """Make a recorded response the current one."""
+        name = urlsplit(record['url']).path.rsplit('/', 1)[-1]
+        with self._lock:
+            if not _is_prediction(record['url']):
+                if record['status'] == 200:
+                    self.static[name] = record['body']
+                return
+            station_codes = name.split(',')
+            if record['status'] != 200:
+                self.failing.update(dict.fromkeys(station_codes, record['status']))
+                return
+            if station_codes == ['All']:
+                self.trains.clear()
+                self.failing.clear()
+            for station_code in station_codes:
+                self.trains[station_code] = []
+                self.failing.pop(station_code, None)
+            for train in json.loads(record['body'])['Trains']:
+                self.trains.setdefault(train['LocationCode'], []).append(train)
+
+    def send(self, request, **kwargs):
+        name = urlsplit(request.url).path.rsplit('/', 1)[-1]
+        with self._lock:
+            self.requests += 1
+            if _is_prediction(request.url):
+                station_codes = list(self.trains) if name == 'All' else name.split(',')
+                status = max([self.failing.get(station_code, 200) for station_code in station_codes] + [self.failing.get('All', 200)])
+                trains = [train for station_code in station_codes for train in self.trains.get(station_code, ())]
+                body = json.dumps({'Trains': trains})
+            elif name in self.static:
+                status, body = 200, self.static[name]
+            else:
+                status, body = 404, '{"Message": "Not in the recording"}'
+        response = requests.Response()
+        response.status_code = status
+        response.headers['Content-Type'] = 'application/json'
+        response._content = body.encode()
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def replay(filepath, speed=1.0):
+    """
+    Replay a recording.
+
+    Args:
+        filepath (str): The recording.
+        speed (float): How many times faster than recorded, 0 for as fast as possible.
+    Returns:
+        dict: The replay report.
+    """
+    adapter = ReplayAdapter()
+    # the station data comes first, the locator needs it before any prediction
+    for record in read_records(filepath):
+        if not _is_prediction(record['url']):
+            adapter.load(record)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        session = None
+        # the finally restores the working directory even if an import fails
+        try:
+            os.chdir(tmp_dir)
+            import api
+            import utils
+            import wmata_locator
+            from prediction_cache import DEFAULT_PREDICTION_TTL, PredictionCache
+            from quota import QuotaGovernor
+
+            parts = urlsplit(wmata_locator.REAL_TIME_RAIL_PREDICTIONS_URL)
+            prefix = f'{parts.scheme}://{parts.netloc}'
+            session = http_client.get_session(prefix)
+            session.mount(prefix, adapter)
+            ttl = float(os.getenv('WMATA_PREDICTION_TTL', DEFAULT_PREDICTION_TTL))
+            cache = PredictionCache(ttl=ttl / speed if speed else 0)
+            lags = []
+            requests_made = errors = 0
+            with mock.patch.multiple(wmata_locator, PREDICTION_CACHE=cache,
+                                     QUOTA=QuotaGovernor(os.path.join(tmp_dir, 'wmata.quota'), rate=0)), \
+                    mock.patch.object(api, 'ADDRESS', ADDRESS), mock.patch('utils.Nominatim', FakeGeocoder):
+                client = api.app.test_client()
+                started = time.perf_counter()
+                first = last = None
+                for record in read_records(filepath):
+                    if not _is_prediction(record['url']):
+                        continue
+                    if first is None:
+                        first = record['time']
+                    last = record['time']
+                    if speed:
+                        delay = started + (record['time'] - first) / speed - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                        else:
+                            lags.append(-delay)
+                    adapter.load(record)
+                    station_codes = urlsplit(record['url']).path.rsplit('/', 1)[-1]
+                    response = client.get(f'/predictions?stations={station_codes}')
+                    requests_made += 1
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                    for prediction in response.get_json().values():
+                        utils.convert_for_esp32_led_matrix_64_32(prediction)
+                wall = time.perf_counter() - started
+                api.registry.stop()
+        finally:
+            if session is not None:
+                session.adapters.pop(prefix, None)
+            os.chdir(cwd)
+    return {
+        'recording': filepath,
+        'speed': speed,
+        'recorded_seconds': (last - first) if first is not None else 0,
+        'replay_seconds': wall,
+        'requests': requests_made,
+        'errors': errors,
+        'requests_per_second': requests_made / wall if wall else None,
+        'upstream_requests': adapter.requests,
+        'prediction_cache': cache.stats(),
+        'behind_schedule': {'count': len(lags), 'p99_ms': percentile(lags, 99) * 1000 if lags else 0},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', help='Recording made with WMATA_RECORD_PATH')
+    parser.add_argument('--speed', type=float, default=1, help='Times faster than recorded, 0 for as fast as possible')
+    parser.add_argument('--profile', action='store_true', help='Print where the time went, per stage, once done')
+    args = parser.parse_args()
+    report = replay(args.recording, args.speed)
+    print(json.dumps(report, indent=4))
+    if args.profile:
+        import metrics
+        print(metrics.format_summary(), file=sys.stderr)
@@ -0,0 +1,190 @@
+"""
+The benchmark suite: the locator, the LED matrix formatting and the Flask ``/`` route
+under concurrent load, against the local fake WMATA API of `benchmarks.fake_wmata`.
+
+Results are written as JSON, with the commit they were taken at, so that runs can be
+compared across commits:
+
+    python -m benchmarks.run --output before.json
+    git checkout my-branch
+    python -m benchmarks.run --output after.json --compare before.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from unittest import mock
+
+from benchmarks import fixtures
+from benchmarks.api_latency import FakeGeocoder, percentile
+from benchmarks.fake_wmata import FakeWmataServer
+
+# resolved by the local gazetteer, so geocoding never leaves the process
+ADDRESS = '607 13th St NW, Washington, DC 20005'
+
+
+def summarize(samples):
+    return {
+        'calls': len(samples),
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+
+def time_calls(func, n, setup=None):
+    samples = []
+    for _ in range(n):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=fixtures.REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_test(app, concurrency, n):
+    """Hammer ``/`` from ``concurrency`` threads, ``n`` requests in total, through a real server."""
+    import requests
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f'http://127.0.0.1:{server.server_port}/'
+    samples = []
+    errors = []
+    lock = threading.Lock()
+    remaining = iter(range(n))
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                ok = session.get(url, timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                (samples if ok else errors).append(elapsed)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    wall = time.perf_counter() - started
+    server.shutdown()
+    return {
+        **(summarize(samples) if samples else {'calls': 0}),
+        'concurrency': concurrency,
+        'errors': len(errors),
+        'requests_per_second': n / wall,
+    }
+
+
+def run(iterations=50, concurrency=8, requests=400, latency=0.0, error_rate=0.0):
+    with FakeWmataServer(latency=latency, error_rate=error_rate) as upstream, \
+            tempfile.TemporaryDirectory() as tmp_dir, \
+            mock.patch('utils.Nominatim', FakeGeocoder):
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            import api
+            import utils
+            import wmata_locator
+            from prediction_cache import PredictionCache
+            from quota import QuotaGovernor
+
+            base = upstream.base_url
+            # the rate limiter is off, so that results stay comparable with runs from before it
+            with mock.patch.multiple(
+                    wmata_locator,
+                    STATION_LIST_URL=f'{base}/Rail.svc/json/jStations?api_key={{api_key}}',
+                    STATION_TIMING_URL=f'{base}/Rail.svc/json/jStationTimes?api_key={{api_key}}',
+                    REAL_TIME_RAIL_PREDICTIONS_URL=f'{base}/StationPrediction.svc/json/GetPrediction/{{station_code}}?api_key={{api_key}}',
+                    PREDICTION_CACHE=PredictionCache(ttl=0),
+                    QUOTA=QuotaGovernor(os.path.join(tmp_dir, 'wmata.quota'), rate=0)):
+                api_key = 'benchmark'
+
+                def cold_caches():
+                    for cached in (wmata_locator.WmataLocator.get_station_list,
+                                   wmata_locator.WmataLocator.get_station_timings):
+                        cached.cache_clear()
+                        shutil.rmtree(cached.cache_dir, ignore_errors=True)
+
+                results = {
+                    'locator_init_cold': time_calls(lambda: wmata_locator.WmataLocator(api_key), iterations, cold_caches),
+                    'locator_init_warm': time_calls(lambda: wmata_locator.WmataLocator(api_key), iterations),
+                }
+                locator = wmata_locator.WmataLocator(api_key, ADDRESS)
+                results['find_closest_station'] = time_calls(lambda: locator.find_closest_station(ADDRESS), iterations * 10)
+                results['find_closest_train_prediction'] = time_calls(locator.find_closest_train_prediction, iterations)
+                prediction = locator.find_closest_train_prediction()
+                results['convert_for_esp32_led_matrix_64_32'] = time_calls(
+                    lambda: utils.convert_for_esp32_led_matrix_64_32(prediction), iterations * 10)
+                with mock.patch.object(api, 'ADDRESS', ADDRESS):
+                    results['api_root_under_load'] = load_test(api.app, concurrency, requests)
+                api.registry.stop()
+        finally:
+            os.chdir(cwd)
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'upstream': {'latency': latency, 'error_rate': error_rate, 'requests': len(upstream.requests)},
+        'results': results,
+    }
+
+
+def compare(current, previous):
+    """Ratio current/previous of every timing both runs have; above 1 is slower."""
+    ratios = {}
+    for name, metrics in current['results'].items():
+        for metric, value in metrics.items():
+            before = previous.get('results', {}).get(name, {}).get(metric)
+            if metric.endswith('_ms') and before:
+                ratios[f'{name}.{metric}'] = round(value / before, 3)
+    return ratios
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=400, help='Requests to / in the load test')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds the fake API takes to answer')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of fake API requests answered with a 500')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Results of a previous run, to print the ratios against')
+    args = parser.parse_args()
+    report = run(args.iterations, args.concurrency, args.requests, args.latency, args.error_rate)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            report['compared_to'] = {'file': args.compare, 'ratios': compare(report, json.load(f))}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    print(json.dumps(report, indent=4))
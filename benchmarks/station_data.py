@@ -0,0 +1,76 @@
+"""
+Load time and heap of the station data of a `WmataLocator`, from the JSON cache files
+against the compiled, memory-mapped `station_data` file.
+
+"json" is what every process did before: parse the station list and timings, then build
+the timings and station indexes. "compiled" builds a locator on a freshly opened file:
+its station records stay in the file, only the station index and codes are on the heap.
+
+    python -m benchmarks.station_data --repeat 50
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import fixtures
+from station_data import StationData, compile_station_data
+from station_index import StationIndex
+from timings_index import TimingsIndex
+from wmata_locator import WmataLocator
+
+
+def load_json(stations_path, timings_path):
+    with open(stations_path, 'r') as f:
+        stations = json.load(f)
+    with open(timings_path, 'r') as f:
+        timings = json.load(f)
+    codes = tuple(station['Code'] for station in stations['Stations'])
+    return stations, codes, TimingsIndex(timings), StationIndex(stations['Stations'])
+
+
+def load_compiled(compiled_path):
+    return WmataLocator('benchmark', station_data=StationData.open(compiled_path))
+
+
+def measure(load, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        load()
+    elapsed = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    kept = load()
+    heap, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return {'load_ms': elapsed * 1000, 'heap_bytes': heap}
+
+
+def run(repeat):
+    stations = fixtures.station_list()
+    timings = fixtures.station_timings(stations['Stations'])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stations_path = os.path.join(tmp_dir, 'stations.json')
+        timings_path = os.path.join(tmp_dir, 'timings.json')
+        compiled_path = os.path.join(tmp_dir, 'stations.bin')
+        with open(stations_path, 'w') as f:
+            json.dump(stations, f)
+        with open(timings_path, 'w') as f:
+            json.dump(timings, f)
+        compile_station_data(stations['Stations'], timings, compiled_path)
+        return {
+            'stations': len(stations['Stations']),
+            'json_bytes': os.path.getsize(stations_path) + os.path.getsize(timings_path),
+            'compiled_bytes': os.path.getsize(compiled_path),
+            'json': measure(lambda: load_json(stations_path, timings_path), repeat),
+            'compiled': measure(lambda: load_compiled(compiled_path), repeat),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(run(args.repeat), indent=4))
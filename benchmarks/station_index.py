@@ -0,0 +1,77 @@
+"""
+Nearest-station lookups: `StationIndex` against the original full geodesic scan.
+
+The original loop runs one `geodesic` per station per lookup, so it is timed on a
+subset of the points and extrapolated; the subset is also used to check both give
+the same answer.
+
+    python -m benchmarks.station_index --points 100000 --baseline-points 1000
+"""
+import argparse
+import json
+import time
+
+from geopy.distance import geodesic
+
+from benchmarks import fixtures
+from station_index import StationIndex
+
+
+def closest_station_loop(stations, current_cords):
+    """The pre-index implementation of `WmataLocator.find_closest_station`."""
+    closest_station_geodesic_distance = float('inf')
+    closest_station = None
+    for station in stations:
+        station_cords = (station["Lat"], station["Lon"])
+        distance_from_station = abs(geodesic(station_cords, current_cords).miles)
+        if distance_from_station < closest_station_geodesic_distance:
+            closest_station_geodesic_distance = distance_from_station
+            closest_station = station
+    return closest_station
+
+
+def run(points, baseline_points, k=3):
+    stations = fixtures.station_list()['Stations']
+    coordinates = fixtures.random_coordinates(points)
+
+    start = time.perf_counter()
+    index = StationIndex(stations)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    nearest = [index.nearest(coords) for coords in coordinates]
+    index_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for coords in coordinates:
+        index.k_nearest(coords, k)
+    k_nearest_seconds = time.perf_counter() - start
+
+    sample = coordinates[:baseline_points]
+    start = time.perf_counter()
+    expected = [closest_station_loop(stations, coords) for coords in sample]
+    loop_seconds = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(expected, nearest) if a['Code'] != b['Code'])
+    loop_per_lookup = loop_seconds / len(sample)
+    index_per_lookup = index_seconds / points
+    return {
+        'points': points,
+        'index_build_ms': build_seconds * 1000,
+        'index_nearest_us': index_per_lookup * 1e6,
+        f'index_k{k}_nearest_us': k_nearest_seconds / points * 1e6,
+        'loop_nearest_us': loop_per_lookup * 1e6,
+        'loop_extrapolated_s': loop_per_lookup * points,
+        'index_total_s': index_seconds,
+        'speedup': loop_per_lookup / index_per_lookup,
+        'baseline_points': len(sample),
+        'mismatches': mismatches,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=100000)
+    parser.add_argument('--baseline-points', type=int, default=1000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.points, args.baseline_points), indent=4))
@@ -0,0 +1,95 @@
+import logging
+import threading
+
+logger = logging.getLogger()
+
+
+class _Station:
+    def __init__(self):
+        self.payload = None
+        self.version = 0
+        self.subscribers = 0
+        self.refresher = None
+        self.changed = threading.Condition()
+
+
+class PredictionBroadcaster:
+    """
+    Keeps the latest formatted predictions of each watched station up to date, for streaming clients.
+
+    A single background thread per station refreshes its predictions every ``interval``
+    seconds for as long as it has subscribers, so the upstream load doesn't depend on how
+    many clients are connected. Clients block in `wait` until the payload changes; a new
+    timestamp alone is not a change.
+
+    A station is a station code, or the comma separated codes of a station complex
+    (e.g. "A01,C01"), whose platforms are shown on one board.
+    """
+
+    def __init__(self, get_locator, format_predictions, interval: float):
+        '''
+        :param function get_locator: Returns the `WmataLocator` to fetch predictions with
+        :param function format_predictions: Turns a station's predictions into the payload
+        :param float interval: Seconds between two refreshes of a station
+        '''
+        self.get_locator = get_locator
+        self.format_predictions = format_predictions
+        self.interval = interval
+        self._stations = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def subscribe(self, station_code: str):
+        """Register a client for a station, starting its refresher if needed."""
+        with self._lock:
+            station = self._stations.setdefault(station_code, _Station())
+            station.subscribers += 1
+            if station.refresher is None:
+                station.refresher = threading.Thread(
+                    target=self._refresh_loop, args=(station_code, station), name=f'broadcast-{station_code}', daemon=True
+                )
+                station.refresher.start()
+
+    def unsubscribe(self, station_code: str):
+        with self._lock:
+            self._stations[station_code].subscribers -= 1
+
+    def wait(self, station_code: str, last_version: int, timeout: float):
+        """
+        Wait for a payload newer than the one a client already has.
+
+        Args:
+            station_code (str): The station, which the client must be subscribed to.
+            last_version (int): Version of the client's payload, 0 if it has none.
+            timeout (float): Seconds to wait at most.
+        Returns:
+            tuple: (version, payload), or None if nothing changed before the timeout.
+        """
+        station = self._stations[station_code]
+        with station.changed:
+            station.changed.wait_for(lambda: station.version != last_version, timeout)
+            if station.version == last_version:
+                return None
+            return station.version, station.payload
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_loop(self, station_code, station):
+        while not self._stop.is_set():
+            with self._lock:
+                if station.subscribers <= 0:
+                    station.refresher = None
+                    return
+            try:
+                predictions = self.get_locator().find_complex_train_prediction(station_code.split(','))
+                payload = self.format_predictions(predictions)
+            except Exception as e:
+                logger.error(f'Unable to refresh predictions for {station_code}', exc_info=e)
+            else:
+                with station.changed:
+                    if station.payload is None or payload['line'] != station.payload['line']:
+                        station.payload = payload
+                        station.version += 1
+                        station.changed.notify_all()
+            self._stop.wait(self.interval)
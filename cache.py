@@ -1,14 +1,136 @@
+import hashlib
+import inspect
 import json
 import os
+import tempfile
+import threading
 import time
+from collections import OrderedDict, namedtuple
 from functools import wraps
 
-def jsonfilecache(seconds):
+try:
+    import fcntl
+except ImportError:  # Windows: writes stay atomic, but refreshes are not coordinated between processes
+    fcntl = None
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'disk_hits', 'misses', 'maxsize', 'currsize', 'stale_hits'])
+
+# every jsonfilecache wrapper, by function name, for reporting
+_caches = {}
+
+
+def all_cache_info():
+    """
+    Return the statistics of every `jsonfilecache` decorated function.
+
+    Returns:
+        dict: `CacheInfo` by function name.
+    """
+    return {name: wrapper.cache_info() for name, wrapper in list(_caches.items())}
+
+
+def make_cache_key(args, kwargs):
+    """
+    Build a stable key for a set of call arguments.
+
+    The key only depends on the JSON representation of the arguments, so it is
+    the same across processes and interpreter restarts.
+
+    Args:
+        args (tuple): Positional arguments of the call.
+        kwargs (dict): Keyword arguments of the call.
+    Returns:
+        str: A hex digest identifying the arguments.
+    """
+    serialized = json.dumps([list(args), kwargs], sort_keys=True, default=repr)
+    return hashlib.sha256(serialized.encode()).hexdigest()[:32]
+
+
+class FileLock:
+    """
+    An exclusive ``flock`` on a lock file, shared by processes and by threads alike,
+    since every `FileLock` opens its own file description.
+
+    Without ``fcntl`` the lock is always granted.
+
+    Args:
+        path (str): The lock file, created if missing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, blocking=True):
+        """
+        Take the lock.
+
+        Args:
+            blocking (bool): Wait for the lock, rather than giving up if it is held.
+        Returns:
+            bool: Whether the lock was taken.
+        """
+        if fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+def write_json_atomic(path, data):
+    """
+    Write JSON to a temporary file next to ``path``, then rename it over ``path``,
+    so readers see either the previous file or the complete new one, never a partial write.
+
+    Args:
+        path (str): The destination file.
+        data: The JSON serializable data.
     """
-    A decorator that caches the result of the decorated function in a JSON file.
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def jsonfilecache(seconds, maxsize=128):
+    """
+    A decorator that caches the result of the decorated function, keyed by its arguments.
+
+    Results are kept in two tiers. The first tier is an in-process LRU holding up to
+    ``maxsize`` entries, so repeated calls never touch the filesystem. The second tier
+    is a ``<func>.cache`` directory holding one JSON file per key, shared between
+    processes and restarts. For methods, ``self``/``cls`` is not part of the key.
+
+    Files are replaced atomically, and refreshes take a per-key lock in
+    ``<func>.cache.locks``: when an entry expires, one process (or thread) calls the
+    function while the others keep serving the expired value instead of piling onto
+    the upstream. Callers with no value to serve wait for the refresh to land.
 
     Args:
         seconds (int): The number of seconds the cache is valid for.
+        maxsize (int): The maximum number of entries kept in memory.
     Returns:
         function: The decorated function with caching behavior.
     """
@@ -21,12 +143,48 @@ def jsonfilecache(seconds):
         Returns:
             function: The wrapped function with caching.
         """
-        cache_file = f"{func.__name__}.cache.json"
+        cache_dir = f"{func.__name__}.cache"
+        lock_dir = f"{func.__name__}.cache.locks"
+        parameters = list(inspect.signature(func).parameters)
+        skip_first_arg = bool(parameters) and parameters[0] in ('self', 'cls')
+
+        memory = OrderedDict()
+        lock = threading.Lock()
+        stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'stale_hits': 0}
+
+        def read_disk(key):
+            try:
+                with open(os.path.join(cache_dir, f'{key}.json'), 'r') as f:
+                    return json.load(f)
+            except (OSError, json.JSONDecodeError):
+                return None
+
+        def write_disk(key, entry):
+            os.makedirs(cache_dir, exist_ok=True)
+            write_json_atomic(os.path.join(cache_dir, f'{key}.json'), entry)
+
+        def key_lock(key):
+            os.makedirs(lock_dir, exist_ok=True)
+            return FileLock(os.path.join(lock_dir, f'{key}.lock'))
+
+        def is_fresh(entry, current_time):
+            return bool(entry) and 'timestamp' in entry and current_time - entry['timestamp'] < seconds
+
+        def count(stat):
+            with lock:
+                stats[stat] += 1
+
+        def remember(key, entry):
+            with lock:
+                memory[key] = entry
+                memory.move_to_end(key)
+                while len(memory) > maxsize:
+                    memory.popitem(last=False)
 
         @wraps(func)
         def wrapper(*args, **kwargs):
             """
-            Wrapper function that checks cache and updates it if necessary.
+            Wrapper function that checks both cache tiers and updates them if necessary.
 
             Args:
                 *args: Positional arguments for the decorated function.
@@ -35,36 +193,68 @@ def jsonfilecache(seconds):
                 The result of the decorated function, either from cache or computed.
             """
             current_time = time.time()
-            cache_data = {}
-
-            # Load cache if it exists
-            if os.path.exists(cache_file):
-                with open(cache_file, 'r') as f:
-                    try:
-                        cache_data = json.load(f)
-                    except json.JSONDecodeError:
-                        cache_data = {}
-
-            # Check if cache is still valid
-            if (
-                'timestamp' in cache_data and
-                current_time - cache_data['timestamp'] < seconds
-            ):
-                # Return cached result if valid
-                return cache_data['result']
-
-            # Call the function and store result in cache
-            result = func(*args, **kwargs)
-            cache_data = {
-                'timestamp': current_time,
-                'result': result
-            }
-            # Write updated cache to file
-            with open(cache_file, 'w') as f:
-                json.dump(cache_data, f)
-
-            return result
+            key = make_cache_key(args[1:] if skip_first_arg else args, kwargs)
+
+            # First tier: in-process LRU
+            with lock:
+                stale = memory.get(key)
+                if stale is not None:
+                    if current_time - stale['timestamp'] < seconds:
+                        memory.move_to_end(key)
+                        stats['hits'] += 1
+                        return stale['result']
+                    del memory[key]
+
+            # Second tier: one file per key on disk
+            entry = read_disk(key)
+            if is_fresh(entry, current_time):
+                remember(key, entry)
+                count('disk_hits')
+                return entry['result']
+            if entry and 'timestamp' in entry:
+                stale = entry
+
+            # Expired or missing: only the holder of the key's lock refreshes it
+            refresh_lock = key_lock(key)
+            if stale is not None and not refresh_lock.acquire(blocking=False):
+                count('stale_hits')
+                return stale['result']
+            if stale is None:
+                refresh_lock.acquire()
+            try:
+                # whoever held the lock before us may have just refreshed it
+                entry = read_disk(key)
+                if is_fresh(entry, time.time()):
+                    remember(key, entry)
+                    count('disk_hits')
+                    return entry['result']
+
+                # Call the function and store result in both tiers
+                count('misses')
+                result = func(*args, **kwargs)
+                entry = {
+                    'timestamp': current_time,
+                    'result': result
+                }
+                write_disk(key, entry)
+                remember(key, entry)
+                return result
+            finally:
+                refresh_lock.release()
+
+        def cache_info():
+            with lock:
+                return CacheInfo(stats['hits'], stats['disk_hits'], stats['misses'], maxsize, len(memory), stats['stale_hits'])
+
+        def cache_clear():
+            """Drop the in-memory tier; entries on disk are kept."""
+            with lock:
+                memory.clear()
 
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_dir = cache_dir
+        _caches[func.__name__] = wrapper
         return wrapper
 
-    return cache_decorator
\ No newline at end of file
+    return cache_decorator
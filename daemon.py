@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+
+from async_locator import AsyncDisplayPusher, AsyncWmataLocator
+from display_sync import DisplaySync
+from scheduler import AdaptiveScheduler
+from utils import convert_for_esp32_led_matrix_64_32
+from wmata_locator import station_complex
+
+logger = logging.getLogger()
+
+DEFAULT_INTERVAL = 20
+
+
+def load_config(path: str):
+    '''
+    Load and validate a daemon config file
+
+    ```json
+    {
+        "interval": 20,
+        "delta": false,
+        "format": "json",
+        "adaptive": false,
+        "displays": [
+            {"host": "esp32-kitchen.local", "address": "300 M ST NE, Washington, DC, 20002"},
+            {"host": "10.0.0.12", "station": "A01"}
+        ]
+    }
+    ```
+
+    "adaptive" replaces the fixed interval with an `AdaptiveScheduler`, either ``true`` or the
+    scheduler options, e.g. ``{"min_interval": 10, "max_interval": 90}``.
+
+    :param str path: Path of the JSON config file
+    :return dict: The config, with "interval", "delta", "format", "adaptive" (None or the
+        scheduler options) and "displays"
+    '''
+    with open(path, 'r') as f:
+        config = json.load(f)
+    wire_format = config.get('format', 'json')
+    if wire_format not in ('json', 'binary'):
+        raise ValueError(f'Unknown display format "{wire_format}", expected "json" or "binary"')
+    adaptive = config.get('adaptive', False)
+    if adaptive is True:
+        adaptive = {}
+    elif adaptive is False or adaptive is None:
+        adaptive = None
+    elif not isinstance(adaptive, dict):
+        raise ValueError(f'"adaptive" must be true, false or the scheduler options, not {adaptive!r}')
+    displays = config.get('displays') or []
+    if not displays:
+        raise ValueError(f'No displays configured in {path}')
+    for display in displays:
+        if not display.get('host'):
+            raise ValueError(f'Display {display} has no "host"')
+        if not (display.get('address') or display.get('station')):
+            raise ValueError(f'Display {display["host"]} needs an "address" or a "station"')
+    return {
+        'interval': config.get('interval', DEFAULT_INTERVAL),
+        'delta': bool(config.get('delta', False)),
+        'format': wire_format,
+        'adaptive': adaptive,
+        'displays': displays,
+    }
+
+
+def group_displays_by_station(locator, displays):
+    '''
+    Resolve every display to its station, and group the displays watching the same station
+
+    A display configured by address shows every platform of the closest station complex, e.g.
+    A01 and C01 for Metro Center, like the "/" endpoint. One configured by station code shows
+    that platform only.
+
+    :param WmataLocator locator: Locator used to find the closest station of addresses
+    :param list displays: The "displays" of the config
+    :return dict: The display hosts, keyed by the tuple of codes of their station, see `station_complex`
+    '''
+    known_codes = set(locator.station_codes)
+    subscriptions = {}
+    for display in displays:
+        station_code = display.get('station')
+        if station_code:
+            station_code = station_code.upper()
+            if station_code not in known_codes:
+                raise ValueError(f'Unknown station code {station_code} for display {display["host"]}')
+            station_codes = (station_code,)
+        else:
+            station_codes = tuple(station_complex(locator.find_closest_station(display['address'])))
+        hosts = subscriptions.setdefault(station_codes, [])
+        if display['host'] not in hosts:
+            hosts.append(display['host'])
+    return subscriptions
+
+
+async def serve(api_key: str, config: dict, run_n_times: int = None):
+    '''
+    Push predictions to every configured display, fetching each distinct station once per cycle
+
+    All the stations due are fetched with a single upstream request, and each station's frame is
+    formatted once and shared by all of its displays. Without "adaptive", every station is due
+    every "interval" seconds. With it, each station has its own schedule from `AdaptiveScheduler`:
+    closed stations aren't fetched until they open, and a cycle runs whenever a station is due.
+
+    :param str api_key: WMATA API key
+    :param dict config: The config from `load_config`
+    :param int run_n_times: Number of cycles to run, forever if not given
+    '''
+    locator = await AsyncWmataLocator.create(api_key)
+    pusher = AsyncDisplayPusher(sync=DisplaySync(delta=config['delta']), wire_format=config['format'])
+    loop = asyncio.get_running_loop()
+    try:
+        subscriptions = await locator.call(group_displays_by_station, locator.locator, config['displays'])
+        station_complexes = list(subscriptions)
+        logger.info(f'Serving {len(config["displays"])} displays from {len(station_complexes)} stations')
+        scheduler = None
+        if config.get('adaptive') is not None:
+            scheduler = AdaptiveScheduler(locator.locator.timings_index, **config['adaptive'])
+        # loop time at which each station should be fetched next
+        due = dict.fromkeys(station_complexes, loop.time())
+        cycle = 0
+        while run_n_times is None or cycle < run_n_times:
+            cycle += 1
+            now = loop.time()
+            polling = [station_codes for station_codes in station_complexes if due[station_codes] <= now]
+            if scheduler is not None:
+                polling = _skip_closed(scheduler, polling, due, now)
+            predictions = {}
+            if polling:
+                try:
+                    predictions = await locator.find_complex_train_predictions(polling)
+                except Exception as e:
+                    logger.error('Unable to fetch predictions', exc_info=e)
+            for station_codes in polling:
+                if station_codes in predictions:
+                    frame = convert_for_esp32_led_matrix_64_32(predictions[station_codes])
+                    pusher.push_all(subscriptions[station_codes], frame)
+                if scheduler is None:
+                    wait = config['interval']
+                else:
+                    line_map = predictions[station_codes]['line'] if station_codes in predictions else None
+                    wait = scheduler.next_poll(station_codes, datetime.now(), line_map)
+                due[station_codes] = loop.time() + wait
+            if run_n_times is None or cycle < run_n_times:
+                await asyncio.sleep(max(0, min(due.values()) - loop.time()))
+        await pusher.drain()
+    finally:
+        locator.close()
+
+
+def _skip_closed(scheduler, station_complexes, due, now):
+    # the stations that are open, scheduling the closed ones for when they open
+    wall_time = datetime.now()
+    open_complexes = []
+    for station_codes in station_complexes:
+        resume = scheduler.closed_until(station_codes, wall_time)
+        if resume is None:
+            open_complexes.append(station_codes)
+        else:
+            logger.info(f'{",".join(station_codes)} is closed, not fetching it before {resume.isoformat()}')
+            due[station_codes] = now + (resume - wall_time).total_seconds()
+    return open_complexes
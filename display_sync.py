@@ -0,0 +1,84 @@
+import copy
+import threading
+import time
+
+DEFAULT_RESYNC_SECONDS = 300
+
+
+class DisplaySync:
+    """
+    Remembers the last frame each display acknowledged, to avoid re-sending what it already shows.
+
+    A frame whose rows are unchanged is not sent at all; the timestamp alone doesn't count
+    as a change. With ``delta`` enabled, a frame that only changed some rows is sent as
+
+    ```json
+    {"seq": 8, "base": 7, "count": 2, "rows": [[1, {"name": "BL", "destinations": [...]}]], "timestamp": "01:25:00AM"}
+    ```
+
+    where ``base`` is the sequence number of the frame the display must already have.
+    Full frames carry their ``seq`` too. Every ``resync_seconds`` a full frame is sent
+    regardless, so a display that rebooted or dropped a delta catches up.
+    """
+
+    def __init__(self, delta: bool = False, resync_seconds: float = DEFAULT_RESYNC_SECONDS):
+        self.delta = delta
+        self.resync_seconds = resync_seconds
+        self._displays = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, esp32_hostname: str, frame: dict):
+        """
+        Build the message to send to a display for a new frame.
+
+        Args:
+            esp32_hostname (str): The display's hostname.
+            frame (dict): The frame from `convert_for_esp32_led_matrix_64_32`.
+        Returns:
+            tuple: (message, seq) to send and later `acknowledge`, or None when the display
+            already shows this frame.
+        """
+        rows = frame['line']
+        with self._lock:
+            state = self._displays.get(esp32_hostname)
+            resync = state is None or time.monotonic() - state['full_at'] >= self.resync_seconds
+            if not resync and rows == state['rows']:
+                return None
+            seq = (state['seq'] + 1) if state else 1
+
+        if not self.delta:
+            return frame, seq
+        if resync or len(rows) != len(state['rows']):
+            return {**frame, 'seq': seq}, seq
+        changed = [[i, row] for i, row in enumerate(rows) if row != state['rows'][i]]
+        return {
+            'seq': seq,
+            'base': state['seq'],
+            'count': len(rows),
+            'rows': changed,
+            'timestamp': frame['timestamp'],
+        }, seq
+
+    def acknowledge(self, esp32_hostname: str, message: dict, seq: int, frame: dict):
+        """
+        Record that a display accepted a message built by `prepare`.
+
+        Args:
+            esp32_hostname (str): The display's hostname.
+            message (dict): The message that was sent.
+            seq (int): Its sequence number.
+            frame (dict): The full frame the display now shows.
+        """
+        with self._lock:
+            state = self._displays.get(esp32_hostname)
+            is_full = 'line' in message
+            self._displays[esp32_hostname] = {
+                'rows': copy.deepcopy(frame['line']),
+                'seq': seq,
+                'full_at': time.monotonic() if is_full or state is None else state['full_at'],
+            }
+
+    def forget(self, esp32_hostname: str):
+        """Drop what we know about a display, so its next frame is sent in full."""
+        with self._lock:
+            self._displays.pop(esp32_hostname, None)
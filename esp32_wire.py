@@ -0,0 +1,146 @@
+'''
+Compact binary encoding of the frames built by `convert_for_esp32_led_matrix_64_32`
+
+Every message is a 6 byte header, a body and a CRC-32 of header and body, all big-endian:
+
+    "WM" | version: u8 | kind: u8 | body length: u16 | body | crc32: u32
+
+The body starts with the timestamp as three u8 (24h hour, minute, second), then depends on the kind:
+
+* `KIND_TRAINS`: a u8 row count, then one 8 byte row per destination:
+  line code (2 ASCII), destination (4 ASCII, space padded), two u8 minutes
+* `KIND_NEXT_TRAIN`: the first train time as three u8
+* `KIND_ERROR`: nothing
+
+Minutes go up to `MAX_MINUTES`; `MINUTES_UNKNOWN` stands for "N" and `MINUTES_NONE` for no time.
+'''
+import struct
+import zlib
+
+MAGIC = b'WM'
+VERSION = 1
+
+KIND_TRAINS = 0
+KIND_ERROR = 1
+KIND_NEXT_TRAIN = 2
+
+MAX_MINUTES = 252
+MINUTES_UNKNOWN = 253
+MINUTES_NONE = 255
+
+HEADER = struct.Struct('>2sBBH')
+CRC = struct.Struct('>I')
+TIME = struct.Struct('>BBB')
+ROW = struct.Struct('>2s4sBB')
+
+ERROR_DESTINATIONS = ['!ERROR!']
+NEXT_TRAIN_LABEL = 'NextTrain'
+
+
+def _pack_time(formatted):
+    # formatted with ESP32_FRIENDLY_TIME_FORMAT, e.g. "01:25:00PM"
+    if len(formatted) != 10 or formatted[8:] not in ('AM', 'PM'):
+        raise ValueError(f'Time "{formatted}" cannot be encoded')
+    hour = int(formatted[0:2]) % 12 + (12 if formatted[8:] == 'PM' else 0)
+    return TIME.pack(hour, int(formatted[3:5]), int(formatted[6:8]))
+
+
+def _unpack_time(body, offset):
+    hour, minute, second = TIME.unpack_from(body, offset)
+    return f'{(hour % 12) or 12:02d}:{minute:02d}:{second:02d}{"PM" if hour >= 12 else "AM"}'
+
+
+def _format_row(destination, minutes):
+    # mirrors the formatting of convert_for_esp32_led_matrix_64_32
+    time_formatted = ','.join(minutes).rjust(5)
+    return f'{destination} {time_formatted}'[:10].strip()
+
+
+def _pack_minutes(token):
+    if token == 'N':
+        return MINUTES_UNKNOWN
+    if token.isdigit() and int(token) <= MAX_MINUTES:
+        return int(token)
+    raise ValueError(f'Minutes "{token}" cannot be encoded')
+
+
+def _unpack_minutes(value):
+    if value == MINUTES_UNKNOWN:
+        return 'N'
+    return str(value)
+
+
+def _pack_row(line, row):
+    destination, _, times = row.partition(' ')
+    tokens = [token for token in times.strip().split(',') if token]
+    if len(destination) > 4 or len(line) != 2 or len(tokens) > 2 or _format_row(destination, tokens) != row:
+        raise ValueError(f'Row "{row}" of line "{line}" cannot be encoded')
+    minutes = [_pack_minutes(token) for token in tokens] + [MINUTES_NONE] * (2 - len(tokens))
+    return ROW.pack(line.encode('ascii'), destination.ljust(4).encode('ascii'), *minutes)
+
+
+def encode_frame(frame: dict) -> bytes:
+    '''
+    Encode an ESP32 frame
+
+    :param dict frame: The frame from `convert_for_esp32_led_matrix_64_32`
+    :return bytes: The encoded message
+    :raises ValueError: If the frame holds something the format can't represent, in which
+        case it should be sent as JSON instead
+    '''
+    lines = frame['line']
+    body = _pack_time(frame['timestamp'])
+    if len(lines) == 1 and lines[0]['name'] == '' and lines[0]['destinations'] == ERROR_DESTINATIONS:
+        kind = KIND_ERROR
+    elif len(lines) == 1 and lines[0]['name'] == '' and lines[0]['destinations'][:1] == [NEXT_TRAIN_LABEL]:
+        kind = KIND_NEXT_TRAIN
+        body += _pack_time(lines[0]['destinations'][1])
+    else:
+        kind = KIND_TRAINS
+        rows = []
+        for line in lines:
+            if not line['destinations']:
+                raise ValueError(f'Line "{line["name"]}" has no destinations to encode')
+            rows.extend(_pack_row(line['name'], row) for row in line['destinations'])
+        if len(rows) > 255:
+            raise ValueError(f'Too many rows to encode ({len(rows)})')
+        body += bytes([len(rows)]) + b''.join(rows)
+    message = HEADER.pack(MAGIC, VERSION, kind, len(body)) + body
+    return message + CRC.pack(zlib.crc32(message))
+
+
+def decode_frame(message: bytes) -> dict:
+    '''
+    Decode a message built by `encode_frame` back to the JSON frame
+
+    :param bytes message: The encoded message
+    :return dict: The frame, as built by `convert_for_esp32_led_matrix_64_32`
+    :raises ValueError: If the message is truncated, corrupted or of an unknown version
+    '''
+    if len(message) < HEADER.size + CRC.size:
+        raise ValueError('Message is too short')
+    magic, version, kind, length = HEADER.unpack_from(message)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'Unknown message {magic!r} version {version}')
+    end = HEADER.size + length
+    if len(message) != end + CRC.size:
+        raise ValueError('Message length does not match its header')
+    if CRC.unpack_from(message, end)[0] != zlib.crc32(message[:end]):
+        raise ValueError('Message CRC does not match')
+    body = message[HEADER.size:end]
+    timestamp = _unpack_time(body, 0)
+    if kind == KIND_ERROR:
+        return {'line': [{'name': '', 'destinations': list(ERROR_DESTINATIONS)}], 'timestamp': timestamp}
+    if kind == KIND_NEXT_TRAIN:
+        return {'line': [{'name': '', 'destinations': [NEXT_TRAIN_LABEL, _unpack_time(body, TIME.size)]}], 'timestamp': timestamp}
+    lines = []
+    count = body[TIME.size]
+    for i in range(count):
+        line, destination, *minutes = ROW.unpack_from(body, TIME.size + 1 + i * ROW.size)
+        line = line.decode('ascii')
+        tokens = [_unpack_minutes(value) for value in minutes if value != MINUTES_NONE]
+        row = _format_row(destination.decode('ascii').rstrip(), tokens)
+        if not lines or lines[-1]['name'] != line:
+            lines.append({'name': line, 'destinations': []})
+        lines[-1]['destinations'].append(row)
+    return {'line': lines, 'timestamp': timestamp}
@@ -0,0 +1,156 @@
+import csv
+import json
+import logging
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+logger = logging.getLogger()
+
+STATION_INFORMATION_FILEPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'station-information.json')
+
+Place = namedtuple('Place', ['latitude', 'longitude', 'name'])
+
+ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'av': 'ave', 'road': 'rd', 'boulevard': 'blvd', 'drive': 'dr',
+    'place': 'pl', 'court': 'ct', 'lane': 'ln', 'parkway': 'pkwy', 'highway': 'hwy', 'square': 'sq',
+    'terrace': 'ter', 'circle': 'cir', 'mount': 'mt', 'saint': 'st',
+    'northwest': 'nw', 'northeast': 'ne', 'southwest': 'sw', 'southeast': 'se',
+    'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
+    'district': 'dc', 'columbia': 'dc', 'maryland': 'md', 'virginia': 'va',
+}
+IGNORED_TOKENS = {'of', 'the', 'station', 'usa', 'us'}
+
+
+def normalize(text: str):
+    '''
+    Split an address or a name into normalized tokens
+
+    "607 13th St. NW" and "607 13th Street Northwest" give the same tokens.
+
+    :param str text: The text to normalize
+    :return tuple: The tokens, in order
+    '''
+    tokens = re.split(r'[^a-z0-9]+', text.lower())
+    return tuple(ABBREVIATIONS.get(token, token) for token in tokens if token and token not in IGNORED_TOKENS)
+
+
+class Gazetteer:
+    """
+    Local geocoder over known places: station names, codes and street addresses, plus
+    any user supplied addresses.
+
+    A query matches a place when their normalized tokens are equal. Street addresses that
+    start with a house number and name a locality after a comma also match a query
+    containing all of their tokens, e.g. "607 13th Street NW, Washington, DC 20005, USA"
+    matches "607 13th St NW, Washington, DC"; the most specific match wins. Without a
+    locality the same street could be in any city, so "607 13th St NW" only matches
+    exactly. Station names and codes only match exactly, so that "1600 Potomac Ave,
+    Alexandria, VA" isn't taken for the Potomac Ave station.
+    """
+
+    def __init__(self):
+        self._exact = {}
+        self._places = []
+        self._postings = {}
+
+    def add(self, text: str, latitude: float, longitude: float, name: str = None, street_address: bool = False):
+        tokens = normalize(text)
+        if not tokens:
+            return
+        place = Place(latitude, longitude, name or text)
+        self._exact.setdefault(' '.join(tokens), place)
+        if not street_address or not tokens[0].isdigit() or not normalize(text.partition(',')[2]):
+            return
+        i = len(self._places)
+        self._places.append((frozenset(tokens), place))
+        for token in set(tokens):
+            self._postings.setdefault(token, []).append(i)
+
+    def add_stations(self, stations):
+        """Add the name, code and street address of every station of a ``jStations`` response."""
+        for station in stations:
+            lat, lon = station['Lat'], station['Lon']
+            self.add(station['Name'], lat, lon)
+            self.add(station['Code'], lat, lon, station['Name'])
+            address = station.get('Address') or {}
+            if address.get('Street'):
+                self.add(address['Street'], lat, lon, station['Name'], street_address=True)
+                self.add(f"{address['Street']}, {address.get('City', '')}, {address.get('State', '')} {address.get('Zip', '')}", lat, lon, station['Name'], street_address=True)
+
+    def load_csv(self, filepath: str):
+        '''
+        Add known addresses from a CSV file with "address", "latitude" and "longitude" columns
+
+        :param str filepath: Path of the CSV file
+        '''
+        with open(filepath, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                self.add(row['address'], float(row['latitude']), float(row['longitude']), street_address=True)
+
+    def geocode(self, address: str):
+        '''
+        Find a known place matching the address
+
+        :param str address: The address to look up
+        :return Place: The place, or None if nothing matches
+        '''
+        tokens = normalize(address)
+        place = self._exact.get(' '.join(tokens))
+        if place is not None:
+            return place
+        query = set(tokens)
+        hits = {}
+        for token in query:
+            for i in self._postings.get(token, ()):
+                hits[i] = hits.get(i, 0) + 1
+        best = None
+        for i, count in hits.items():
+            place_tokens = self._places[i][0]
+            if count == len(place_tokens) >= 2 and (best is None or count > len(self._places[best][0]) or (count == len(self._places[best][0]) and i < best)):
+                best = i
+        return self._places[best][1] if best is not None else None
+
+
+class GeocoderChain:
+    """
+    Tries each geocoder in turn, returning the first result.
+
+    Geocoders only need a ``geocode(address)`` method returning an object with ``latitude``
+    and ``longitude``, or None, like geopy's. A geocoder raising is logged and skipped.
+    """
+
+    def __init__(self, geocoders):
+        self.geocoders = list(geocoders)
+
+    def geocode(self, address: str):
+        for geocoder in self.geocoders:
+            try:
+                location = geocoder.geocode(address)
+            except Exception as e:
+                logger.warning(f'{type(geocoder).__name__} failed to geocode {address}', exc_info=e)
+                continue
+            if location:
+                logger.info(f'{type(geocoder).__name__} geocoded {address}')
+                return location
+        return None
+
+
+@lru_cache(maxsize=None)
+def local_gazetteer(csv_filepath: str = None):
+    '''
+    The gazetteer of the stations in station-information.json and of an optional CSV of known addresses
+
+    :param str csv_filepath: Path of a CSV of known addresses, see `Gazetteer.load_csv`
+    :return Gazetteer: The gazetteer, built once per CSV path
+    '''
+    gazetteer = Gazetteer()
+    try:
+        with open(STATION_INFORMATION_FILEPATH, 'r') as f:
+            gazetteer.add_stations(json.load(f)['Stations'])
+    except OSError as e:
+        logger.warning(f'Unable to load stations into the gazetteer', exc_info=e)
+    if csv_filepath:
+        gazetteer.load_csv(csv_filepath)
+    return gazetteer
@@ -0,0 +1,189 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+import metrics
+import recording
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger()
+
+CONNECT_TIMEOUT = float(os.getenv('WMATA_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.getenv('WMATA_READ_TIMEOUT', 10))
+MAX_RETRIES = int(os.getenv('WMATA_MAX_RETRIES', 3))
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POOL_SIZE = 10
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# every response to a GET is appended to the log named by WMATA_RECORD_PATH, if any
+RECORDER = recording.recorder_from_env()
+
+# the callback of `before_retries`, per thread: urllib3 retries on the thread that sent the request
+_retry_hooks = threading.local()
+
+
+class _CountingRetry(Retry):
+    # count the responses that were retried, e.g. 429s, which the final response hides
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        # raises once the budget is spent: the last attempt isn't retried, so it isn't counted
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        host = f'{_pool.host}:{_pool.port}' if _pool is not None else ''
+        if response is not None:
+            metrics.increment('http_retries_total', host=host, status=response.status)
+        else:
+            metrics.increment('http_retries_total', host=host, status='error')
+        before_retry = getattr(_retry_hooks, 'callback', None)
+        if before_retry is not None:
+            try:
+                before_retry()
+            except Exception as e:
+                # requests wraps whatever urllib3 raises, `before_retries` raises it as it was
+                _retry_hooks.error = e
+                raise
+        return retry
+
+
+@contextmanager
+def before_retries(callback):
+    """
+    Call a function before every retry of the requests this thread sends in the block.
+
+    Retries reach the upstream like any other call, e.g. `quota.QuotaGovernor.acquire`
+    takes a token for each of them. An exception raised by the function is raised instead
+    of retrying.
+
+    Args:
+        callback (function): Called without arguments.
+    """
+    previous = getattr(_retry_hooks, 'callback', None)
+    _retry_hooks.callback = callback
+    _retry_hooks.error = None
+    try:
+        yield
+    except requests.RequestException:
+        if _retry_hooks.error is not None:
+            raise _retry_hooks.error
+        raise
+    finally:
+        _retry_hooks.callback = previous
+        _retry_hooks.error = None
+
+
+def _build_session(retry: bool = True) -> requests.Session:
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    if retry:
+        retries = _CountingRetry(
+            total=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=['GET'],
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+    else:
+        # allowed_methods only covers status retries, urllib3 retries connect and read errors of any method
+        retries = Retry(total=0, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session(url: str, retry: bool = True) -> requests.Session:
+    """
+    Return the shared keep-alive session for the host of the given URL.
+
+    Args:
+        url (str): Any URL on the host.
+        retry (bool): The session retrying GETs, or the one that never retries anything.
+    Returns:
+        requests.Session: The session, created on first use.
+    """
+    parts = urlsplit(url)
+    host = f'{parts.scheme}://{parts.netloc}'
+    key = (host, retry)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                logger.info(f'Opening HTTP session for {host}{"" if retry else " without retries"}')
+                session = _sessions[key] = _build_session(retry)
+    return session
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """
+    Send a GET request through the host's pooled session.
+
+    GETs are retried with exponential backoff on connection errors and on
+    429/5xx responses, honouring ``Retry-After``. The final response is recorded
+    when ``WMATA_RECORD_PATH`` is set, see `recording`.
+
+    Args:
+        url (str): The URL to fetch.
+        **kwargs: Passed to `requests.Session.get`; ``timeout`` defaults to
+            ``(CONNECT_TIMEOUT, READ_TIMEOUT)``.
+    Returns:
+        requests.Response: The response.
+    """
+    kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+    recorder = RECORDER
+    if recorder is None:
+        return _count(url, get_session(url).get, url, **kwargs)
+    started = time.time()
+    response = _count(url, get_session(url).get, url, **kwargs)
+    try:
+        recorder.record(url, started, time.time() - started, response.status_code, response.content)
+    except OSError as e:
+        logger.warning(f'Unable to record the response of {recording.strip_api_key(url)}', exc_info=e)
+    return response
+
+
+def post(url: str, data=None, **kwargs) -> requests.Response:
+    """
+    Send a POST request through the host's pooled session that never retries, so a
+    push is sent at most once.
+
+    Args:
+        url (str): The URL to post to.
+        data: The request body.
+        **kwargs: Passed to `requests.Session.post`; ``timeout`` defaults to
+            ``(CONNECT_TIMEOUT, READ_TIMEOUT)``.
+    Returns:
+        requests.Response: The response.
+    """
+    if kwargs.get('timeout') is None:
+        kwargs['timeout'] = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    # a push replayed after a read error could be applied twice
+    return _count(url, get_session(url, retry=False).post, url, data=data, **kwargs)
+
+
+def _count(url, send, *args, **kwargs):
+    # responses by status, after retries, and requests that got no response at all
+    host = urlsplit(url).netloc
+    try:
+        response = send(*args, **kwargs)
+    except requests.RequestException:
+        metrics.increment('http_errors_total', host=host)
+        raise
+    metrics.increment('http_responses_total', host=host, status=response.status_code)
+    return response
+
+
+def close_all():
+    """Close every pooled session."""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
@@ -0,0 +1,174 @@
+import bisect
+import threading
+import time
+from functools import wraps
+
+from cache import all_cache_info
+
+PREFIX = 'wmata'
+
+# upper bounds, in seconds, of the stage duration histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_collectors = []
+
+
+class _Stage:
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+
+class timed:
+    """
+    Record how long a stage of the refresh takes, as a context manager or a decorator.
+
+    ```python
+    with metrics.timed('geocode'):
+        ...
+    ```
+    """
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.stage, time.perf_counter() - self.started)
+
+    def __call__(self, func):
+        stage = self.stage
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def observe(stage: str, seconds: float):
+    """Record one duration of a stage."""
+    with _lock:
+        entry = _stages.get(stage)
+        if entry is None:
+            entry = _stages[stage] = _Stage()
+        entry.observe(seconds)
+
+
+def increment(name: str, amount: int = 1, **labels):
+    """
+    Increment a counter.
+
+    Args:
+        name (str): Counter name, without the ``wmata_`` prefix, e.g. "http_responses_total".
+        amount (int): How much to add.
+        **labels: Label values of the counter.
+    """
+    key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def register_collector(collector):
+    """
+    Register a function called on every scrape, returning ``(name, labels, value)`` counters,
+    for values that are already counted elsewhere, like cache statistics.
+    """
+    with _lock:
+        _collectors.append(collector)
+
+
+def _cache_counters():
+    for name, info in all_cache_info().items():
+        yield 'cache_requests_total', {'cache': name, 'result': 'hit'}, info.hits
+        yield 'cache_requests_total', {'cache': name, 'result': 'disk_hit'}, info.disk_hits
+        yield 'cache_requests_total', {'cache': name, 'result': 'stale_hit'}, info.stale_hits
+        yield 'cache_requests_total', {'cache': name, 'result': 'miss'}, info.misses
+
+
+register_collector(_cache_counters)
+
+
+def _collect_counters():
+    with _lock:
+        counters = dict(_counters)
+        collectors = list(_collectors)
+    for collector in collectors:
+        for name, labels, value in collector():
+            key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+            counters[key] = counters.get(key, 0) + value
+    return counters
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+def render_prometheus() -> str:
+    """Render every stage histogram and counter in the Prometheus text format."""
+    with _lock:
+        stages = {stage: (entry.count, entry.total, list(entry.buckets)) for stage, entry in _stages.items()}
+    lines = [
+        f'# HELP {PREFIX}_stage_seconds Time spent in each stage of a refresh',
+        f'# TYPE {PREFIX}_stage_seconds histogram',
+    ]
+    for stage, (count, total, buckets) in sorted(stages.items()):
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS + ('+Inf',), buckets):
+            cumulative += bucket
+            lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {total}')
+        lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {count}')
+    declared = set()
+    for (name, labels), value in sorted(_collect_counters().items()):
+        if name not in declared:
+            declared.add(name)
+            lines.append(f'# TYPE {PREFIX}_{name} {"counter" if name.endswith("_total") else "gauge"}')
+        lines.append(f'{PREFIX}_{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def format_summary() -> str:
+    """Render a human readable table of the stage timings and cache hit ratios."""
+    with _lock:
+        stages = {stage: (entry.count, entry.total, entry.max) for stage, entry in _stages.items()}
+    lines = [f'{"stage":<24}{"calls":>8}{"total ms":>12}{"mean ms":>10}{"max ms":>10}']
+    for stage, (count, total, maximum) in sorted(stages.items(), key=lambda item: -item[1][1]):
+        lines.append(f'{stage:<24}{count:>8}{total * 1000:>12.2f}{total / count * 1000:>10.2f}{maximum * 1000:>10.2f}')
+    lookups = {}
+    for (name, labels), value in _collect_counters().items():
+        labels = dict(labels)
+        if name == 'cache_requests_total':
+            hits, total = lookups.get(labels['cache'], (0, 0))
+            lookups[labels['cache']] = (hits + (value if labels['result'] != 'miss' else 0), total + value)
+    for cache, (hits, total) in sorted(lookups.items()):
+        if total:
+            lines.append(f'cache {cache}: {hits}/{total} hits ({hits / total:.0%})')
+    return '\n'.join(lines)
+
+
+def reset():
+    """Drop every recorded timing and counter."""
+    with _lock:
+        _stages.clear()
+        _counters.clear()
@@ -0,0 +1,243 @@
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger()
+
+DEFAULT_PREDICTION_TTL = 15
+# how long an upstream request may take before callers get the last good value instead
+DEFAULT_LATENCY_BUDGET = 1.0
+# predictions older than this are useless, even with their minutes counted down
+DEFAULT_MAX_STALE = 600
+# delays, in seconds, of the background retries after an upstream failure; the last one repeats
+RETRY_BACKOFF = (1, 2, 4, 8, 16, 30)
+
+
+class _Flight:
+    """An upstream request in progress, shared by every caller waiting on the same key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.started = None
+        self.value = None
+        self.error = None
+
+
+class PredictionCache:
+    """
+    Short-lived, per-station cache for real time predictions with single-flight coalescing.
+
+    Concurrent callers asking for the same key while it's being fetched wait for that one
+    upstream request instead of making their own. Entries are aged from the moment the
+    upstream request started, so no caller ever gets data older than ``ttl`` seconds
+    while upstream is healthy.
+
+    The last good value of every key is kept for ``max_stale`` seconds. When upstream fails,
+    or takes longer than ``latency_budget`` seconds, callers get that value right away along
+    with its age (see `lookup`), the slow request finishes in the background, and failed keys
+    are retried in the background with `RETRY_BACKOFF`, serving the stale value meanwhile.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_PREDICTION_TTL, latency_budget: float = DEFAULT_LATENCY_BUDGET,
+                 max_stale: float = DEFAULT_MAX_STALE):
+        self.ttl = ttl
+        self.latency_budget = latency_budget
+        self.max_stale = max_stale
+        self._entries = {}
+        self._flights = {}
+        self._retrying = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale = 0
+
+    def get(self, key, fetch):
+        """
+        Return the cached value for key, calling fetch at most once across concurrent callers.
+
+        Args:
+            key (str): The cache key, e.g. a station code.
+            fetch (function): Called without arguments to load the value on a miss.
+        Returns:
+            The cached or freshly fetched value.
+        """
+        return self.get_many([key], lambda keys: {key: fetch()})[key]
+
+    def get_many(self, keys, fetch):
+        """
+        Return the cached values for many keys, loading all the missing ones with one fetch call.
+
+        Like `lookup`, without the age of the values.
+
+        Args:
+            keys (list): The cache keys, e.g. station codes.
+            fetch (function): Called with the list of missing keys, returns a dict of values by key.
+                Extra keys in its result are cached too.
+        Returns:
+            dict: The values by key.
+        """
+        return {key: value for key, (value, stale_seconds, fetched) in self.lookup(keys, fetch).items()}
+
+    def lookup(self, keys, fetch):
+        """
+        Return the values for many keys with how stale they are, loading all the missing ones
+        with one fetch call.
+
+        Keys already being fetched by another caller are waited on rather than fetched again.
+        Keys with a last good value are never waited on for more than ``latency_budget`` seconds,
+        and get that value if the fetch fails. Keys with no usable value wait for the fetch,
+        and its error is raised if it fails.
+
+        Args:
+            keys (list): The cache keys, e.g. station codes.
+            fetch (function): Called with the list of missing keys, returns a dict of values by key.
+                Extra keys in its result are cached too.
+        Returns:
+            dict: ``(value, stale_seconds, fetched)`` by key, where ``stale_seconds`` is 0 for a fresh
+            value, or the age of the last good value served in its place, and ``fetched`` is when
+            the value served was fetched, in `time.monotonic` seconds, as in `generation`.
+        """
+        result = {}
+        waiting = {}
+        leading = {}
+        stale = {}
+        with self._lock:
+            now = time.monotonic()
+            for key in dict.fromkeys(keys):
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[0] < self.ttl:
+                    self.hits += 1
+                    result[key] = (entry[1], 0, entry[0])
+                    continue
+                if entry is not None and now - entry[0] < self.max_stale:
+                    stale[key] = entry
+                    if key in self._retrying:
+                        # upstream is failing and already being retried, don't add to the pile
+                        self.stale += 1
+                        result[key] = (entry[1], now - entry[0], entry[0])
+                        continue
+                if key in self._flights:
+                    self.coalesced += 1
+                    waiting[key] = self._flights[key]
+                else:
+                    self.misses += 1
+                    leading[key] = self._flights[key] = _Flight()
+
+        if leading:
+            if any(key in stale for key in leading):
+                # whoever has a stale value to fall back on shouldn't wait for the whole request
+                threading.Thread(target=self._fly, args=(leading, fetch), name='prediction-refresh', daemon=True).start()
+            else:
+                self._fly(leading, fetch)
+            waiting.update(leading)
+
+        for key, flight in waiting.items():
+            if key in stale:
+                flight.done.wait(self.latency_budget)
+            else:
+                flight.done.wait()
+            if flight.done.is_set() and flight.error is None:
+                result[key] = (flight.value, 0, flight.started)
+            elif key in stale:
+                with self._lock:
+                    self.stale += 1
+                started, value = stale[key]
+                result[key] = (value, time.monotonic() - started, started)
+            else:
+                raise flight.error
+        return result
+
+    def _fly(self, leading, fetch):
+        # run one upstream request for the keys led by this caller, and retry in the background if it fails
+        started = time.monotonic()
+        for flight in leading.values():
+            flight.started = started
+        try:
+            values = fetch(list(leading))
+        except Exception as e:
+            logger.warning(f'Unable to fetch predictions for {",".join(leading)}', exc_info=e)
+            for flight in leading.values():
+                flight.error = e
+        else:
+            with self._lock:
+                for key, value in values.items():
+                    self._entries[key] = (started, value)
+            for key, flight in leading.items():
+                flight.value = values.get(key)
+        finally:
+            with self._lock:
+                for key in leading:
+                    del self._flights[key]
+                # registered before waking the waiters, so the next callers see the retry coming
+                now = time.monotonic()
+                retry = [key for key, flight in leading.items() if flight.error is not None and key not in self._retrying
+                         and key in self._entries and now - self._entries[key][0] < self.max_stale]
+                self._retrying.update(retry)
+            for flight in leading.values():
+                flight.done.set()
+        if retry:
+            threading.Thread(target=self._retry, args=(retry, fetch), name='prediction-retry', daemon=True).start()
+
+    def _retry(self, retrying, fetch):
+        # until the keys recover, or their last good value is too old to be worth serving
+        keys = retrying
+        try:
+            for attempt in itertools.count():
+                time.sleep(RETRY_BACKOFF[min(attempt, len(RETRY_BACKOFF) - 1)])
+                with self._lock:
+                    now = time.monotonic()
+                    keys = [key for key in keys if key in self._entries and now - self._entries[key][0] < self.max_stale]
+                if not keys:
+                    return
+                started = time.monotonic()
+                try:
+                    values = fetch(keys)
+                except Exception as e:
+                    logger.warning(f'Retry {attempt + 1} of predictions for {",".join(keys)} failed', exc_info=e)
+                    continue
+                with self._lock:
+                    for key, value in values.items():
+                        self._entries[key] = (started, value)
+                logger.info(f'Predictions for {",".join(keys)} recovered after {attempt + 1} retries')
+                return
+        finally:
+            with self._lock:
+                self._retrying.difference_update(retrying)
+
+    def generation(self, keys):
+        """
+        Identify the fresh values of keys, to cache what is derived from them.
+
+        Args:
+            keys (list): The cache keys, e.g. station codes.
+        Returns:
+            tuple: When each value was fetched, in `time.monotonic` seconds, which changes
+            with every refresh of any of them; None if any key has no fresh value.
+        """
+        with self._lock:
+            now = time.monotonic()
+            started = []
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or now - entry[0] >= self.ttl:
+                    return None
+                started.append(entry[0])
+        return tuple(started)
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: ``hits``, ``misses`` (keys loaded from upstream), ``coalesced`` (keys that
+            shared another caller's in-flight upstream request) and ``stale`` (keys answered
+            with their last good value because upstream failed or was too slow).
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced, 'stale': self.stale}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,176 @@
+import logging
+import os
+import struct
+import threading
+import time
+from datetime import date
+
+import requests
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: the bucket is still shared by the threads of a process, not between processes
+    fcntl = None
+
+logger = logging.getLogger()
+
+# priorities: live predictions may use the whole budget, station list and timings refreshes leave a reserve
+HIGH = 'high'
+LOW = 'low'
+
+# WMATA's default tier allows 10 calls per second and 50,000 calls per day, per API key; stay a
+# little under the rate, since calls spaced out here can still reach WMATA bunched together
+DEFAULT_RATE = 9
+DEFAULT_BURST = 5
+DEFAULT_DAILY_LIMIT = 50000
+# share of the burst and of the daily quota kept for high priority calls
+DEFAULT_RESERVE = 0.5
+# longest a call waits for a token before giving up
+DEFAULT_MAX_WAIT = 10
+
+# tokens, time of the last refill, day (ordinal) and calls made that day
+STATE = struct.Struct('<ddII')
+
+
+class QuotaExceeded(requests.RequestException):
+    """Raised instead of calling upstream when the rate limit or the daily quota would be exceeded."""
+
+
+class QuotaGovernor:
+    """
+    Token bucket shared by every process on the machine that calls WMATA with the same key.
+
+    The bucket lives in a small state file, read and written under an exclusive ``flock``,
+    so ``api.py`` workers, ``app.py`` runs and the daemon all draw from one budget: ``rate``
+    calls per second with bursts of up to ``burst`` calls, and ``daily_limit`` calls per
+    local calendar day.
+
+    `HIGH` priority calls may empty the bucket. `LOW` priority calls leave ``reserve`` of the
+    burst and of the daily quota to the high priority ones, so refreshing the static
+    station data never delays live predictions. A ``rate`` of 0 turns the governor off.
+
+    Args:
+        filepath (str): The state file, created if missing. Relative paths are resolved on the
+            first call, like the `jsonfilecache` files.
+        rate (float): Tokens added per second.
+        burst (float): Size of the bucket.
+        daily_limit (int): Calls allowed per day.
+        reserve (float): Share of the burst and of the daily limit low priority calls may not use.
+        max_wait (float): Seconds a call may wait for a token before `QuotaExceeded` is raised.
+    """
+
+    def __init__(self, filepath: str, rate: float = DEFAULT_RATE, burst: float = DEFAULT_BURST,
+                 daily_limit: int = DEFAULT_DAILY_LIMIT, reserve: float = DEFAULT_RESERVE, max_wait: float = DEFAULT_MAX_WAIT):
+        self.filepath = filepath
+        self.rate = rate
+        self.burst = burst
+        self.daily_limit = daily_limit
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+
+    def _refill(self, data, now, today):
+        # tokens and calls used today, from the state file's content
+        if len(data) != STATE.size:
+            return self.burst, 0
+        tokens, updated, day, used = STATE.unpack(data)
+        tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+        return tokens, used if day == today else 0
+
+    def _transact(self, update):
+        # run update(tokens, used) -> (result, tokens, used) on the refilled shared state
+        with self._lock:
+            if self._pid != os.getpid():
+                # a forked child must not share the parent's open file, or their locks would be one
+                self._fd = os.open(self.filepath, os.O_RDWR | os.O_CREAT, 0o644)
+                self._pid = os.getpid()
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                today = date.today().toordinal()
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                tokens, used = self._refill(os.read(self._fd, STATE.size), now, today)
+                result, tokens, used = update(tokens, used)
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, STATE.pack(tokens, now, today, used))
+                return result
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def acquire(self, priority: str = HIGH):
+        """
+        Take a token for one upstream call, waiting for it if needed.
+
+        Args:
+            priority (str): `HIGH` or `LOW`.
+        Returns:
+            float: Seconds spent waiting.
+        Raises:
+            QuotaExceeded: The daily quota is spent, or no token came within ``max_wait`` seconds.
+        """
+        if self.rate <= 0:
+            return 0.0
+        floor = 0 if priority == HIGH else min(self.burst * self.reserve, self.burst - 1)
+        daily_limit = self.daily_limit if priority == HIGH else self.daily_limit * (1 - self.reserve)
+
+        def take(tokens, used):
+            if used >= daily_limit:
+                return None, tokens, used
+            if tokens >= floor + 1:
+                return 0.0, tokens - 1, used + 1
+            return (floor + 1 - tokens) / self.rate, tokens, used
+
+        waited = 0.0
+        while True:
+            wait = self._transact(take)
+            if wait is None:
+                metrics.increment('quota_rejections_total', priority=priority, reason='daily')
+                raise QuotaExceeded(f'Daily WMATA quota of {daily_limit:.0f} {priority} priority calls spent')
+            if not wait:
+                if waited:
+                    metrics.increment('quota_waits_total', priority=priority)
+                return waited
+            if waited + wait > self.max_wait:
+                metrics.increment('quota_rejections_total', priority=priority, reason='rate')
+                raise QuotaExceeded(f'No WMATA {priority} priority call available within {self.max_wait} seconds')
+            time.sleep(wait)
+            waited += wait
+
+    def remaining(self):
+        """
+        Return what is left of the budget, as every process sees it.
+
+        Returns:
+            dict: ``tokens`` in the bucket now, and ``daily`` calls left today.
+        """
+        if self.rate <= 0:
+            return {'tokens': self.burst, 'daily': self.daily_limit}
+        # read only: a metrics scrape neither creates nor rewrites the state file
+        try:
+            fd = os.open(self.filepath, os.O_RDONLY)
+        except FileNotFoundError:
+            return {'tokens': self.burst, 'daily': self.daily_limit}
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+            tokens, used = self._refill(os.read(fd, STATE.size), time.time(), date.today().toordinal())
+        finally:
+            os.close(fd)
+        return {'tokens': tokens, 'daily': self.daily_limit - used}
+
+
+def quota_counters(governor: QuotaGovernor):
+    """A `metrics.register_collector` collector of a governor's remaining budget."""
+    try:
+        remaining = governor.remaining()
+    except OSError as e:
+        logger.warning(f'Unable to read the WMATA quota state {governor.filepath}', exc_info=e)
+        return
+    yield 'quota_tokens', {}, round(remaining['tokens'], 3)
+    yield 'quota_daily_remaining', {}, remaining['daily']
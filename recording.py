@@ -0,0 +1,136 @@
+"""
+Append-only log of upstream responses, to replay real traffic offline (see ``benchmarks/replay.py``).
+
+A log is a header, then one record per response:
+
+    header   magic "WMRL", version
+    record   length of the compressed payload (uint32, little-endian), then the payload:
+             the zlib-compressed JSON of the response's ``time`` (epoch seconds the request
+             started), ``elapsed`` seconds, ``url`` without its ``api_key``, ``status`` and ``body``
+
+Every record is compressed on its own, so a log can be appended to by many processes and
+read as a stream, one record at a time, whatever its size.
+"""
+import json
+import logging
+import os
+import re
+import struct
+import tempfile
+import threading
+import zlib
+
+logger = logging.getLogger()
+
+MAGIC = b'WMRL'
+VERSION = 1
+HEADER = struct.Struct('<4sB')
+LENGTH = struct.Struct('<I')
+
+_API_KEY = re.compile(r'([?&])api_key=[^&]*&?')
+
+
+def strip_api_key(url: str) -> str:
+    """
+    Remove the ``api_key`` query parameter of a URL, so that recordings can be shared.
+
+    Args:
+        url (str): The URL.
+    Returns:
+        str: The URL without its API key.
+    """
+    return _API_KEY.sub(lambda match: match.group(1) if match.group(0).endswith('&') else '', url)
+
+
+class Recorder:
+    """
+    Appends responses to a log file, from any number of threads and processes.
+
+    Each record is written with a single ``write`` on a file opened in append mode, so
+    records of concurrent writers never interleave.
+
+    Args:
+        filepath (str): The log, created with its header if missing.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+
+    def _open(self):
+        if self._pid != os.getpid():
+            if not os.path.exists(self.filepath):
+                # created with its header in one step, so no writer can append before the header
+                directory = os.path.dirname(self.filepath) or '.'
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(self.filepath)}.', suffix='.tmp')
+                try:
+                    os.write(fd, HEADER.pack(MAGIC, VERSION))
+                    os.close(fd)
+                    os.link(tmp_path, self.filepath)
+                except FileExistsError:
+                    pass
+                finally:
+                    os.unlink(tmp_path)
+            self._fd = os.open(self.filepath, os.O_WRONLY | os.O_APPEND)
+            self._pid = os.getpid()
+        return self._fd
+
+    def record(self, url: str, started: float, elapsed: float, status: int, body: bytes):
+        """
+        Append one response.
+
+        Args:
+            url (str): The requested URL, its API key is stripped.
+            started (float): When the request started, in epoch seconds.
+            elapsed (float): How long the response took, in seconds.
+            status (int): The HTTP status.
+            body (bytes): The response body, UTF-8.
+        """
+        payload = zlib.compress(json.dumps({
+            'time': started,
+            'elapsed': elapsed,
+            'url': strip_api_key(url),
+            'status': status,
+            'body': body.decode('utf-8', errors='replace'),
+        }, separators=(',', ':')).encode())
+        with self._lock:
+            os.write(self._open(), LENGTH.pack(len(payload)) + payload)
+
+
+def read_records(filepath: str):
+    """
+    Stream the records of a log, in the order they were written.
+
+    Args:
+        filepath (str): The log.
+    Yields:
+        dict: ``time``, ``elapsed``, ``url``, ``status`` and ``body`` of every response.
+    """
+    with open(filepath, 'rb') as f:
+        magic, version = HEADER.unpack(f.read(HEADER.size).ljust(HEADER.size, b'\0'))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'Not a version {VERSION} recording')
+        while True:
+            prefix = f.read(LENGTH.size)
+            if not prefix:
+                return
+            (length,) = LENGTH.unpack(prefix.ljust(LENGTH.size, b'\0'))
+            payload = f.read(length)
+            if len(prefix) < LENGTH.size or len(payload) < length:
+                # a writer was killed mid-record, or is still writing it
+                logger.warning(f'Truncated record at the end of {filepath}')
+                return
+            yield json.loads(zlib.decompress(payload))
+
+
+def recorder_from_env():
+    """
+    Return the `Recorder` of the log named by ``WMATA_RECORD_PATH``.
+
+    Returns:
+        Recorder: The recorder, or None when the variable isn't set.
+    """
+    filepath = os.getenv('WMATA_RECORD_PATH')
+    return Recorder(filepath) if filepath else None
@@ -0,0 +1,84 @@
+import logging
+import threading
+
+from wmata_locator import WmataLocator
+
+logger = logging.getLogger()
+
+HOUR_IN_SECONDS = 60 * 60
+
+
+class LocatorRegistry:
+    """
+    Long-lived registry of `WmataLocator` instances, one per address.
+
+    Locators are built on first use and then shared by every request, so a request only
+    pays for the prediction fetch. A background thread rebuilds them every
+    ``refresh_seconds``; the station list and timings come from `jsonfilecache`, so a
+    rebuild only reaches upstream once their own TTL has expired. A failed rebuild keeps
+    serving the previous locator.
+    """
+
+    def __init__(self, api_key: str, refresh_seconds: int = HOUR_IN_SECONDS):
+        self.api_key = api_key
+        self.refresh_seconds = refresh_seconds
+        self._locators = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+
+    def get(self, address: str) -> WmataLocator:
+        """
+        Return the locator for the given address, building it on first use.
+
+        Args:
+            address (str): The address the locator is centered on.
+        Returns:
+            WmataLocator: The shared locator.
+        """
+        locator = self._locators.get(address)
+        if locator is not None:
+            return locator
+        with self._lock:
+            locator = self._locators.get(address)
+            if locator is None:
+                logger.info(f'Building locator for {address}')
+                locator = WmataLocator(self.api_key, address)
+                self._locators = {**self._locators, address: locator}
+        return locator
+
+    def reload(self):
+        """Rebuild every known locator and swap them in at once."""
+        with self._lock:
+            addresses = list(self._locators)
+        reloaded = {}
+        for address in addresses:
+            try:
+                reloaded[address] = WmataLocator(self.api_key, address)
+            except Exception as e:
+                logger.error(f'Unable to reload locator for {address}, keeping the previous one', exc_info=e)
+        with self._lock:
+            self._locators = {**self._locators, **reloaded}
+        logger.info(f'Reloaded {len(reloaded)}/{len(addresses)} locators')
+
+    def start(self):
+        """Start the background refresher thread, if it's not already running."""
+        if self._refresher is not None:
+            return
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._stop.clear()
+            self._refresher = threading.Thread(target=self._refresh_loop, name='locator-refresher', daemon=True)
+            self._refresher.start()
+
+    def stop(self):
+        """Stop the background refresher thread."""
+        self._stop.set()
+        refresher, self._refresher = self._refresher, None
+        if refresher is not None:
+            refresher.join()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_seconds):
+            self.reload()
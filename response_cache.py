@@ -0,0 +1,86 @@
+import gzip
+import hashlib
+import threading
+import time
+
+import metrics
+
+
+class CachedBody:
+    """
+    A serialized response body, with its strong ETag and its gzip encoding, both computed once.
+
+    Args:
+        body (bytes): The response body.
+        expires (float): `time.monotonic` time after which the body may be out of date.
+    """
+    __slots__ = ('body', 'gzipped', 'etag', 'expires')
+
+    def __init__(self, body: bytes, expires: float):
+        self.body = body
+        # mtime=0, so that the same body always compresses to the same bytes
+        self.gzipped = gzip.compress(body, mtime=0)
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.expires = expires
+
+    def max_age(self):
+        """Whole seconds the body stays fresh, for ``Cache-Control: max-age``."""
+        return max(0, int(self.expires - time.monotonic()))
+
+
+class ResponseCache:
+    """
+    Serialized response bodies, per key and refresh generation.
+
+    A generation identifies the data a body was built from, e.g. the fetch times of the
+    cached predictions of a station (see `PredictionCache.generation`). Bodies are kept until
+    their key gets a new generation, so between two refreshes every request is served the
+    same bytes without formatting or serializing anything.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, generation):
+        """
+        Return the body cached for a generation of a key.
+
+        Args:
+            key: The cache key, e.g. a tuple of station codes.
+            generation: The current generation of the key's data, None if it has none.
+        Returns:
+            CachedBody: The body, or None if it isn't cached for this generation.
+        """
+        if generation is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] != generation:
+            metrics.increment('cache_requests_total', cache='responses', result='miss')
+            return None
+        metrics.increment('cache_requests_total', cache='responses', result='hit')
+        return entry[1]
+
+    def put(self, key, generation, body: bytes, expires: float):
+        """
+        Cache the body of a generation of a key, replacing the previous generation's.
+
+        Args:
+            key: The cache key.
+            generation: The generation the body was built from. Bodies without one, e.g.
+                built from stale data, are not cached.
+            body (bytes): The response body.
+            expires (float): `time.monotonic` time the generation stops being fresh.
+        Returns:
+            CachedBody: The body, ready to serve.
+        """
+        cached = CachedBody(body, expires)
+        if generation is not None:
+            with self._lock:
+                self._entries[key] = (generation, cached)
+        return cached
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,142 @@
+import logging
+import random
+from datetime import datetime, timedelta
+
+logger = logging.getLogger()
+
+# bounds, in seconds, of the wait between two polls of a station while trains are running
+DEFAULT_MIN_INTERVAL = 15
+DEFAULT_MAX_INTERVAL = 90
+# poll again after this fraction of the time left until the next arrival
+DEFAULT_ARRIVAL_FRACTION = 0.25
+# minutes before an arrival when freshness matters most, polled at the min interval
+IMMINENT_ARRIVAL = 2
+# spread the polls of different stations by up to this fraction of their interval, either way
+DEFAULT_JITTER = 0.1
+# start polling this long before a station opens, so the first trains show up on time
+OPENING_LEAD = timedelta(minutes=5)
+# and keep polling this long after its last train, which is often a little late
+CLOSING_GRACE = timedelta(minutes=15)
+# how far ahead to look for the next opening before giving up and polling at the max interval
+LOOKAHEAD_DAYS = 7
+
+
+class AdaptiveScheduler:
+    """
+    Decides when to poll a station next, from its service hours and its upcoming arrivals.
+
+    While a station is closed there is nothing to poll: the next poll is when it opens
+    (minus `OPENING_LEAD`). A last train earlier than the opening time runs after midnight,
+    on the next calendar day. While trains are running, the wait is a fraction of the time
+    until the next arrival, between ``min_interval`` and ``max_interval`` seconds, with
+    random jitter so that many stations don't all poll in lockstep. Once the next arrival is
+    `IMMINENT_ARRIVAL` minutes away or less the wait is ``min_interval``, and a longer wait
+    never runs past that point.
+
+    The timings index is anything with the `TimingsIndex.hours` contract, e.g. a
+    `TimingsIndex` or a `StationData`. Stations it doesn't know are always open.
+    """
+
+    def __init__(self, timings_index, min_interval: float = DEFAULT_MIN_INTERVAL, max_interval: float = DEFAULT_MAX_INTERVAL,
+                 arrival_fraction: float = DEFAULT_ARRIVAL_FRACTION, jitter: float = DEFAULT_JITTER, rng: random.Random = None):
+        self.timings_index = timings_index
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.arrival_fraction = arrival_fraction
+        self.jitter = jitter
+        self._rng = rng or random.Random()
+
+    def _service(self, station_code: str, day: datetime):
+        # (start, end) of the service starting on the day, or None if the station doesn't open
+        try:
+            opening_minutes, last_train_minutes = self.timings_index.hours(station_code, day.weekday())
+        except KeyError:
+            return None
+        midnight = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        start = midnight + timedelta(minutes=opening_minutes)
+        end = midnight + timedelta(minutes=last_train_minutes)
+        if end < start:
+            end += timedelta(days=1)
+        return start - OPENING_LEAD, end + CLOSING_GRACE
+
+    def closed_until(self, station_codes, now: datetime):
+        """
+        Tell whether a station is closed, and until when.
+
+        Args:
+            station_codes (str or list): The station code, e.g. "A01", or the codes of a station
+                complex (see `wmata_locator.station_complex`), open while any of its platforms is.
+            now (datetime): The current local time.
+        Returns:
+            datetime: When polling should resume, or None if the station is open.
+        """
+        if isinstance(station_codes, str):
+            station_codes = [station_codes]
+        resumes = []
+        for station_code in station_codes:
+            resume = self._closed_until(station_code, now)
+            if resume is None:
+                return None
+            resumes.append(resume)
+        return min(resumes)
+
+    def _closed_until(self, station_code, now):
+        if station_code not in self.timings_index:
+            return None
+        # yesterday's service may still be running past midnight
+        for days in range(-1, LOOKAHEAD_DAYS + 1):
+            service = self._service(station_code, now + timedelta(days=days))
+            if service is None:
+                continue
+            start, end = service
+            if start <= now <= end:
+                return None
+            if now < start:
+                return start
+        return None
+
+    def interval(self, line_map: dict = None):
+        """
+        Seconds to wait before polling an open station again.
+
+        Args:
+            line_map (dict): The arrival minutes, keyed by line then destination, as in the
+                "line" of `WmataLocator.find_closest_train_prediction`.
+        Returns:
+            float: The wait, jittered.
+        """
+        arrivals = [minutes for destinations in (line_map or {}).values() for times in destinations.values()
+                    for minutes in times if isinstance(minutes, int)]
+        next_arrival = min(arrivals) if arrivals else None
+        if next_arrival is None:
+            wait = self.max_interval
+        elif next_arrival <= IMMINENT_ARRIVAL:
+            wait = self.min_interval
+        else:
+            wait = next_arrival * 60 * self.arrival_fraction
+        wait = min(self.max_interval, max(self.min_interval, wait))
+        wait *= self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+        if next_arrival is not None and next_arrival > IMMINENT_ARRIVAL:
+            # arrival minutes are rounded down, the train is at least this far from imminent
+            wait = min(wait, max(self.min_interval, (next_arrival - IMMINENT_ARRIVAL) * 60))
+        return wait
+
+    def next_poll(self, station_codes, now: datetime, line_map: dict = None):
+        """
+        Seconds to wait before polling a station again.
+
+        Args:
+            station_codes (str or list): The station code, or the codes of a station complex,
+                see `closed_until`.
+            now (datetime): The current local time.
+            line_map (dict): The arrival minutes of the last poll, if any.
+        Returns:
+            float: The wait.
+        """
+        resume = self.closed_until(station_codes, now)
+        if resume is not None:
+            name = station_codes if isinstance(station_codes, str) else ','.join(station_codes)
+            logger.info(f'{name} is closed, next poll at {resume.isoformat()}')
+            # a little jitter on opening too, every station of a line opens at the same time
+            return (resume - now).total_seconds() + self._rng.uniform(0, self.min_interval)
+        return self.interval(line_map)
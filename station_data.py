@@ -0,0 +1,272 @@
+"""
+Compiled station dataset: the ``jStations`` and ``jStationTimes`` data in a compact binary
+file, memory-mapped read-only so every process shares the same pages.
+
+Layout, little-endian:
+
+    header   magic "WMST", version, station count, offset of the name table
+    records  one `RECORD` per station, sorted by code: code, sibling station
+             (StationTogether1), line bitmask (see `LINES`), name id, latitude,
+             longitude, then opening and last train minutes for Monday to Sunday
+             (`NO_SERVICE` when closed)
+    names    name count, count + 1 offsets, then the UTF-8 names, each stored once
+"""
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections.abc import Sequence
+from functools import lru_cache
+
+from timings_index import WEEKDAYS, TimingsIndex
+
+logger = logging.getLogger()
+
+MAGIC = b'WMST'
+VERSION = 1
+LINES = ('RD', 'BL', 'OR', 'SV', 'GR', 'YL')
+NO_SERVICE = 0xFFFF
+
+HEADER = struct.Struct('<4sBxHI')
+RECORD = struct.Struct('<3s3sBxHdd14H')
+UINT32 = struct.Struct('<I')
+HOURS = struct.Struct('<2H')
+# where the opening and last train minutes start in a record
+HOURS_OFFSET = struct.calcsize('<3s3sBxHdd')
+
+
+def compile_station_data(stations, station_timings, filepath: str):
+    """
+    Write the station dataset file, atomically.
+
+    Args:
+        stations (list): The "Stations" of a ``jStations`` response.
+        station_timings (dict): The ``jStationTimes`` response.
+        filepath (str): Where to write the file.
+    """
+    timings = TimingsIndex(station_timings)
+    names = {}
+    records = []
+    for station in sorted(stations, key=lambda station: station['Code']):
+        code = station['Code']
+        lines = 0
+        for i in range(1, 5):
+            line = station.get(f'LineCode{i}')
+            if line:
+                lines |= 1 << LINES.index(line)
+        week = []
+        for weekday in range(len(WEEKDAYS)):
+            try:
+                week.extend(timings.hours(code, weekday))
+            except KeyError:
+                week.extend((NO_SERVICE, NO_SERVICE))
+        name_id = names.setdefault(station['Name'], len(names))
+        records.append(RECORD.pack(code.encode(), (station.get('StationTogether1') or '').encode(), lines, name_id,
+                                   station['Lat'], station['Lon'], *week))
+
+    encoded_names = [name.encode() for name in names]
+    offsets = [0]
+    for name in encoded_names:
+        offsets.append(offsets[-1] + len(name))
+    names_offset = HEADER.size + RECORD.size * len(records)
+    data = b''.join([
+        HEADER.pack(MAGIC, VERSION, len(records), names_offset),
+        *records,
+        UINT32.pack(len(encoded_names)),
+        struct.pack(f'<{len(offsets)}I', *offsets),
+        *encoded_names,
+    ])
+
+    directory = os.path.dirname(filepath) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(filepath)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class StationData:
+    """
+    Read-only view over a compiled station dataset.
+
+    Lookups binary search the records in place, so opening a file costs a header read,
+    whatever its size. `hours` has the same contract as `TimingsIndex.hours`, so a
+    `StationData` can stand in for the timings index.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        magic, version, self._count, names_offset = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'Not a version {VERSION} station data file')
+        (name_count,) = UINT32.unpack_from(buffer, names_offset)
+        self._name_offsets = names_offset + UINT32.size
+        self._names = self._name_offsets + UINT32.size * (name_count + 1)
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, filepath: str):
+        """Memory-map a file written by `compile_station_data`."""
+        with open(filepath, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, station_code):
+        return self._find(station_code) is not None
+
+    def _find(self, station_code):
+        # offset of the station's record, or None
+        key = station_code.encode()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * RECORD.size
+            code = self._buffer[offset:offset + 3]
+            if code == key:
+                return offset
+            if code < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _name(self, name_id):
+        start, end = struct.unpack_from('<2I', self._buffer, self._name_offsets + UINT32.size * name_id)
+        return self._buffer[self._names + start:self._names + end].decode()
+
+    def hours(self, station_code: str, weekday: int):
+        """
+        Get the service hours of a station.
+
+        Args:
+            station_code (str): The station code, e.g. "A01".
+            weekday (int): Day of the week, Monday being 0 as in `datetime.weekday`.
+        Returns:
+            tuple: Opening time and last train time, in minutes since midnight, see
+            `TimingsIndex.hours`.
+        """
+        offset = self._find(station_code)
+        if offset is None:
+            raise KeyError(station_code)
+        hours = HOURS.unpack_from(self._buffer, offset + HOURS_OFFSET + HOURS.size * weekday)
+        if hours[0] == NO_SERVICE:
+            raise KeyError(f'No service hours for {station_code} on {WEEKDAYS[weekday]}')
+        return hours
+
+    def station(self, station_code: str):
+        """
+        Get a station in the shape of a ``jStations`` record, without its address.
+
+        Args:
+            station_code (str): The station code, e.g. "A01".
+        Returns:
+            dict: The station.
+        """
+        offset = self._find(station_code)
+        if offset is None:
+            raise KeyError(station_code)
+        return self._record(offset)
+
+    def _record(self, offset):
+        code, sibling, lines, name_id, lat, lon = RECORD.unpack_from(self._buffer, offset)[:6]
+        line_codes = [line for i, line in enumerate(LINES) if lines & (1 << i)]
+        line_codes += [None] * (4 - len(line_codes))
+        return {
+            'Code': code.decode(),
+            'Name': self._name(name_id),
+            'StationTogether1': sibling.rstrip(b'\0').decode(),
+            'StationTogether2': '',
+            'LineCode1': line_codes[0],
+            'LineCode2': line_codes[1],
+            'LineCode3': line_codes[2],
+            'LineCode4': line_codes[3],
+            'Lat': lat,
+            'Lon': lon,
+        }
+
+    def stations(self):
+        """
+        Get every station, in the shape of the "Stations" of a ``jStations`` response.
+
+        Returns:
+            StationRecords: The stations, sorted by code, read from the file as they are accessed.
+        """
+        return StationRecords(self)
+
+    def codes(self):
+        """
+        Get the code of every station.
+
+        Returns:
+            tuple: The station codes, sorted.
+        """
+        return tuple(self._buffer[offset:offset + 3].decode() for offset in range(HEADER.size, HEADER.size + self._count * RECORD.size, RECORD.size))
+
+    def index(self):
+        """
+        Get the spatial index of the stations, built on first use and shared by every locator.
+
+        Returns:
+            StationIndex: The index, over `stations`.
+        """
+        from station_index import StationIndex  # pulls in geopy, not needed to compile the file
+        with self._index_lock:
+            if self._index is None:
+                self._index = StationIndex(self.stations())
+            return self._index
+
+
+class StationRecords(Sequence):
+    """
+    The stations of a `StationData`, as a read-only sequence of ``jStations`` records.
+
+    Records are decoded from the file every time they are accessed, not kept, so the
+    stations don't take any heap in the processes sharing the file.
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data: StationData):
+        self._data = data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('station index out of range')
+        return self._data._record(HEADER.size + i * RECORD.size)
+
+
+@lru_cache(maxsize=None)
+def open_station_data(filepath: str):
+    """Return the `StationData` of a file, opened once per process."""
+    return StationData.open(filepath)
+
+
+def station_data_from_env():
+    """
+    Return the station dataset named by ``WMATA_STATION_DATA``.
+
+    Returns:
+        StationData: The dataset, or None when the variable isn't set or the file can't be read.
+    """
+    filepath = os.getenv('WMATA_STATION_DATA')
+    if not filepath:
+        return None
+    try:
+        return open_station_data(filepath)
+    except (OSError, ValueError) as e:
+        logger.warning(f'Unable to open station data {filepath}, using the WMATA station list and timings', exc_info=e)
+        return None
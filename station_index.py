@@ -0,0 +1,139 @@
+import json
+import math
+import threading
+from collections.abc import Sequence
+
+from geopy.distance import geodesic
+
+EARTH_RADIUS_MILES = 3958.7613
+
+# haversine on a sphere differs from the WGS-84 geodesic by well under 0.5%, so any
+# station within this margin of the k-th best haversine distance is a finalist
+HAVERSINE_ERROR_MARGIN = 0.005
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance in miles between two points given in radians."""
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+class StationIndex:
+    """
+    Grid index over station coordinates, projected onto a local equirectangular plane.
+
+    Queries walk the grid outwards from the query's cell, ranking the stations found with
+    a cheap haversine distance, and only run the exact `geodesic` on the few finalists
+    that could still be the closest.
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, stations, cell_miles: float = 2.0):
+        # a sequence is kept as is, e.g. the records of a memory-mapped `StationData`
+        self.stations = stations if isinstance(stations, Sequence) else list(stations)
+        if not self.stations:
+            raise ValueError('Cannot build a station index without stations')
+        self.cell_miles = cell_miles
+        coordinates = [(station['Lat'], station['Lon']) for station in self.stations]
+        self._lats = [math.radians(lat) for lat, lon in coordinates]
+        self._lons = [math.radians(lon) for lat, lon in coordinates]
+        self._cos_lat0 = math.cos(sum(self._lats) / len(self._lats))
+        self._grid = {}
+        for i, (lat, lon) in enumerate(zip(self._lats, self._lons)):
+            self._grid.setdefault(self._cell(lat, lon), []).append(i)
+        columns = [cell[0] for cell in self._grid]
+        rows = [cell[1] for cell in self._grid]
+        self._bounds = (min(columns), max(columns), min(rows), max(rows))
+
+    @classmethod
+    def from_file(cls, filepath: str, **kwargs):
+        """Build an index from a ``jStations``-shaped JSON file, e.g. ``station-information.json``."""
+        with open(filepath, 'r') as f:
+            return cls(json.load(f)['Stations'], **kwargs)
+
+    @classmethod
+    def for_stations(cls, stations):
+        """
+        Return a shared index for the given stations, building it only once per station set.
+
+        Args:
+            stations (list): Station records with ``Code``, ``Lat`` and ``Lon``.
+        Returns:
+            StationIndex: The shared index.
+        """
+        fingerprint = tuple((station['Code'], station['Lat'], station['Lon']) for station in stations)
+        with cls._shared_lock:
+            index = cls._shared.get(fingerprint)
+            if index is None:
+                index = cls._shared[fingerprint] = cls(stations)
+            return index
+
+    def _cell(self, lat, lon):
+        x = lon * self._cos_lat0 * EARTH_RADIUS_MILES
+        y = lat * EARTH_RADIUS_MILES
+        return (math.floor(x / self.cell_miles), math.floor(y / self.cell_miles))
+
+    def _ring(self, center, radius):
+        cx, cy = center
+        if radius == 0:
+            yield center
+            return
+        for dx in range(-radius, radius + 1):
+            yield (cx + dx, cy - radius)
+            yield (cx + dx, cy + radius)
+        for dy in range(-radius + 1, radius):
+            yield (cx - radius, cy + dy)
+            yield (cx + radius, cy + dy)
+
+    def _candidates(self, lat, lon, k):
+        """Return (haversine_miles, station_idx) for enough stations to contain the k nearest."""
+        center = self._cell(lat, lon)
+        min_x, max_x, min_y, max_y = self._bounds
+        max_radius = max(abs(center[0] - min_x), abs(center[0] - max_x), abs(center[1] - min_y), abs(center[1] - max_y))
+        candidates = []
+        for radius in range(max_radius + 1):
+            for cell in self._ring(center, radius):
+                for i in self._grid.get(cell, ()):
+                    candidates.append((haversine_miles(lat, lon, self._lats[i], self._lons[i]), i))
+            if len(candidates) >= k:
+                candidates.sort()
+                # anything in an unvisited ring is at least `radius` whole cells away
+                kth_distance = candidates[k - 1][0] * (1 + HAVERSINE_ERROR_MARGIN)
+                if kth_distance <= radius * self.cell_miles * (1 - HAVERSINE_ERROR_MARGIN):
+                    break
+        candidates.sort()
+        return candidates
+
+    def k_nearest(self, coordinates, k: int = 1):
+        """
+        Find the k closest stations to the given coordinates.
+
+        Args:
+            coordinates (tuple): (latitude, longitude) in degrees.
+            k (int): Number of stations to return.
+        Returns:
+            list: (station, geodesic_miles) tuples, closest first.
+        """
+        k = max(1, min(k, len(self.stations)))
+        lat, lon = math.radians(coordinates[0]), math.radians(coordinates[1])
+        candidates = self._candidates(lat, lon, k)
+        cutoff = candidates[k - 1][0] * (1 + 2 * HAVERSINE_ERROR_MARGIN)
+        finalists = [i for distance, i in candidates if distance <= cutoff]
+        ranked = sorted(
+            (abs(geodesic((self.stations[i]['Lat'], self.stations[i]['Lon']), coordinates).miles), i)
+            for i in finalists
+        )
+        return [(self.stations[i], distance) for distance, i in ranked[:k]]
+
+    def nearest(self, coordinates):
+        """
+        Find the closest station to the given coordinates.
+
+        Args:
+            coordinates (tuple): (latitude, longitude) in degrees.
+        Returns:
+            dict: The closest station record.
+        """
+        return self.k_nearest(coordinates, 1)[0][0]
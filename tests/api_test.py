@@ -0,0 +1,194 @@
+import gzip
+
+import api
+import pytest
+import requests
+import wmata_locator
+from benchmarks.api_latency import FakeGeocoder
+from benchmarks.run import ADDRESS
+from prediction_cache import PredictionCache
+from registry import LocatorRegistry
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def client(stub_server, monkeypatch):
+    monkeypatch.setattr('utils.Nominatim', FakeGeocoder)
+    monkeypatch.setattr(api, 'ADDRESS', ADDRESS)
+    monkeypatch.setattr(api, 'responses', ResponseCache())
+    registry = LocatorRegistry('key')
+    monkeypatch.setattr(api, 'registry', registry)
+    yield api.app.test_client()
+    registry.stop()
+
+
+def prediction_requests(server):
+    return [path for path in server.requests if path.startswith('/GetPrediction')]
+
+
+def test_root_is_served_from_cache_until_refresh(stub_server, client, monkeypatch):
+    server, base_url = stub_server
+    monkeypatch.setattr(wmata_locator, 'PREDICTION_CACHE', PredictionCache(ttl=30))
+    first = client.get('/')
+    assert first.status_code == 200
+    assert first.headers['ETag'].startswith('"') and first.headers['ETag'].endswith('"')
+    assert 25 <= int(first.headers['Cache-Control'].removeprefix('max-age=')) <= 30
+    second = client.get('/')
+    assert second.data == first.data and second.headers['ETag'] == first.headers['ETag']
+    assert len(prediction_requests(server)) == 1
+
+    not_modified = client.get('/', headers={'If-None-Match': first.headers['ETag']})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+    assert not_modified.headers['ETag'] == first.headers['ETag']
+
+
+def test_root_gzip_is_its_own_representation(stub_server, client, monkeypatch):
+    monkeypatch.setattr(wmata_locator, 'PREDICTION_CACHE', PredictionCache(ttl=30))
+    plain = client.get('/')
+    assert 'Content-Encoding' not in plain.headers
+    compressed = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert len(compressed.data) < len(plain.data)
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']}).status_code == 304
+
+
+def test_root_is_not_cached_without_fresh_predictions(stub_server, client):
+    server, base_url = stub_server
+    # the stub_server prediction cache has a TTL of 0, nothing is ever fresh
+    response = client.get('/')
+    assert response.headers['Cache-Control'] == 'max-age=0'
+    client.get('/')
+    assert len(prediction_requests(server)) == 2
+
+
+def test_predictions_fail_cleanly_when_the_locator_cannot_be_built(client, monkeypatch):
+    def fail(address):
+        raise ConnectionError('station list unavailable')
+    monkeypatch.setattr(api.registry, 'get', fail)
+    response = client.get('/predictions?stations=A01')
+    assert response.status_code == 500
+    assert response.data == b'ERROR'
+
+
+class RecordingBroadcaster:
+    def __init__(self):
+        self.stations = []
+
+    def subscribe(self, station_code):
+        self.stations.append(station_code)
+
+    def unsubscribe(self, station_code):
+        pass
+
+    def wait(self, station_code, last_version, timeout):
+        return 1, {'line': [], 'timestamp': ''}
+
+
+def test_stream_shows_the_closest_station_complex(client, monkeypatch):
+    broadcaster = RecordingBroadcaster()
+    monkeypatch.setattr(api, 'broadcaster', broadcaster)
+    locator = api.registry.get(ADDRESS)
+    monkeypatch.setattr(locator, 'closest_station_codes', ['A01', 'C01'])
+    response = client.get('/stream', buffered=False)
+    assert next(response.response).startswith(b'id: 1')
+    response.close()
+    assert broadcaster.stations == ['A01,C01']
+    response = client.get('/stream?station=b35', buffered=False)
+    next(response.response)
+    response.close()
+    assert broadcaster.stations == ['A01,C01', 'B35']
+
+
+def test_root_does_not_cache_stale_predictions_under_a_newer_generation(stub_server, client, monkeypatch):
+    monkeypatch.setattr(wmata_locator, 'PREDICTION_CACHE', PredictionCache(ttl=30))
+    locator = api.registry.get(ADDRESS)
+    lookup = locator.lookup_complex_train_prediction
+
+    def refreshed_after_a_stale_lookup(station_codes):
+        # the board is built from stale predictions, then the background fetch lands
+        prediction, generation = lookup(station_codes)
+        return {**prediction, 'stale_seconds': 90}, None
+    monkeypatch.setattr(locator, 'lookup_complex_train_prediction', refreshed_after_a_stale_lookup)
+    response = client.get('/')
+    assert response.headers['Cache-Control'] == 'max-age=0'
+    station_codes = tuple(locator.closest_station_codes)
+    assert locator.prediction_cache.generation(station_codes) is not None
+    assert api.responses.get(station_codes, locator.prediction_cache.generation(station_codes)) is None
+
+
+class FailingSession:
+    def get(self, url, **kwargs):
+        raise requests.ConnectionError('upstream down')
+
+
+def test_root_shows_when_it_serves_stale_predictions(stub_server, client):
+    assert 'stale_seconds' not in client.get('/').get_json()
+    locator = api.registry.get(ADDRESS)
+    cache = wmata_locator.PREDICTION_CACHE
+    for station_code in locator.closest_station_codes:
+        started, trains = cache._entries[station_code]
+        cache._entries[station_code] = (started - 120, trains)
+    locator.session = FailingSession()
+    response = client.get('/')
+    assert response.status_code == 200
+    assert response.get_json()['stale_seconds'] >= 120
+
+
+def test_predictions_fetches_every_station_in_one_request(stub_server, client):
+    server, base_url = stub_server
+    response = client.get('/predictions?stations=a01, B35')
+    assert response.status_code == 200
+    predictions = response.get_json()
+    assert list(predictions) == ['A01', 'B35']
+    assert all(predictions[code]['line'] for code in predictions)
+    assert prediction_requests(server) == ['/GetPrediction/A01,B35']
+
+
+def test_predictions_asks_for_all_above_the_batch_threshold(stub_server, client):
+    server, base_url = stub_server
+    station_codes = list(api.registry.get(ADDRESS).station_codes)
+    requested = station_codes[:wmata_locator.BATCH_ALL_THRESHOLD + 1]
+    response = client.get(f'/predictions?stations={",".join(requested)}')
+    assert response.status_code == 200
+    assert list(response.get_json()) == requested
+    response = client.get('/predictions?stations=All')
+    assert response.status_code == 200
+    assert set(response.get_json()) == set(station_codes)
+    assert prediction_requests(server) == ['/GetPrediction/All', '/GetPrediction/All']
+
+
+@pytest.mark.parametrize('stations', ['', 'A01,Z99', ',,'])
+def test_predictions_rejects_unknown_or_missing_stations(stub_server, client, stations):
+    server, base_url = stub_server
+    response = client.get(f'/predictions?stations={stations}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    assert prediction_requests(server) == []
+
+
+class ClosedStations:
+    def __init__(self, timings_index, closed):
+        self.timings_index = timings_index
+        self.closed = closed
+
+    def __contains__(self, station_code):
+        return station_code in self.timings_index
+
+    def hours(self, station_code, weekday):
+        if station_code in self.closed:
+            raise KeyError(station_code)
+        return self.timings_index.hours(station_code, weekday)
+
+
+def test_predictions_of_a_closed_station_do_not_fail_the_batch(stub_server, client, monkeypatch):
+    locator = api.registry.get(ADDRESS)
+    monkeypatch.setattr(locator, 'timings_index', ClosedStations(locator.timings_index, {'B35'}))
+    response = client.get('/predictions?stations=A01,B35')
+    assert response.status_code == 200
+    predictions = response.get_json()
+    assert predictions['A01']['first_train'] is not None
+    assert predictions['B35']['first_train'] is None and predictions['B35']['last_train'] is None
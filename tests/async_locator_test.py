@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from async_locator import AsyncDisplayPusher, AsyncWmataLocator
+
+
+def test_async_locator_fetches_predictions(stub_server):
+    server, _ = stub_server
+
+    async def run():
+        locator = await AsyncWmataLocator.create('key')
+        try:
+            return await locator.find_train_predictions(['A01', 'B35'])
+        finally:
+            locator.close()
+
+    predictions = asyncio.run(run())
+    assert set(predictions) == {'A01', 'B35'}
+    assert set(predictions['A01']['line']) == {'RD'}
+    assert server.requests[-1] == '/GetPrediction/A01,B35'
+
+
+def test_slow_display_does_not_delay_refreshes(stub_server):
+    server, base_url = stub_server
+
+    async def run():
+        locator = await AsyncWmataLocator.create('key')
+        pusher = AsyncDisplayPusher(timeout=5)
+        started = time.monotonic()
+        for i in range(3):
+            await locator.find_train_predictions(['A01'])
+            frame = {'line': [{'name': 'RD', 'destinations': [f'Glen {i}']}], 'timestamp': ''}
+            pusher.push_all([f'{base_url}/slow', f'{base_url}/fast'], frame)
+            await asyncio.sleep(0.05)
+        elapsed = time.monotonic() - started
+        await pusher.drain()
+        locator.close()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    assert elapsed < 1
+    assert server.requests.count('/GetPrediction/A01') == 3
+    assert server.pushes.count('/fast') == 3
+    assert server.pushes.count('/slow') == 1
@@ -0,0 +1,42 @@
+import threading
+
+from broadcaster import PredictionBroadcaster
+
+
+class FakeLocator:
+    def __init__(self, lines):
+        self.lines = lines
+        self.calls = 0
+
+    def find_complex_train_prediction(self, station_codes):
+        line = self.lines[min(self.calls, len(self.lines) - 1)]
+        self.calls += 1
+        return {'line': line, 'timestamp': str(self.calls)}
+
+
+def test_broadcaster_only_publishes_changed_payloads():
+    locator = FakeLocator([['Glen 1,2'], ['Glen 1,2'], ['Glen 0,1']])
+    broadcaster = PredictionBroadcaster(lambda: locator, lambda predictions: predictions, interval=0.01)
+    broadcaster.subscribe('A01')
+    try:
+        version, payload = broadcaster.wait('A01', 0, timeout=5)
+        assert payload['line'] == ['Glen 1,2']
+        version, payload = broadcaster.wait('A01', version, timeout=5)
+        assert payload['line'] == ['Glen 0,1']
+        assert version == 2
+        assert locator.calls >= 3
+        assert broadcaster.wait('A01', version, timeout=0.05) is None
+    finally:
+        broadcaster.unsubscribe('A01')
+        broadcaster.stop()
+
+
+def test_broadcaster_shares_one_refresher_between_clients():
+    locator = FakeLocator([['Glen 1,2']])
+    broadcaster = PredictionBroadcaster(lambda: locator, lambda predictions: predictions, interval=60)
+    for _ in range(5):
+        broadcaster.subscribe('A01')
+    broadcaster.wait('A01', 0, timeout=5)
+    assert locator.calls == 1
+    assert len([t for t in threading.enumerate() if t.name == 'broadcast-A01']) == 1
+    broadcaster.stop()
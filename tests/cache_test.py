@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+from cache import FileLock, fcntl, jsonfilecache, write_json_atomic
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def test_jsonfilecache_is_keyed_by_arguments():
+    calls = []
+
+    @jsonfilecache(60)
+    def lookup(address):
+        calls.append(address)
+        return address.lower()
+
+    assert lookup('A') == 'a'
+    assert lookup('B') == 'b'
+    assert lookup('A') == 'a'
+    assert calls == ['A', 'B']
+    assert lookup.cache_info().hits == 1
+
+
+def test_jsonfilecache_ignores_self():
+    calls = []
+
+    class Thing:
+        def __init__(self, name):
+            self.name = name
+
+        @jsonfilecache(60)
+        def fetch(self):
+            calls.append(self.name)
+            return self.name
+
+    assert Thing('first').fetch() == 'first'
+    assert Thing('second').fetch() == 'first'
+    assert calls == ['first']
+
+
+def test_jsonfilecache_reads_disk_tier_after_memory_is_cleared():
+    calls = []
+
+    @jsonfilecache(60)
+    def lookup(address):
+        calls.append(address)
+        return [1, 2]
+
+    lookup('A')
+    lookup.cache_clear()
+    assert lookup('A') == [1, 2]
+    assert calls == ['A']
+    assert lookup.cache_info().disk_hits == 1
+    assert len(os.listdir(lookup.cache_dir)) == 1
+
+
+def test_jsonfilecache_evicts_least_recently_used():
+    @jsonfilecache(60, maxsize=2)
+    def lookup(address):
+        return address
+
+    lookup('A')
+    lookup('B')
+    lookup('A')
+    lookup('C')
+    assert lookup.cache_info().currsize == 2
+    lookup('A')
+    assert lookup.cache_info().hits == 2
+
+
+def test_jsonfilecache_expires_entries():
+    calls = []
+
+    @jsonfilecache(0)
+    def lookup(address):
+        calls.append(address)
+        return address
+
+    lookup('A')
+    lookup('A')
+    assert calls == ['A', 'A']
+
+
+def test_jsonfilecache_never_leaves_partial_files(monkeypatch):
+    @jsonfilecache(60)
+    def lookup(address):
+        return {'address': address}
+
+    lookup('A')
+    (entry,) = os.listdir(lookup.cache_dir)
+
+    def interrupted_dump(data, f):
+        f.write('{"timest')
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr('cache.json.dump', interrupted_dump)
+    lookup.cache_clear()
+    with pytest.raises(KeyboardInterrupt):
+        write_json_atomic(os.path.join(lookup.cache_dir, entry), {'timestamp': 0, 'result': None})
+    assert os.listdir(lookup.cache_dir) == [entry]
+    assert lookup('A') == {'address': 'A'}
+    assert lookup.cache_info().disk_hits == 1
+
+
+def test_jsonfilecache_serves_stale_value_while_another_caller_refreshes():
+    calls = []
+
+    @jsonfilecache(0.1)
+    def lookup(address):
+        calls.append(address)
+        return len(calls)
+
+    assert lookup('A') == 1
+    time.sleep(0.15)
+    refreshing = FileLock(os.path.join(f'{lookup.__name__}.cache.locks', os.listdir(lookup.cache_dir)[0][:-len('.json')] + '.lock'))
+    assert refreshing.acquire(blocking=False)
+    try:
+        assert lookup('A') == 1
+    finally:
+        refreshing.release()
+    assert lookup.cache_info().stale_hits == 1
+    assert lookup('A') == 2
+
+
+def _stampede_worker(lookup, barrier, results):
+    barrier.wait()
+    results.put(lookup('A'))
+
+
+@pytest.mark.skipif(fcntl is None or 'fork' not in multiprocessing.get_all_start_methods(), reason='needs flock and fork')
+@pytest.mark.parametrize('expired', [False, True])
+def test_jsonfilecache_refreshes_once_across_processes(tmp_path, expired):
+    calls_file = tmp_path / 'calls'
+    calls_file.touch()
+
+    @jsonfilecache(0.5)
+    def lookup(address):
+        # a slow upstream with a large payload, to widen any window for torn reads
+        with open(calls_file, 'a') as f:
+            f.write('call\n')
+        time.sleep(0.3)
+        return {'calls': len(calls_file.read_text().splitlines()), 'padding': 'x' * 200000}
+
+    if expired:
+        lookup('A')
+        time.sleep(0.6)
+    context = multiprocessing.get_context('fork')
+    workers = 8
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_stampede_worker, args=(lookup, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    seen = [results.get(timeout=10) for _ in processes]
+    for process in processes:
+        process.join(timeout=10)
+        assert process.exitcode == 0
+
+    refreshes = 1 if not expired else 2
+    assert len(calls_file.read_text().splitlines()) == refreshes
+    assert all(len(result['padding']) == 200000 for result in seen)
+    if expired:
+        # everyone but the refreshing process kept serving the expired value
+        assert sorted(result['calls'] for result in seen) == [1] * (workers - 1) + [2]
+    else:
+        assert {result['calls'] for result in seen} == {1}
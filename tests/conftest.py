@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import wmata_locator
+from benchmarks import fixtures
+from prediction_cache import PredictionCache
+from quota import QuotaGovernor
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        self.server.requests.append(path)
+        if path.endswith('jStations'):
+            self._reply(fixtures.station_list())
+        elif path.endswith('jStationTimes'):
+            self._reply(fixtures.station_timings())
+        else:
+            self._reply(fixtures.predictions(path.rsplit('/', 1)[1].split(',')))
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.pushes.append(self.path)
+        if self.path == '/slow':
+            time.sleep(1)
+        self._reply({'ok': True})
+
+
+@pytest.fixture(autouse=True)
+def quota(tmp_path, monkeypatch):
+    # the rate limiter's state file goes with the test, not in the working directory
+    governor = QuotaGovernor(str(tmp_path / 'wmata.quota'))
+    monkeypatch.setattr(wmata_locator, 'QUOTA', governor)
+    return governor
+
+
+@pytest.fixture
+def stub_server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.requests = []
+    server.pushes = []
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    monkeypatch.setattr(wmata_locator, 'STATION_LIST_URL', f'{base_url}/jStations?api_key={{api_key}}')
+    monkeypatch.setattr(wmata_locator, 'STATION_TIMING_URL', f'{base_url}/jStationTimes?api_key={{api_key}}')
+    monkeypatch.setattr(wmata_locator, 'REAL_TIME_RAIL_PREDICTIONS_URL', f'{base_url}/GetPrediction/{{station_code}}?api_key={{api_key}}')
+    monkeypatch.setattr(wmata_locator, 'PREDICTION_CACHE', PredictionCache(ttl=0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, base_url
+    server.shutdown()
@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+import daemon
+import pytest
+from async_locator import AsyncDisplayPusher
+from benchmarks.api_latency import FakeGeocoder
+from benchmarks.run import ADDRESS
+
+
+def write_config(tmp_path, displays, interval=0):
+    path = tmp_path / 'displays.json'
+    path.write_text(json.dumps({'interval': interval, 'displays': displays}))
+    return str(path)
+
+
+def test_load_config_requires_an_address_or_station(tmp_path):
+    with pytest.raises(ValueError):
+        daemon.load_config(write_config(tmp_path, [{'host': 'esp32.local'}]))
+
+
+def test_serve_fetches_each_station_once_per_cycle(stub_server, tmp_path):
+    server, base_url = stub_server
+    config = daemon.load_config(write_config(tmp_path, [
+        {'host': f'{base_url}/kitchen', 'station': 'A01'},
+        {'host': f'{base_url}/hallway', 'station': 'a01'},
+        {'host': f'{base_url}/office', 'station': 'B35'},
+    ]))
+    asyncio.run(daemon.serve('key', config, run_n_times=2))
+    predictions = [path for path in server.requests if path.startswith('/GetPrediction')]
+    assert predictions == ['/GetPrediction/A01,B35'] * 2
+    # the stub serves the same trains every cycle, so the second frames are unchanged
+    assert sorted(server.pushes) == ['/hallway', '/kitchen', '/office']
+
+
+def test_serve_shows_every_platform_of_the_closest_station(stub_server, tmp_path, monkeypatch):
+    server, base_url = stub_server
+    monkeypatch.setattr('utils.Nominatim', FakeGeocoder)
+    frames = []
+    push_all = AsyncDisplayPusher.push_all
+
+    def recording_push_all(self, esp32_hostnames, frame):
+        frames.append(frame)
+        return push_all(self, esp32_hostnames, frame)
+    monkeypatch.setattr(AsyncDisplayPusher, 'push_all', recording_push_all)
+    config = daemon.load_config(write_config(tmp_path, [{'host': f'{base_url}/kitchen', 'address': ADDRESS}]))
+    asyncio.run(daemon.serve('key', config, run_n_times=1))
+    predictions = [path for path in server.requests if path.startswith('/GetPrediction')]
+    # Metro Center's closest platform is A01, its Blue, Orange and Silver trains stop at C01
+    assert predictions == ['/GetPrediction/A01,C01']
+    frame, = frames
+    assert {line['name'] for line in frame['line']} == {'RD', 'BL', 'OR', 'SV'}
+    assert server.pushes == ['/kitchen']
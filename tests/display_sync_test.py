@@ -0,0 +1,45 @@
+from display_sync import DisplaySync
+
+
+def frame(*rows, timestamp='01:25:00AM'):
+    return {'line': [{'name': name, 'destinations': destinations} for name, destinations in rows], 'timestamp': timestamp}
+
+
+def send(sync, frame):
+    prepared = sync.prepare('esp32.local', frame)
+    if prepared is not None:
+        sync.acknowledge('esp32.local', prepared[0], prepared[1], frame)
+    return prepared
+
+
+def test_unchanged_frames_are_skipped():
+    sync = DisplaySync()
+    assert send(sync, frame(('RD', ['Glen 1,2']))) == (frame(('RD', ['Glen 1,2'])), 1)
+    assert send(sync, frame(('RD', ['Glen 1,2']), timestamp='01:26:00AM')) is None
+    assert send(sync, frame(('RD', ['Glen 2,3'])))[1] == 2
+
+
+def test_delta_only_sends_changed_rows():
+    sync = DisplaySync(delta=True)
+    first = frame(('BL', ['Larg 1,2']), ('RD', ['Glen 1,2']))
+    assert send(sync, first) == ({**first, 'seq': 1}, 1)
+    message, seq = send(sync, frame(('BL', ['Larg 1,2']), ('RD', ['Glen 3,4'])))
+    assert seq == 2
+    assert message == {
+        'seq': 2,
+        'base': 1,
+        'count': 2,
+        'rows': [[1, {'name': 'RD', 'destinations': ['Glen 3,4']}]],
+        'timestamp': '01:25:00AM',
+    }
+
+
+def test_full_frame_is_resent_periodically_and_after_failures():
+    sync = DisplaySync(delta=True, resync_seconds=0)
+    send(sync, frame(('RD', ['Glen 1,2'])))
+    assert 'line' in send(sync, frame(('RD', ['Glen 1,2'])))[0]
+
+    sync = DisplaySync(delta=True)
+    send(sync, frame(('RD', ['Glen 1,2'])))
+    sync.forget('esp32.local')
+    assert 'line' in send(sync, frame(('RD', ['Glen 3,4'])))[0]
@@ -0,0 +1,48 @@
+import pytest
+from esp32_wire import decode_frame, encode_frame
+from utils import convert_for_esp32_led_matrix_64_32
+
+
+@pytest.mark.parametrize('train_predictions', [
+    {
+        "line": {
+            "RD": {"Shady Grove": [1, 2, 3], "Glenmont": [0, 'N']},
+            "BL": {"Franconia-Springfield": [12], "New Carrollton": []},
+        },
+        "timestamp": '2024-08-10T13:25:07.293639',
+    },
+    {
+        "line": {},
+        "first_train": '2024-08-10T05:04:00',
+        "timestamp": '2024-08-10T01:25:00.293639',
+    },
+    {
+        "error": 'some error',
+        "timestamp": '2024-08-10T01:25:00.293639',
+    },
+])
+def test_encode_frame_round_trips_the_json_frame(train_predictions):
+    frame = convert_for_esp32_led_matrix_64_32(train_predictions)
+    message = encode_frame(frame)
+    assert decode_frame(message) == frame
+    assert len(message) < len(str(frame))
+
+
+def test_encode_frame_rejects_minutes_it_cannot_represent():
+    frame = convert_for_esp32_led_matrix_64_32({
+        "line": {"RD": {"Glenmont": [99999, 99999]}},
+        "timestamp": '2024-08-10T01:25:00.293639',
+    })
+    with pytest.raises(ValueError):
+        encode_frame(frame)
+
+
+def test_decode_frame_detects_corruption():
+    frame = convert_for_esp32_led_matrix_64_32({
+        "line": {"RD": {"Glenmont": [1, 2]}},
+        "timestamp": '2024-08-10T01:25:00.293639',
+    })
+    message = bytearray(encode_frame(frame))
+    message[-6] ^= 0xFF
+    with pytest.raises(ValueError):
+        decode_frame(bytes(message))
@@ -0,0 +1,69 @@
+import pytest
+import utils
+from geocoding import Gazetteer, GeocoderChain, Place, local_gazetteer, normalize
+
+
+class StubGeocoder:
+    def __init__(self, *args, **kwargs):
+        self.queries = []
+
+    def geocode(self, address):
+        self.queries.append(address)
+        return Place(38.0, -77.0, address)
+
+
+class FailingGeocoder:
+    def geocode(self, address):
+        raise TimeoutError('offline')
+
+
+def test_normalize_expands_abbreviations():
+    assert normalize('607 13th St. NW') == normalize('607 13th Street Northwest')
+
+
+@pytest.mark.parametrize('query, name', [
+    ('Metro Center', 'Metro Center'),
+    ('metro center station', 'Metro Center'),
+    ('A01', 'Metro Center'),
+    ('607 13th Street Northwest', 'Metro Center'),
+    ('607 13th St. NW, Washington, DC 20005, USA', 'Metro Center'),
+])
+def test_gazetteer_matches_stations(query, name):
+    place = local_gazetteer().geocode(query)
+    assert place is not None and place.name == name
+
+
+@pytest.mark.parametrize('query', [
+    '1600 Pennsylvania Ave NW, Washington, DC 20500',
+    '1600 Potomac Ave, Alexandria, VA 22301',
+    '607 13th St NW, Rockville, MD',
+    '100 Metro Center Blvd, Rockville, MD',
+    'Court House Rd, Fairfax VA 22030',
+])
+def test_gazetteer_does_not_guess(query):
+    assert local_gazetteer().geocode(query) is None
+
+
+def test_gazetteer_loads_known_addresses(tmp_path):
+    path = tmp_path / 'addresses.csv'
+    path.write_text('address,latitude,longitude\n"300 M ST NE, Washington, DC",38.9055,-77.0030\n300 M ST SE,38.8766,-77.0020\n')
+    gazetteer = Gazetteer()
+    gazetteer.load_csv(str(path))
+    place = gazetteer.geocode('300 M Street Northeast, Washington, DC, 20002')
+    assert (place.latitude, place.longitude) == (38.9055, -77.0030)
+    # no locality to check the query's city against
+    assert gazetteer.geocode('300 M Street Southeast, Baltimore, MD') is None
+
+
+def test_geocoder_chain_falls_back():
+    stub = StubGeocoder()
+    chain = GeocoderChain([Gazetteer(), FailingGeocoder(), stub])
+    assert chain.geocode('somewhere').latitude == 38.0
+    assert stub.queries == ['somewhere']
+
+
+def test_get_coordinates_of_address_prefers_the_gazetteer(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(utils, 'Nominatim', StubGeocoder)
+    assert tuple(utils.get_coordinates_of_address('Farragut North')) == (38.903192, -77.039766)
+    assert tuple(utils.get_coordinates_of_address('1600 Pennsylvania Ave NW')) == (38.0, -77.0)
@@ -0,0 +1,97 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import http_client
+import metrics
+import pytest
+import requests
+from quota import QuotaExceeded
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        self.server.attempts += 1
+        status = 503 if self.server.attempts <= self.server.failures else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        # hang up without answering, like a display rebooting mid-push
+        self.server.attempts += 1
+        self.close_connection = True
+
+
+@pytest.fixture
+def flaky_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+    server.attempts = 0
+    server.failures = 1
+    server.connections = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    http_client.close_all()
+
+
+def test_get_retries_server_errors(flaky_server):
+    server, base_url = flaky_server
+    response = http_client.get(f'{base_url}/jStations')
+    assert response.status_code == 200
+    assert server.attempts == 2
+
+
+def test_retries_go_through_the_retry_hook(flaky_server):
+    server, base_url = flaky_server
+    calls = []
+    with http_client.before_retries(lambda: calls.append(server.attempts)):
+        assert http_client.get(f'{base_url}/jStations').status_code == 200
+    assert calls == [1]
+    server.attempts = 0
+    http_client.get(f'{base_url}/jStations')
+    assert calls == [1]
+
+
+def test_retry_hook_can_stop_retries(flaky_server):
+    server, base_url = flaky_server
+
+    def refuse():
+        raise QuotaExceeded('no token left')
+    with pytest.raises(QuotaExceeded):
+        with http_client.before_retries(refuse):
+            http_client.get(f'{base_url}/jStations')
+    assert server.attempts == 1
+
+
+def test_get_reuses_connections(flaky_server):
+    server, base_url = flaky_server
+    for _ in range(3):
+        http_client.get(f'{base_url}/jStations')
+    assert len(server.connections) == 1
+    assert http_client.get_session(base_url) is http_client.get_session(f'{base_url}/other')
+
+
+def test_post_is_never_retried(flaky_server):
+    server, base_url = flaky_server
+    with pytest.raises(requests.ConnectionError):
+        http_client.post(f'{base_url}/display', b'{}')
+    assert server.attempts == 1
+
+
+def test_retries_count_only_the_retried_attempts(flaky_server, monkeypatch):
+    server, base_url = flaky_server
+    monkeypatch.setattr(http_client, 'RETRY_BACKOFF_FACTOR', 0)
+    server.failures = 10
+    metrics.reset()
+    assert http_client.get(f'{base_url}/jStations').status_code == 503
+    assert server.attempts == http_client.MAX_RETRIES + 1
+    assert f'wmata_http_retries_total{{host="127.0.0.1:{server.server_port}",status="503"}} {http_client.MAX_RETRIES}' in metrics.render_prometheus()
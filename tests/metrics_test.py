@@ -0,0 +1,26 @@
+import metrics
+
+
+def test_render_prometheus_reports_stages_and_counters():
+    metrics.reset()
+    with metrics.timed('geocode'):
+        pass
+    metrics.observe('geocode', 0.2)
+    metrics.increment('http_responses_total', host='api.wmata.com', status=429)
+    rendered = metrics.render_prometheus()
+    assert 'wmata_stage_seconds_count{stage="geocode"} 2' in rendered
+    assert 'wmata_stage_seconds_bucket{stage="geocode",le="0.25"} 2' in rendered
+    assert 'wmata_stage_seconds_bucket{stage="geocode",le="0.1"} 1' in rendered
+    assert 'wmata_http_responses_total{host="api.wmata.com",status="429"} 1' in rendered
+
+
+def test_format_summary_reports_cache_hit_ratios():
+    metrics.reset()
+    metrics.register_collector(lambda: [
+        ('cache_requests_total', {'cache': 'test', 'result': 'hit'}, 3),
+        ('cache_requests_total', {'cache': 'test', 'result': 'miss'}, 1),
+    ])
+    metrics.observe('upstream_predictions', 0.05)
+    summary = metrics.format_summary()
+    assert 'upstream_predictions' in summary
+    assert 'cache test: 3/4 hits (75%)' in summary
@@ -0,0 +1,134 @@
+import threading
+import time
+
+import prediction_cache
+import pytest
+from prediction_cache import PredictionCache
+
+
+def test_prediction_cache_serves_hits_within_ttl():
+    cache = PredictionCache(ttl=60)
+    calls = []
+    fetch = lambda: calls.append(1) or ['train']
+    assert cache.get('A01', fetch) == ['train']
+    assert cache.get('A01', fetch) == ['train']
+    assert cache.get('B35', fetch) == ['train']
+    assert len(calls) == 2
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'coalesced': 0, 'stale': 0}
+
+
+def test_prediction_cache_expires_after_ttl():
+    cache = PredictionCache(ttl=0)
+    calls = []
+    fetch = lambda: calls.append(1) or ['train']
+    cache.get('A01', fetch)
+    cache.get('A01', fetch)
+    assert len(calls) == 2
+
+
+def test_prediction_cache_coalesces_concurrent_callers():
+    cache = PredictionCache(ttl=60)
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return ['train']
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('A01', fetch))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced'] < 7:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [['train']] * 8
+
+
+def test_prediction_cache_shares_errors_and_does_not_cache_them():
+    cache = PredictionCache(ttl=60)
+
+    def fail():
+        raise ValueError('upstream down')
+
+    with pytest.raises(ValueError):
+        cache.get('A01', fail)
+    assert cache.get('A01', lambda: ['train']) == ['train']
+
+
+def test_prediction_cache_fetches_missing_keys_together():
+    cache = PredictionCache(ttl=60)
+    cache.get('A01', lambda: ['cached'])
+    requested = []
+
+    def fetch(keys):
+        requested.append(keys)
+        return {key: [key] for key in keys + ['C01']}
+
+    assert cache.get_many(['A01', 'B35', 'D01'], fetch) == {'A01': ['cached'], 'B35': ['B35'], 'D01': ['D01']}
+    assert requested == [['B35', 'D01']]
+    assert cache.get('C01', lambda: ['refetched']) == ['C01']
+
+
+def test_prediction_cache_serves_last_good_value_when_upstream_fails(monkeypatch):
+    monkeypatch.setattr(prediction_cache, 'RETRY_BACKOFF', (0.05,))
+    cache = PredictionCache(ttl=0, max_stale=60)
+    cache.get('A01', lambda: ['old'])
+    attempts = []
+
+    def fetch(keys):
+        attempts.append(keys)
+        if len(attempts) < 3:
+            raise ValueError('upstream down')
+        return {'A01': ['new']}
+
+    (value, stale_seconds, fetched), = cache.lookup(['A01'], fetch).values()
+    assert value == ['old'] and stale_seconds > 0
+    assert fetched == pytest.approx(time.monotonic() - stale_seconds, abs=0.1)
+    # while the background retries run, callers get the stale value without asking upstream
+    assert cache.lookup(['A01'], fetch)['A01'][0] == ['old']
+    deadline = time.monotonic() + 5
+    while len(attempts) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert len(attempts) == 3
+    assert cache.stats()['stale'] == 2
+    cache.ttl = 60
+    (value, stale_seconds, fetched), = cache.lookup(['A01'], fetch).values()
+    assert (value, stale_seconds) == (['new'], 0)
+    assert cache.generation(['A01']) == (fetched,)
+
+
+def test_prediction_cache_does_not_wait_past_latency_budget_with_a_stale_value():
+    cache = PredictionCache(ttl=0, latency_budget=0.05)
+    cache.get('A01', lambda: ['old'])
+    release = threading.Event()
+
+    def slow_fetch(keys):
+        release.wait(5)
+        return {'A01': ['new']}
+
+    started = time.monotonic()
+    assert cache.lookup(['A01'], slow_fetch)['A01'][0] == ['old']
+    assert time.monotonic() - started < 1
+    release.set()
+    cache.ttl = 60
+    deadline = time.monotonic() + 5
+    while cache.get('A01', lambda: ['refetched']) != ['new'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.get('A01', lambda: ['refetched']) == ['new']
+
+
+def test_prediction_cache_raises_without_a_usable_stale_value():
+    cache = PredictionCache(ttl=0, max_stale=0)
+    cache.get('A01', lambda: ['old'])
+
+    def fail():
+        raise ValueError('upstream down')
+
+    with pytest.raises(ValueError):
+        cache.get('A01', fail)
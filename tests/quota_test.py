@@ -0,0 +1,92 @@
+import multiprocessing
+
+import metrics
+import pytest
+import wmata_locator
+from quota import HIGH, LOW, QuotaExceeded, QuotaGovernor, fcntl
+from wmata_locator import WmataLocator
+
+
+def test_quota_allows_bursts_then_paces_calls(tmp_path):
+    governor = QuotaGovernor(str(tmp_path / 'wmata.quota'), rate=50, burst=2)
+    assert governor.acquire() == 0
+    assert governor.acquire() == 0
+    assert 0.01 < governor.acquire() < 0.5
+
+
+def test_quota_keeps_a_reserve_for_high_priority_calls(tmp_path):
+    governor = QuotaGovernor(str(tmp_path / 'wmata.quota'), rate=0.01, burst=4, reserve=0.5, max_wait=0.1)
+    governor.acquire(LOW)
+    governor.acquire(LOW)
+    with pytest.raises(QuotaExceeded):
+        governor.acquire(LOW)
+    for _ in range(2):
+        governor.acquire(HIGH)
+    with pytest.raises(QuotaExceeded):
+        governor.acquire(HIGH)
+
+
+def test_quota_enforces_the_daily_limit(tmp_path):
+    governor = QuotaGovernor(str(tmp_path / 'wmata.quota'), burst=10, daily_limit=4, reserve=0.5)
+    governor.acquire(LOW)
+    governor.acquire(LOW)
+    with pytest.raises(QuotaExceeded):
+        governor.acquire(LOW)
+    governor.acquire(HIGH)
+    governor.acquire(HIGH)
+    with pytest.raises(QuotaExceeded):
+        governor.acquire(HIGH)
+    assert governor.remaining()['daily'] == 0
+
+
+def _quota_worker(filepath, barrier, results):
+    governor = QuotaGovernor(filepath, rate=0.01, burst=10, max_wait=0)
+    barrier.wait()
+    taken = 0
+    for _ in range(5):
+        try:
+            governor.acquire()
+            taken += 1
+        except QuotaExceeded:
+            pass
+    results.put(taken)
+
+
+@pytest.mark.skipif(fcntl is None or 'fork' not in multiprocessing.get_all_start_methods(), reason='needs flock and fork')
+def test_quota_is_shared_across_processes(tmp_path):
+    context = multiprocessing.get_context('fork')
+    workers = 6
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_quota_worker, args=(str(tmp_path / 'wmata.quota'), barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    taken = [results.get(timeout=10) for _ in processes]
+    for process in processes:
+        process.join(timeout=10)
+        assert process.exitcode == 0
+    assert sum(taken) == 10
+
+
+def test_locator_draws_from_the_quota(stub_server, tmp_path, monkeypatch):
+    locator = WmataLocator('key')
+    governor = QuotaGovernor(str(tmp_path / 'locator.quota'), rate=0.01, burst=2, max_wait=0)
+    locator.quota = governor
+    locator.find_train_predictions(['A01'])
+    locator.find_train_predictions(['B35'])
+    with pytest.raises(QuotaExceeded):
+        locator.find_train_predictions(['C01'])
+    monkeypatch.setattr(wmata_locator, 'QUOTA', governor)
+    assert 'wmata_quota_daily_remaining 49998' in metrics.render_prometheus()
+
+
+def test_remaining_only_reads_the_state_file(tmp_path):
+    filepath = tmp_path / 'wmata.quota'
+    governor = QuotaGovernor(str(filepath), rate=0.01, burst=4)
+    assert governor.remaining() == {'tokens': 4, 'daily': governor.daily_limit}
+    assert not filepath.exists()
+    governor.acquire()
+    state = filepath.read_bytes()
+    assert governor.remaining()['daily'] == governor.daily_limit - 1
+    assert filepath.read_bytes() == state
@@ -0,0 +1,57 @@
+import http_client
+import pytest
+import recording
+from benchmarks.replay import replay
+from recording import Recorder, read_records, strip_api_key
+from wmata_locator import WmataLocator
+
+
+def test_strip_api_key():
+    assert strip_api_key('http://h/GetPrediction/A01?api_key=secret') == 'http://h/GetPrediction/A01'
+    assert strip_api_key('http://h/jStations?contentType=json&api_key=secret') == 'http://h/jStations?contentType=json'
+    assert strip_api_key('http://h/jStations?api_key=secret&contentType=json') == 'http://h/jStations?contentType=json'
+
+
+def test_recordings_stream_back_in_order(tmp_path):
+    filepath = str(tmp_path / 'day.wmrl')
+    recorder = Recorder(filepath)
+    for i in range(3):
+        recorder.record(f'http://h/GetPrediction/A0{i}?api_key=secret', 1000.0 + i, 0.05, 200, b'{"Trains": []}')
+    records = list(read_records(filepath))
+    assert [record['url'] for record in records] == [f'http://h/GetPrediction/A0{i}' for i in range(3)]
+    assert records[2] == {'time': 1002.0, 'elapsed': 0.05, 'url': 'http://h/GetPrediction/A02', 'status': 200,
+                          'body': '{"Trains": []}'}
+
+    # a record cut short by a killed writer ends the stream
+    with open(filepath, 'ab') as f:
+        f.write(recording.LENGTH.pack(100) + b'partial')
+    assert len(list(read_records(filepath))) == 3
+
+
+def test_read_records_rejects_other_files(tmp_path):
+    filepath = tmp_path / 'day.wmrl'
+    filepath.write_bytes(b'{"Trains": []}')
+    with pytest.raises(ValueError):
+        list(read_records(str(filepath)))
+
+
+def test_recorded_traffic_replays_offline(stub_server, tmp_path, monkeypatch):
+    server, base_url = stub_server
+    filepath = str(tmp_path / 'day.wmrl')
+    monkeypatch.setattr(http_client, 'RECORDER', Recorder(filepath))
+    for cached in (WmataLocator.get_station_list, WmataLocator.get_station_timings):
+        cached.cache_clear()
+    locator = WmataLocator('secret')
+    locator.find_train_predictions(['A01', 'B35'])
+    locator.find_train_predictions(['C01'])
+    monkeypatch.setattr(http_client, 'RECORDER', None)
+
+    records = list(read_records(filepath))
+    assert [record['url'].rsplit('/', 1)[1] for record in records] == ['jStations', 'jStationTimes', 'A01,B35', 'C01']
+    assert not any('secret' in record['url'] for record in records)
+
+    upstream_requests = len(server.requests)
+    report = replay(filepath, speed=0)
+    assert report['requests'] == 2 and report['errors'] == 0
+    assert report['upstream_requests'] >= 2
+    assert len(server.requests) == upstream_requests
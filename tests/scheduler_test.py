@@ -0,0 +1,109 @@
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta
+
+import daemon
+import pytest
+from scheduler import CLOSING_GRACE, OPENING_LEAD, AdaptiveScheduler
+from timings_index import TimingsIndex
+
+STATION_TIMINGS = {
+    'StationTimes': [
+        {
+            'Code': 'A01',
+            'StationName': 'Metro Center',
+            # 2026-10-12 is a Monday
+            'Monday': {'OpeningTime': '05:00', 'LastTrains': [{'Time': '23:30'}]},
+            'Friday': {'OpeningTime': '05:00', 'LastTrains': [{'Time': '01:00'}]},
+            'Saturday': {'OpeningTime': '07:00', 'LastTrains': [{'Time': '01:00'}]},
+            'Sunday': {'OpeningTime': '07:00', 'LastTrains': []},
+        },
+    ]
+}
+
+
+@pytest.fixture
+def scheduler():
+    return AdaptiveScheduler(TimingsIndex(STATION_TIMINGS), min_interval=10, max_interval=90, jitter=0,
+                             rng=random.Random(0))
+
+
+def test_closed_station_waits_for_opening(scheduler):
+    now = datetime(2026, 10, 12, 3, 0)
+    assert scheduler.closed_until('A01', now) == datetime(2026, 10, 12, 5, 0) - OPENING_LEAD
+    wait = scheduler.next_poll('A01', now, {'RD': {'Glenmont': [3]}})
+    assert (2 * 60 - 5) * 60 <= wait <= (2 * 60 - 5) * 60 + 10
+
+
+def test_last_train_before_opening_runs_after_midnight(scheduler):
+    # Friday's service runs until 01:00 on Saturday
+    assert scheduler.closed_until('A01', datetime(2026, 10, 17, 0, 45)) is None
+    assert scheduler.closed_until('A01', datetime(2026, 10, 17, 1, 0) + CLOSING_GRACE) is None
+    assert scheduler.closed_until('A01', datetime(2026, 10, 17, 2, 0)) == datetime(2026, 10, 17, 7, 0) - OPENING_LEAD
+
+
+def test_days_without_service_are_skipped(scheduler):
+    # no Sunday service, and nothing on Tuesday to Thursday either: next opening is Friday
+    assert scheduler.closed_until('A01', datetime(2026, 10, 12, 23, 59)) == datetime(2026, 10, 16, 5, 0) - OPENING_LEAD
+    assert scheduler.closed_until('A01', datetime(2026, 10, 18, 12, 0)) == datetime(2026, 10, 19, 5, 0) - OPENING_LEAD
+
+
+def test_station_complex_is_open_while_any_platform_is():
+    timings = {'StationTimes': [
+        {'Code': 'A01', 'Monday': {'OpeningTime': '05:00', 'LastTrains': [{'Time': '23:30'}]}},
+        {'Code': 'C01', 'Monday': {'OpeningTime': '05:30', 'LastTrains': [{'Time': '00:30'}]}},
+    ]}
+    scheduler = AdaptiveScheduler(TimingsIndex(timings), jitter=0)
+    # A01 has closed, C01's last train hasn't left yet
+    assert scheduler.closed_until('A01', datetime(2026, 10, 13, 0, 15)) is not None
+    assert scheduler.closed_until(['A01', 'C01'], datetime(2026, 10, 13, 0, 15)) is None
+    # both closed, polling resumes with the first platform to open
+    assert scheduler.closed_until(['C01', 'A01'], datetime(2026, 10, 12, 3, 0)) == datetime(2026, 10, 12, 5, 0) - OPENING_LEAD
+
+
+def test_unknown_stations_are_always_open(scheduler):
+    assert scheduler.closed_until('B35', datetime(2026, 10, 12, 3, 0)) is None
+
+
+def test_interval_follows_the_next_arrival(scheduler):
+    assert scheduler.interval({'RD': {'Glenmont': [6, 12], 'Shady Grove': ['N']}}) == 90
+    assert scheduler.interval({'RD': {'Glenmont': [0]}}) == 10
+    assert scheduler.interval({'RD': {'Glenmont': [12]}}) == 90
+    assert scheduler.interval({}) == 90
+    assert scheduler.next_poll('A01', datetime(2026, 10, 12, 12, 0), {'RD': {'Glenmont': [4]}}) == 60
+
+
+def test_interval_is_the_minimum_while_a_train_is_imminent(scheduler):
+    assert scheduler.interval({'RD': {'Glenmont': [2, 8]}}) == 10
+    assert scheduler.interval({'RD': {'Glenmont': ['BRD', 1]}}) == 10
+    # a long wait doesn't run into the last two minutes before the train
+    eager = AdaptiveScheduler(TimingsIndex(STATION_TIMINGS), min_interval=10, arrival_fraction=0.9, jitter=0)
+    assert eager.interval({'RD': {'Glenmont': [3]}}) == 60
+
+
+def test_interval_jitter_spreads_stations():
+    scheduler = AdaptiveScheduler(TimingsIndex(STATION_TIMINGS), jitter=0.1, rng=random.Random(0))
+    waits = {scheduler.interval({'RD': {'Glenmont': [4]}}) for _ in range(20)}
+    assert len(waits) > 1
+    assert all(54 <= wait <= 66 for wait in waits)
+
+
+def test_serve_skips_closed_stations(stub_server, tmp_path, monkeypatch):
+    server, base_url = stub_server
+    path = tmp_path / 'displays.json'
+    path.write_text(json.dumps({'adaptive': {'min_interval': 0, 'max_interval': 0}, 'displays': [
+        {'host': f'{base_url}/kitchen', 'station': 'A01'},
+        {'host': f'{base_url}/office', 'station': 'B35'},
+    ]}))
+    config = daemon.load_config(str(path))
+    assert config['adaptive'] == {'min_interval': 0, 'max_interval': 0}
+
+    def closed_until(self, station_codes, now):
+        return now + timedelta(hours=1) if 'B35' in station_codes else None
+
+    monkeypatch.setattr(AdaptiveScheduler, 'closed_until', closed_until)
+    asyncio.run(daemon.serve('key', config, run_n_times=2))
+    predictions = [path for path in server.requests if path.startswith('/GetPrediction')]
+    assert predictions == ['/GetPrediction/A01'] * 2
+    assert server.pushes == ['/kitchen']
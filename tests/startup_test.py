@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+# seconds the imports of a one-shot run may take; tighten it on the target hardware through the environment
+STARTUP_BUDGET_SECONDS = float(os.getenv('WMATA_STARTUP_BUDGET', 0.5))
+
+HEAVY_MODULES = ('geopy', 'requests', 'urllib3', 'flask', 'werkzeug', 'asyncio', 'wmata_locator')
+
+
+def import_times(*args, cwd=None):
+    """
+    Run app.py under ``-X importtime``.
+
+    Returns:
+        tuple: The cumulative seconds of every top level import, by module, and the set of
+        every module imported, top level or not.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', APP, *args], cwd=cwd, capture_output=True, text=True, check=True)
+    top_level = {}
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        if not name.startswith('  '):
+            top_level[name.strip()] = int(cumulative_us) / 1e6
+    return top_level, modules
+
+
+def imported(modules, module):
+    return any(name == module or name.startswith(f'{module}.') for name in modules)
+
+
+def test_help_stays_within_startup_budget():
+    top_level, modules = import_times('--help')
+    assert sum(top_level.values()) < STARTUP_BUDGET_SECONDS, sorted(top_level.items(), key=lambda item: -item[1])[:5]
+
+
+@pytest.mark.parametrize('module', HEAVY_MODULES)
+def test_help_does_not_import_heavy_modules(module):
+    top_level, modules = import_times('--help')
+    assert not imported(modules, module)
+
+
+def test_geolocate_of_a_known_place_does_not_import_geopy_or_requests(tmp_path):
+    top_level, modules = import_times('geolocate', 'Metro Center', cwd=tmp_path)
+    assert imported(modules, 'utils')
+    assert not imported(modules, 'geopy')
+    assert not imported(modules, 'requests')
@@ -0,0 +1,71 @@
+import pytest
+from benchmarks import fixtures
+from station_data import StationData, StationRecords, compile_station_data
+from timings_index import TimingsIndex
+from wmata_locator import WmataLocator
+
+
+@pytest.fixture
+def station_data_file(tmp_path):
+    stations = fixtures.station_list()['Stations']
+    timings = fixtures.station_timings(stations)
+    # a station closed on Sundays
+    timings['StationTimes'][-1]['Sunday'] = {'OpeningTime': '', 'FirstTrains': [], 'LastTrains': []}
+    filepath = str(tmp_path / 'stations.bin')
+    compile_station_data(stations, timings, filepath)
+    return filepath, stations, timings
+
+
+def test_station_data_matches_the_timings_index(station_data_file):
+    filepath, stations, timings = station_data_file
+    data = StationData.open(filepath)
+    index = TimingsIndex(timings)
+    assert len(data) == len(stations)
+    for station in stations:
+        assert station['Code'] in data
+        for weekday in range(7):
+            try:
+                expected = index.hours(station['Code'], weekday)
+            except KeyError:
+                with pytest.raises(KeyError):
+                    data.hours(station['Code'], weekday)
+            else:
+                assert data.hours(station['Code'], weekday) == expected
+    assert 'Z99' not in data
+    with pytest.raises(KeyError):
+        data.hours('Z99', 0)
+
+
+def test_station_data_keeps_station_records(station_data_file):
+    filepath, stations, timings = station_data_file
+    data = StationData.open(filepath)
+    assert [station['Code'] for station in data.stations()] == sorted(station['Code'] for station in stations)
+    assert data.codes() == tuple(sorted(station['Code'] for station in stations))
+    assert data.stations()[-1] == data.stations()[len(stations) - 1] == data.station(data.codes()[-1])
+    assert [station['Code'] for station in data.stations()[:2]] == list(data.codes()[:2])
+    for station in stations:
+        compiled = data.station(station['Code'])
+        assert compiled['Name'] == station['Name']
+        assert (compiled['Lat'], compiled['Lon']) == (station['Lat'], station['Lon'])
+        assert compiled['StationTogether1'] == station['StationTogether1']
+        assert set(fixtures.station_lines(compiled)) == set(fixtures.station_lines(station))
+
+
+def test_station_data_rejects_other_files(tmp_path):
+    filepath = tmp_path / 'stations.bin'
+    filepath.write_bytes(b'{"Stations": []}')
+    with pytest.raises(ValueError):
+        StationData.open(str(filepath))
+
+
+def test_locator_with_station_data_skips_station_requests(stub_server, station_data_file, monkeypatch):
+    server, base_url = stub_server
+    monkeypatch.setenv('WMATA_STATION_DATA', station_data_file[0])
+    locator = WmataLocator('key', 'Metro Center')
+    assert locator.closest_station['Code'] == 'A01'
+    # the records are read from the file, not copied into every locator
+    assert locator.station_index is WmataLocator('key', station_data=locator.timings_index).station_index
+    assert isinstance(locator.station_list['Stations'], StationRecords)
+    assert isinstance(locator.station_index.stations, StationRecords)
+    assert locator.find_closest_train_prediction()['line']
+    assert not [path for path in server.requests if path.endswith(('jStations', 'jStationTimes'))]
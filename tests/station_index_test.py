@@ -0,0 +1,24 @@
+from benchmarks import fixtures
+from benchmarks.station_index import closest_station_loop
+from station_index import StationIndex
+
+STATIONS = fixtures.station_list()['Stations']
+
+
+def test_nearest_matches_full_geodesic_scan():
+    index = StationIndex(STATIONS)
+    for coords in fixtures.random_coordinates(25, seed=1):
+        assert index.nearest(coords)['Code'] == closest_station_loop(STATIONS, coords)['Code']
+
+
+def test_k_nearest_is_sorted_by_distance():
+    index = StationIndex(STATIONS)
+    nearest = index.k_nearest((38.898303, -77.028099), 3)
+    assert nearest[0][0]['Code'] == 'A01'
+    distances = [distance for _, distance in nearest]
+    assert distances == sorted(distances)
+    assert len({station['Code'] for station, _ in nearest}) == 3
+
+
+def test_for_stations_reuses_the_index():
+    assert StationIndex.for_stations(STATIONS) is StationIndex.for_stations(list(STATIONS))
@@ -0,0 +1,37 @@
+import pytest
+from timings_index import TimingsIndex
+
+STATION_TIMINGS = {
+    'StationTimes': [
+        {
+            'Code': 'A01',
+            'StationName': 'Metro Center',
+            'Monday': {'OpeningTime': '05:04', 'LastTrains': [{'Time': '23:30'}, {'Time': '23:52'}]},
+            'Saturday': {'OpeningTime': '07:00', 'LastTrains': [{'Time': '23:30'}, {'Time': '00:30'}]},
+            'Sunday': {'OpeningTime': '07:00', 'LastTrains': []},
+        },
+    ]
+}
+
+
+def test_timings_index_parses_opening_and_last_train_minutes():
+    index = TimingsIndex(STATION_TIMINGS)
+    assert index.hours('A01', 0) == (5 * 60 + 4, 23 * 60 + 52)
+    assert 'A01' in index and 'B35' not in index
+
+
+def test_timings_index_counts_last_trains_after_midnight_as_the_latest():
+    assert TimingsIndex(STATION_TIMINGS).hours('A01', 5) == (7 * 60, 24 * 60 + 30)
+
+
+def test_timings_index_rejects_days_without_service():
+    index = TimingsIndex(STATION_TIMINGS)
+    for weekday in (1, 6):
+        with pytest.raises(KeyError):
+            index.hours('A01', weekday)
+
+
+def test_timings_index_is_rebuilt_only_for_new_responses():
+    index = TimingsIndex.for_timings(STATION_TIMINGS)
+    assert TimingsIndex.for_timings(STATION_TIMINGS) is index
+    assert TimingsIndex.for_timings(dict(STATION_TIMINGS)) is not index
@@ -152,3 +152,14 @@ from utils import convert_for_esp32_led_matrix_64_32
 def test_convert_for_esp32_led_matrix_64_32(input, output):
     actual = convert_for_esp32_led_matrix_64_32(input)
     assert json.dumps(actual) == json.dumps(output)
+
+
+def test_convert_for_esp32_led_matrix_64_32_shows_closed_stations():
+    output = convert_for_esp32_led_matrix_64_32({'line': {}, 'timestamp': '2024-08-10T01:25:00', 'first_train': None, 'last_train': None})
+    assert output['line'] == [{'name': '', 'destinations': ['Closed']}]
+
+
+def test_convert_for_esp32_led_matrix_64_32_marks_stale_predictions():
+    predictions = {'line': {'RD': {'Glenmont': [1, 2]}}, 'timestamp': '2024-08-10T01:25:00.293639', 'stale_seconds': 90}
+    assert convert_for_esp32_led_matrix_64_32(predictions)['stale_seconds'] == 90
+    assert 'stale_seconds' not in convert_for_esp32_led_matrix_64_32({**predictions, 'stale_seconds': 0})
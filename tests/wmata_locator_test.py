@@ -0,0 +1,107 @@
+import pytest
+import requests
+import wmata_locator
+from wmata_locator import WmataLocator, age_trains, build_line_map, build_line_maps
+
+
+def train(minutes, destination='Glenmont'):
+    return {'Line': 'RD', 'Destination': destination, 'Min': minutes, 'LocationCode': 'A01'}
+
+
+def test_age_trains_counts_minutes_down():
+    trains = [train('ARR'), train('BRD'), train('1'), train('2'), train('9'), train('---')]
+    assert age_trains(trains, 30) == trains
+    assert [t['Min'] for t in age_trains(trains, 125)] == ['ARR', '7', '---']
+
+
+class FailingSession:
+    def get(self, url, **kwargs):
+        raise requests.ConnectionError('upstream down')
+
+
+def test_locator_serves_counted_down_predictions_when_upstream_fails(stub_server, monkeypatch):
+    locator = WmataLocator('key')
+    fresh = locator.find_train_predictions(['A01'])['A01']
+    assert fresh['stale_seconds'] == 0
+
+    cache = wmata_locator.PREDICTION_CACHE
+    started, trains = cache._entries['A01']
+    cache._entries['A01'] = (started - 120, trains)
+    locator.session = FailingSession()
+    stale = locator.find_train_predictions(['A01'])['A01']
+    assert stale['stale_seconds'] >= 120
+    for line, destinations in stale['line'].items():
+        for destination, minutes in destinations.items():
+            expected = [m - 2 for m in fresh['line'][line][destination] if m != 'N' and m >= 2]
+            assert [m for m in minutes if m != 'N'] == expected
+
+
+def test_locator_raises_without_predictions_to_fall_back_on(stub_server):
+    locator = WmataLocator('key')
+    locator.session = FailingSession()
+    with pytest.raises(requests.ConnectionError):
+        locator.find_train_predictions(['A01'])
+
+
+def test_station_complex_follows_station_together():
+    assert wmata_locator.station_complex({'Code': 'A01', 'StationTogether1': 'C01', 'StationTogether2': ''}) == ['A01', 'C01']
+    assert wmata_locator.station_complex({'Code': 'B35', 'StationTogether1': '', 'StationTogether2': ''}) == ['B35']
+
+
+def test_closest_station_complex_is_merged_in_one_request(stub_server):
+    server, base_url = stub_server
+    locator = WmataLocator('key')
+    stations = {station['Code']: station for station in locator.station_list['Stations']}
+    locator.closest_station = stations['A01']
+    locator.closest_station_name = stations['A01']['Name']
+    locator.closest_station_codes = wmata_locator.station_complex(stations['A01'])
+    prediction = locator.find_closest_train_prediction()
+    assert [path for path in server.requests if path.startswith('/GetPrediction')] == ['/GetPrediction/A01,C01']
+    separate = locator.find_train_predictions(['A01', 'C01'])
+    assert set(prediction['line']) == set(separate['A01']['line']) | set(separate['C01']['line'])
+    for destinations in prediction['line'].values():
+        for minutes in destinations.values():
+            numbers = [m for m in minutes if m != 'N']
+            assert numbers == sorted(numbers)
+
+
+def located_train(code, line, destination, minutes):
+    return {'LocationCode': code, 'Line': line, 'Destination': destination, 'Min': minutes}
+
+
+TRAINS = [
+    located_train('A01', 'RD', 'Glenmont', '7'),
+    located_train('A01', 'RD', 'Shady Grv', 'BRD'),
+    located_train('B35', 'GR', 'Greenbelt', '4'),
+    located_train('A01', 'RD', 'Glenmont', 'ARR'),
+    located_train('A01', 'BL', 'Largo', '12'),
+    located_train('A01', 'RD', 'Shady Grv', '3'),
+    located_train('A01', 'RD', 'Glenmont', '---'),
+    located_train('A01', 'RD', 'Glenmont', '15'),
+]
+
+
+def test_build_line_maps_groups_every_station_at_once():
+    line_maps = build_line_maps(TRAINS)
+    assert list(line_maps) == ['A01', 'B35']
+    assert line_maps['A01'] == {
+        'RD': {'Glenmont': [0, 7, 15, 'N'], 'Shady Grv': [3, 'N']},
+        'BL': {'Largo': [12]},
+    }
+    assert list(line_maps['A01']) == ['RD', 'BL']
+    assert list(line_maps['A01']['RD']) == ['Glenmont', 'Shady Grv']
+    assert line_maps['B35'] == {'GR': {'Greenbelt': [4]}}
+
+
+def test_build_line_maps_keeps_the_next_arrivals():
+    line_maps = build_line_maps(TRAINS, top_n=2)
+    assert line_maps['A01']['RD'] == {'Glenmont': [0, 7], 'Shady Grv': [3, 'N']}
+
+
+def test_build_line_map_ignores_stations():
+    assert build_line_map(TRAINS) == {
+        'RD': {'Glenmont': [0, 7, 15, 'N'], 'Shady Grv': [3, 'N']},
+        'GR': {'Greenbelt': [4]},
+        'BL': {'Largo': [12]},
+    }
+    assert build_line_map([]) == {}
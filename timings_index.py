@@ -0,0 +1,75 @@
+import threading
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def minutes_of_day(hour_and_minute: str) -> int:
+    """Convert a ``HH:MM`` time to minutes since midnight."""
+    hour, minute = hour_and_minute.split(':')
+    return int(hour) * 60 + int(minute)
+
+
+class TimingsIndex:
+    """
+    Pre-parsed ``jStationTimes`` data: per station code and weekday, the opening time and
+    the latest last-train time, both as minutes since midnight. A last train after midnight
+    is counted from the midnight before, e.g. 00:30 is 1470.
+
+    Lookups are a dict access and a tuple index, with no string parsing.
+    """
+
+    _shared_source = None
+    _shared_index = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, station_timings: dict):
+        self._hours = {}
+        for station in station_timings['StationTimes']:
+            week = []
+            for weekday in WEEKDAYS:
+                day = station.get(weekday) or {}
+                opening_time = day.get('OpeningTime')
+                last_trains = [minutes_of_day(last_train['Time']) for last_train in day.get('LastTrains') or [] if last_train.get('Time')]
+                if opening_time and last_trains:
+                    opening = minutes_of_day(opening_time)
+                    # last trains earlier than the opening run after midnight, e.g. 00:30 is later than 23:30
+                    week.append((opening, max(minutes + 24 * 60 if minutes < opening else minutes for minutes in last_trains)))
+                else:
+                    week.append(None)
+            self._hours[station['Code']] = tuple(week)
+
+    @classmethod
+    def for_timings(cls, station_timings: dict):
+        """
+        Return the index of the given ``jStationTimes`` response, rebuilding it only when
+        the response object changes, i.e. when its cache entry was refreshed.
+
+        Args:
+            station_timings (dict): The ``jStationTimes`` response.
+        Returns:
+            TimingsIndex: The shared index.
+        """
+        with cls._shared_lock:
+            if cls._shared_source is not station_timings:
+                cls._shared_index = cls(station_timings)
+                cls._shared_source = station_timings
+            return cls._shared_index
+
+    def __contains__(self, station_code):
+        return station_code in self._hours
+
+    def hours(self, station_code: str, weekday: int):
+        """
+        Get the service hours of a station.
+
+        Args:
+            station_code (str): The station code, e.g. "A01".
+            weekday (int): Day of the week, Monday being 0 as in `datetime.weekday`.
+        Returns:
+            tuple: Opening time and last train time, in minutes since midnight; the last
+            train time is past 1440 when it runs after midnight.
+        """
+        hours = self._hours[station_code][weekday]
+        if hours is None:
+            raise KeyError(f'No service hours for {station_code} on {WEEKDAYS[weekday]}')
+        return hours
@@ -1,10 +1,10 @@
 import json
 import logging
+import os
 from cache import jsonfilecache
-from geopy.geocoders import Nominatim
+from geocoding import GeocoderChain, local_gazetteer
 from datetime import datetime
-import requests
-import urllib
+import metrics
 
 logger = logging.getLogger()
 
@@ -15,10 +15,32 @@ DAY_IN_SECONDS = 24 * 60 * 60
 HUMAN_FRIENDLY_TIME_FORMAT = '%d %b %I:%M%p'
 ESP32_FRIENDLY_TIME_FORMAT = '%I:%M:%S%p'
 
+class Nominatim:
+  '''
+  geopy's Nominatim geocoder, imported on first use
+
+  geopy takes longer to import than the rest of the CLI, and the local gazetteer answers
+  most lookups without it.
+  '''
+  def __init__(self, *args, **kwargs):
+    self._args = args
+    self._kwargs = kwargs
+    self._geocoder = None
+
+  def geocode(self, address):
+    if self._geocoder is None:
+      from geopy.geocoders import Nominatim
+      self._geocoder = Nominatim(*self._args, **self._kwargs)
+    return self._geocoder.geocode(address)
+
 @jsonfilecache(YEAR_IN_SECONDS)
 def get_coordinates_of_address(address):
   logger.info(f'Loading coordinates for {address}')
-  locator = Nominatim(user_agent="Geopy Library")
+  # try the known stations and addresses before the rate-limited Nominatim service
+  locator = GeocoderChain([
+    local_gazetteer(os.getenv('WMATA_GAZETTEER_CSV')),
+    Nominatim(user_agent="Geopy Library"),
+  ])
   location = locator.geocode(address)
   if not location:
       raise Exception(f'Unable to geocode address {address}')
@@ -26,20 +48,25 @@ def get_coordinates_of_address(address):
   return coordinates
 
 
-def send_to_esp32(esp32_hostname, payload):
+def send_to_esp32(esp32_hostname, payload, timeout=None):
+  import http_client  # pulls in requests, only needed when there is a display to push to
   if not esp32_hostname.startswith('http://'):
     esp32_hostname = f'http://{esp32_hostname}'
-  if not isinstance(payload, str):
+  headers = None
+  if isinstance(payload, bytes):
+    # already encoded, e.g. by esp32_wire
+    headers = {'Content-Type': 'application/octet-stream'}
+  elif not isinstance(payload, str):
     payload = json.dumps(payload)
-  session = requests.Session()
-  session.headers = None
   try:
     logger.info(f'Sending POST {payload=} to {esp32_hostname=}...')
-    payload = payload.encode()
-    request = urllib.request.Request(esp32_hostname, payload)
-    response = urllib.request.urlopen(request)
-    response_text = response.read()
-    logger.info(f'{response.status=} - {response_text=}')
+    if isinstance(payload, str):
+      payload = payload.encode()
+    with metrics.timed('esp32_push'):
+      response = http_client.post(esp32_hostname, payload, timeout=timeout, headers=headers)
+    response.raise_for_status()
+    response_text = response.text
+    logger.info(f'{response.status_code=} - {response_text=}')
     return True
   except Exception as e:
     logger.error(f'Unable to send POST request with data "{payload=}" to "{esp32_hostname=}"', exc_info=e)
@@ -53,6 +80,8 @@ def convert_for_esp32_led_matrix_64_32(train_predictions):
   :return dict: The esp32 friendly output
   '''
   result = []
+  # only set when serving the last good predictions, see WMATA_PREDICTION_LATENCY_BUDGET
+  stale = {'stale_seconds': train_predictions['stale_seconds']} if train_predictions.get('stale_seconds') else {}
   timestamp = train_predictions['timestamp']
   timestamp = datetime.fromisoformat(timestamp).strftime(ESP32_FRIENDLY_TIME_FORMAT)
   if 'error' in train_predictions:
@@ -63,10 +92,18 @@ def convert_for_esp32_led_matrix_64_32(train_predictions):
   lines = train_predictions['line']
   if not lines:
     first_train = train_predictions['first_train']
+    if first_train is None:
+      # no service today
+      return {
+        'line': [{'name': '', 'destinations': ['Closed']}],
+        'timestamp': timestamp,
+        **stale
+      }
     first_train_formatted = datetime.fromisoformat(first_train).strftime(ESP32_FRIENDLY_TIME_FORMAT)
     return {
       'line': [{'name': '', 'destinations': ['NextTrain', first_train_formatted]}],
-      'timestamp': timestamp
+      'timestamp': timestamp,
+      **stale
     }
   for line, dest_map in lines.items():
     dest_list = []
@@ -103,5 +140,6 @@ def convert_for_esp32_led_matrix_64_32(train_predictions):
   
   return {
     'line': result,
-    'timestamp': timestamp
+    'timestamp': timestamp,
+    **stale
   }
\ No newline at end of file
@@ -1,24 +1,88 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import logging
-import requests
-from geopy.distance import geodesic
+import os
+import http_client
+import metrics
 from cache import jsonfilecache
+from prediction_cache import PredictionCache, DEFAULT_PREDICTION_TTL, DEFAULT_LATENCY_BUDGET, DEFAULT_MAX_STALE
+from quota import QuotaGovernor, quota_counters, HIGH, LOW, DEFAULT_RATE, DEFAULT_BURST, DEFAULT_DAILY_LIMIT
+from station_data import StationData, station_data_from_env
+from station_index import StationIndex
+from timings_index import TimingsIndex
 from utils import get_coordinates_of_address, MONTH_IN_SECONDS, DAY_IN_SECONDS, HUMAN_FRIENDLY_TIME_FORMAT
 
 logger = logging.getLogger()
 
 STATION_INFORMATION_FILEPATH = 'station-information.json'
-STATION_LIST_URL = 'http://api.wmata.com/Rail.svc/json/jStations?contentType=application/json&api_key={api_key}'
-STATION_TIMING_URL = 'http://api.wmata.com/Rail.svc/json/jStationTimes?contentType=application/json&api_key={api_key}'
-REAL_TIME_RAIL_PREDICTIONS_URL = 'http://api.wmata.com/StationPrediction.svc/json/GetPrediction/{station_code}?contentType=application/json&api_key={api_key}'
+# overridable to point at a local stand-in, like benchmarks/fake_wmata.py
+API_BASE_URL = os.getenv('WMATA_API_BASE_URL', 'http://api.wmata.com').rstrip('/')
+STATION_LIST_URL = API_BASE_URL + '/Rail.svc/json/jStations?contentType=application/json&api_key={api_key}'
+STATION_TIMING_URL = API_BASE_URL + '/Rail.svc/json/jStationTimes?contentType=application/json&api_key={api_key}'
+REAL_TIME_RAIL_PREDICTIONS_URL = API_BASE_URL + '/StationPrediction.svc/json/GetPrediction/{station_code}?contentType=application/json&api_key={api_key}'
+
+# past this many stations a single GetPrediction/All is cheaper than a list of codes
+BATCH_ALL_THRESHOLD = 20
+
+# shared by every locator in the process, so clients watching the same station share upstream calls
+PREDICTION_CACHE = PredictionCache(
+    ttl=float(os.getenv('WMATA_PREDICTION_TTL', DEFAULT_PREDICTION_TTL)),
+    latency_budget=float(os.getenv('WMATA_PREDICTION_LATENCY_BUDGET', DEFAULT_LATENCY_BUDGET)),
+    max_stale=float(os.getenv('WMATA_PREDICTION_MAX_STALE', DEFAULT_MAX_STALE)),
+)
+metrics.register_collector(lambda: (
+    ('cache_requests_total', {'cache': 'predictions', 'result': result}, count) for result, count in PREDICTION_CACHE.stats().items()
+))
+
+# shared by every process started from the same directory, like the jsonfilecache files, or by every
+# process pointing WMATA_QUOTA_FILE at the same file
+QUOTA = QuotaGovernor(
+    os.getenv('WMATA_QUOTA_FILE', 'wmata.quota'),
+    rate=float(os.getenv('WMATA_QUOTA_RATE', DEFAULT_RATE)),
+    burst=float(os.getenv('WMATA_QUOTA_BURST', DEFAULT_BURST)),
+    daily_limit=int(os.getenv('WMATA_QUOTA_DAILY', DEFAULT_DAILY_LIMIT)),
+)
+metrics.register_collector(lambda: quota_counters(QUOTA))
 
 class WmataLocator:
-    def __init__(self, api_key: str, current_address: str):
+    def __init__(self, api_key: str, current_address: str = None, prediction_cache: PredictionCache = None, session: 'requests.Session' = None,
+                 station_data: StationData = None, quota: QuotaGovernor = None):
         self.api_key = api_key
-        self.station_list = self.get_station_list()
-        self.station_timings = self.get_station_timings()
-        self.closest_station = self.find_closest_station(current_address)
-        self.closest_station_name = self.closest_station["Name"]
+        self.session = session or http_client
+        self.prediction_cache = prediction_cache or PREDICTION_CACHE
+        self.quota = quota or QUOTA
+        if station_data is None:
+            station_data = station_data_from_env()
+        if station_data is not None:
+            # compiled by `app.py compile-stations`, memory-mapped and shared by every process;
+            # the stations are read from the file as needed, not copied
+            self.station_list = {'Stations': station_data.stations()}
+            self.station_codes = station_data.codes()
+            self.station_timings = None
+            self.timings_index = station_data
+            self.station_index = station_data.index()
+        else:
+            self.station_list = self.get_station_list()
+            self.station_codes = tuple(station['Code'] for station in self.station_list['Stations'])
+            self.station_timings = self.get_station_timings()
+            self.timings_index = TimingsIndex.for_timings(self.station_timings)
+            self.station_index = StationIndex.for_stations(self.station_list['Stations'])
+        self.closest_station = None
+        self.closest_station_name = None
+        self.closest_station_codes = []
+        if current_address:
+            self.closest_station = self.find_closest_station(current_address)
+            self.closest_station_name = self.closest_station["Name"]
+            self.closest_station_codes = station_complex(self.closest_station)
+
+    def _upstream_call(self, priority: str):
+        '''
+        Take a quota token for an upstream call, then one more for each of its retries
+
+        :param str priority: `quota.HIGH` or `quota.LOW`
+        :return: A context manager, to send the call in
+        '''
+        self.quota.acquire(priority)
+        return http_client.before_retries(lambda: self.quota.acquire(priority))
 
     @jsonfilecache(MONTH_IN_SECONDS)
     def get_station_list(self):
@@ -26,8 +90,9 @@ class WmataLocator:
         URL = STATION_LIST_URL.format_map({
             'api_key': self.api_key
         })
-        response = requests.get(URL)
-        return response.json()
+        with self._upstream_call(LOW), metrics.timed('upstream_station_list'):
+            response = self.session.get(URL)
+            return response.json()
 
     @jsonfilecache(DAY_IN_SECONDS)
     def get_station_timings(self):
@@ -35,34 +100,80 @@ class WmataLocator:
         URL = STATION_TIMING_URL.format_map({
             'api_key': self.api_key
         })
-        response = requests.get(URL)
-        return response.json()
+        with self._upstream_call(LOW), metrics.timed('upstream_station_timings'):
+            response = self.session.get(URL)
+            return response.json()
         
-    def find_closest_station(self, current_address: str):
-        stations = self.station_list['Stations']
+    def fetch_predictions(self, station_code: str):
+        '''
+        Get the real time predictions for a station, through the shared prediction cache
+
+        :param str station_code: The station code, e.g. "A01"
+        :return list: The "Trains" of the GetPrediction response
+        '''
+        trains, stale_seconds, fetched = self.lookup_predictions([station_code])[station_code]
+        return trains
+
+    def fetch_predictions_many(self, station_codes):
+        '''
+        Get the real time predictions for many stations in one upstream request
+
+        :param list station_codes: The station codes, e.g. ["A01", "B35"]
+        :return dict: The "Trains" of each station, keyed by station code
+        '''
+        return {station_code: trains for station_code, (trains, stale_seconds, fetched) in self.lookup_predictions(station_codes).items()}
+
+    def lookup_predictions(self, station_codes):
+        '''
+        Get the real time predictions for many stations in one upstream request, with how stale they are
+
+        Stations missing from the cache are asked for together as a comma separated list,
+        or with "All" when there are more than `BATCH_ALL_THRESHOLD` of them. When WMATA fails
+        or is too slow, the last good predictions are returned instead, counted down by `age_trains`.
+
+        :param list station_codes: The station codes, e.g. ["A01", "B35"]
+        :return dict: The "Trains" of each station, their age in seconds (0 when fresh) and when they
+            were fetched (see `PredictionCache.lookup`), keyed by station code
+        '''
+        def fetch(missing_codes):
+            query = 'All' if len(missing_codes) > BATCH_ALL_THRESHOLD else ','.join(missing_codes)
+            URL = REAL_TIME_RAIL_PREDICTIONS_URL.format_map({
+                'api_key': self.api_key,
+                'station_code': query
+            })
+            with self._upstream_call(HIGH), metrics.timed('upstream_predictions'):
+                response = self.session.get(URL)
+                response.raise_for_status()
+                trains = response.json()["Trains"]
+            trains_by_code = {station_code: [] for station_code in missing_codes}
+            for train in trains:
+                trains_by_code.setdefault(train["LocationCode"], []).append(train)
+            return trains_by_code
+
+        result = {}
+        for station_code, (trains, stale_seconds, fetched) in self.prediction_cache.lookup(station_codes, fetch).items():
+            if stale_seconds:
+                logger.warning(f'Serving {stale_seconds:.0f} seconds old predictions for {station_code}')
+                trains = age_trains(trains, stale_seconds)
+            result[station_code] = (trains, stale_seconds, fetched)
+        return result
 
+    def find_closest_station(self, current_address: str):
         # get current coordinates
         logger.info(f'Getting current coordinates')
-        current_cords = get_coordinates_of_address(current_address)
+        with metrics.timed('geocode'):
+            current_cords = get_coordinates_of_address(current_address)
         logger.info(f'Current coordinates are {current_cords}')
 
         logger.info(f'Finding closest station')
-        closest_station_geodesic_distance = float('inf')
-        closest_station = None
-        for station in stations:
-            # get station coordinates in tuple
-            station_cords = (station["Lat"], station["Lon"])
-            # get geodesic distance
-            distance_from_station = abs(geodesic(station_cords, current_cords).miles)
-            if distance_from_station < closest_station_geodesic_distance:
-                closest_station_geodesic_distance = distance_from_station
-                closest_station = station
+        with metrics.timed('station_lookup'):
+            closest_station = self.station_index.nearest(current_cords)
         logger.info(f'Found closest station = {closest_station["Name"]}')
         return closest_station
 
     def find_closest_train_prediction(self):
         '''
-        _summary_
+        Find the train predictions of the closest station, with the lines of every platform of its complex
 
         :return dict: 
         
@@ -77,23 +188,40 @@ class WmataLocator:
         }
         ```
         '''
+        logging.info(f'Finding closest train predictions for {self.closest_station_name}...')
+        prediction = self.find_complex_train_prediction(self.closest_station_codes)
+        logging.info(f'Found closest train predictions for {self.closest_station_name}...')
+        return prediction
+
+    def find_complex_train_prediction(self, station_codes):
+        '''
+        Find the train predictions of a station complex, with the lines of all its platforms on one board
+
+        :param list station_codes: The codes of the complex, see `station_complex`, its main station first
+        :return dict: The predictions, in the same shape as `find_closest_train_prediction`
+        '''
+        prediction, generation = self.lookup_complex_train_prediction(station_codes)
+        return prediction
+
+    def lookup_complex_train_prediction(self, station_codes, predictions: dict = None):
+        '''
+        Find the train predictions of a station complex, with the generation they were built from
+
+        :param list station_codes: The codes of the complex, see `station_complex`, its main station first
+        :param dict predictions: Predictions already looked up with `lookup_predictions` for these
+            codes and maybe others, looked up here if not given
+        :return tuple: The predictions, as in `find_complex_train_prediction`, and when the predictions
+            of each station were fetched (see `PredictionCache.generation`), None if any are stale
+        '''
         # get real time rail predictions
         current_time = datetime.now()
         current_day = current_time.strftime('%A')
-        logging.info(f'Finding closest train predictions for {self.closest_station_name}...')
         logging.info(f'Checking for station timings for the {current_day}')
-        closest_station_timing = [station for station in self.station_timings['StationTimes'] if station['StationName'] == self.closest_station_name][0]
-        todays_station_timing = closest_station_timing[current_day]
-        opening_time_hour_and_minute = datetime.strptime(todays_station_timing['OpeningTime'], '%H:%M')
-        first_datetime = current_time.replace(hour=opening_time_hour_and_minute.hour, minute=opening_time_hour_and_minute.minute)
-        
-        closing_times_hour_and_minute = [
-            datetime.strptime(last_train['Time'], '%H:%M') for last_train in todays_station_timing['LastTrains']
-        ]
-        closing_times = [
-            current_time.replace(hour=closing_time_hr_min.hour, minute=closing_time_hr_min.minute) for closing_time_hr_min in closing_times_hour_and_minute
-        ]
-        last_datetime = max(closing_times)
+        try:
+            first_datetime, last_datetime = self.get_complex_service_hours(station_codes, current_time)
+        except KeyError:
+            logger.info(f'No service hours for {",".join(station_codes)} today')
+            first_datetime = last_datetime = None
         
         # if not ( current_time >= first_datetime and current_time <= last_datetime ):
         #     if current_time > last_datetime:
@@ -107,55 +235,207 @@ class WmataLocator:
         #         "last_train": last_datetime.isoformat()
         #     }
         
-        URL = REAL_TIME_RAIL_PREDICTIONS_URL.format_map({
-            'api_key': self.api_key,
-            'station_code': self.closest_station['Code']
-        })
-        response = requests.get(URL)
-        logging.info(f'Found closest train predictions for {self.closest_station_name}...')
-        trains = response.json()["Trains"]
-        line_map = {}
-        for train in trains:
-            line = train["Line"]
-            min = train["Min"]
-            destination = train["Destination"]
-
-            # convert "Min" ( minutes ) to something integer
-            time = 'N'
-            if min.lower() == 'arr':
-                time = 0
-            else:
-                # try parsing min as integer
-                # if failed, just pass None
-                try:
-                    time = int(min)
-                except ValueError:
-                    pass
-
-            if line not in line_map:
-                line_map[line] = {
-                        destination: [time]
-                    }
-                
-            else:
-                if destination not in line_map[line]:
-                    line_map[line][destination] = [time]
-                else:
-                    line_map[line][destination].append(time)
-        
-        # now sort all the times for all the destinations
+        # every platform of the complex in one upstream request, their trains merged into one board
+        if predictions is None:
+            predictions = self.lookup_predictions(station_codes)
+        trains = [train for station_code in station_codes for train in predictions[station_code][0]]
+        stale_seconds = max(predictions[station_code][1] for station_code in station_codes)
+        generation = None if stale_seconds else tuple(predictions[station_code][2] for station_code in station_codes)
+        line_map = build_line_map(trains)
+        logger.info(f'Found lines {",".join(list(line_map.keys()))} for {",".join(station_codes)}')
+        return self._prediction_result(line_map, current_time, first_datetime, last_datetime, stale_seconds), generation
 
-        logger.info(f'Found lines {",".join(list(line_map.keys()))} for {self.closest_station_name}')
-        for line, destinations in line_map.items():
-            for dest, times in destinations.items():
-                line_map[line][dest] = sorted(line_map[line][dest], key=lambda x: (x is None or x == 'N', x))
-        
+    def find_complex_train_predictions(self, station_complexes):
+        '''
+        Find the train predictions of many station complexes with a single upstream request
+
+        :param list station_complexes: The codes of each complex, see `station_complex`
+        :return dict: The predictions of each complex, as in `find_complex_train_prediction`, keyed
+            by its tuple of codes
+        '''
+        station_codes = list(dict.fromkeys(station_code for station_codes in station_complexes for station_code in station_codes))
+        predictions = self.lookup_predictions(station_codes)
+        return {tuple(station_codes): self.lookup_complex_train_prediction(station_codes, predictions)[0]
+                for station_codes in station_complexes}
+
+    def find_train_predictions(self, station_codes, top_n: int = None):
+        '''
+        Find the train predictions of many stations with a single upstream request
+
+        :param list station_codes: The station codes, e.g. ["A01", "B35"]
+        :param int top_n: Keep only the next top_n arrivals of every destination
+        :return dict: The predictions of each station, keyed by station code, in the same
+            shape as `find_closest_train_prediction`; stations without service hours today are
+            closed, with no "first_train" and "last_train"
+        '''
+        current_time = datetime.now()
+        predictions = self.lookup_predictions(station_codes)
+        line_maps = build_line_maps([train for trains, stale_seconds, fetched in predictions.values() for train in trains], top_n)
+        result = {}
+        for station_code in station_codes:
+            try:
+                first_datetime, last_datetime = self.get_service_hours(station_code, current_time)
+            except KeyError:
+                # one closed station must not fail the whole batch
+                logger.info(f'No service hours for {station_code} today')
+                first_datetime = last_datetime = None
+            trains, stale_seconds, fetched = predictions[station_code]
+            line_map = line_maps.get(station_code, {})
+            result[station_code] = self._prediction_result(line_map, current_time, first_datetime, last_datetime, stale_seconds)
+        return result
+
+    def get_service_hours(self, station_code: str, current_time: datetime):
+        '''
+        Get the opening time and the last train time of a station for the current day
+
+        :param str station_code: The station code, e.g. "A01"
+        :param datetime current_time: The current time
+        :return tuple: The first and last train datetimes
+        '''
+        with metrics.timed('timings_lookup'):
+            opening_minutes, last_train_minutes = self.timings_index.hours(station_code, current_time.weekday())
+        midnight = current_time.replace(hour=0, minute=0)
+        first_datetime = midnight + timedelta(minutes=opening_minutes)
+        # past 1440 minutes when the last train runs after midnight
+        last_datetime = midnight + timedelta(minutes=last_train_minutes)
+        return first_datetime, last_datetime
+
+    def get_complex_service_hours(self, station_codes, current_time: datetime):
+        '''
+        Get the service hours of a station complex: from its earliest opening to its latest last train
+
+        :param list station_codes: The codes of the complex, see `station_complex`, its main station first
+        :param datetime current_time: The current time
+        :return tuple: The first and last train datetimes, a KeyError is raised if no platform runs today
+        '''
+        hours = []
+        for station_code in station_codes:
+            try:
+                hours.append(self.get_service_hours(station_code, current_time))
+            except KeyError:
+                # a platform closed today doesn't close the complex
+                continue
+        if not hours:
+            raise KeyError(f'No service hours for {",".join(station_codes)} today')
+        return min(opening for opening, _ in hours), max(last_train for _, last_train in hours)
+
+    def _prediction_result(self, line_map, current_time, first_datetime, last_datetime, stale_seconds=0):
         # current timestamp
         now_as_utc = current_time.astimezone(timezone.utc).isoformat()
 
         result_dict = {}
         result_dict['line'] = line_map
         result_dict['timestamp'] = now_as_utc
-        result_dict["first_train"] = first_datetime.isoformat()
-        result_dict["last_train"] = last_datetime.isoformat()
+        result_dict["first_train"] = first_datetime.isoformat() if first_datetime else None
+        result_dict["last_train"] = last_datetime.isoformat() if last_datetime else None
+        # 0 unless WMATA failed or was too slow, and these are the last good predictions counted down
+        result_dict["stale_seconds"] = round(stale_seconds)
         return result_dict
+
+
+def station_complex(station: dict):
+    '''
+    Get the codes of every platform of a station: transfer stations like Metro Center are split
+    across codes (A01 and C01), linked by "StationTogether1" and "StationTogether2"
+
+    :param dict station: A station of the jStations response
+    :return list: The station's code, then the codes of the other platforms of its complex
+    '''
+    station_codes = [station['Code']]
+    for key in ('StationTogether1', 'StationTogether2'):
+        station_code = station.get(key)
+        if station_code and station_code not in station_codes:
+            station_codes.append(station_code)
+    return station_codes
+
+
+def age_trains(trains, stale_seconds):
+    '''
+    Count the minutes of old "Trains" down by the time elapsed since they were fetched
+
+    Trains that should have left by now are dropped, and trains due now become "ARR".
+
+    :param list trains: The trains of a GetPrediction response
+    :param float stale_seconds: Seconds since the trains were fetched
+    :return list: The trains as they should be now
+    '''
+    elapsed_minutes = int(stale_seconds // 60)
+    if not elapsed_minutes:
+        return trains
+    aged = []
+    for train in trains:
+        try:
+            minutes = int(train["Min"])
+        except ValueError:
+            # arriving or boarding a minute ago means gone now; keep the trains without a time
+            if train["Min"].lower() not in ('arr', 'brd'):
+                aged.append(train)
+            continue
+        minutes -= elapsed_minutes
+        if minutes >= 0:
+            aged.append({**train, "Min": str(minutes) if minutes else 'ARR'})
+    return aged
+
+
+def _group_trains(trains, station_field, top_n):
+    # line maps keyed by the station_field of the trains (all under None without one), in one pass
+    line_maps = {}
+    for train in trains:
+        station = train[station_field] if station_field else None
+        line_map = line_maps.get(station)
+        if line_map is None:
+            line_map = line_maps[station] = {}
+        line = train["Line"]
+        min = train["Min"]
+        destination = train["Destination"]
+
+        # convert "Min" ( minutes ) to something integer
+        time = 'N'
+        if min.lower() == 'arr':
+            time = 0
+        else:
+            try:
+                time = int(min)
+            except ValueError:
+                pass
+
+        destinations = line_map.get(line)
+        if destinations is None:
+            line_map[line] = {destination: [time]}
+        elif destination not in destinations:
+            destinations[destination] = [time]
+        else:
+            destinations[destination].append(time)
+
+    # now sort all the times for all the destinations, unknown ones last
+    for line_map in line_maps.values():
+        for destinations in line_map.values():
+            for dest, times in destinations.items():
+                times.sort(key=lambda x: (x is None or x == 'N', x))
+                if top_n is not None:
+                    del times[top_n:]
+    return line_maps
+
+
+@metrics.timed('parse_predictions')
+def build_line_map(trains, top_n: int = None):
+    '''
+    Group the "Trains" of a GetPrediction response by line and destination
+
+    :param list trains: The trains of a single station
+    :param int top_n: Keep only the next top_n arrivals of every destination
+    :return dict: The sorted arrival minutes, keyed by line then destination
+    '''
+    return _group_trains(trains, None, top_n).get(None, {})
+
+
+@metrics.timed('parse_predictions')
+def build_line_maps(trains, top_n: int = None):
+    '''
+    Group the "Trains" of many stations by station, line and destination in one pass
+
+    :param list trains: The trains, of any number of stations
+    :param int top_n: Keep only the next top_n arrivals of every destination
+    :return dict: The line map of every station with trains, keyed by station code
+    '''
+    return _group_trains(trains, "LocationCode", top_n)